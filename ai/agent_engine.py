@@ -1,17 +1,19 @@
 # ai/agent_engine.py
 
-from ai.recommender import recommend_transport_options
-from ai.rag_engine import retrieve_context
-from rapidfuzz import fuzz, process
+from ai.recommender import rank_by_priorities
+from ai.rag_engine import kb_signature, retrieve_context
+from ai.catalog import RouteCatalog
+from ai.intent_router import IntentRouter, default_router
+from ai.time_window import format_minute, parse_time_query
+from storage.schema import minutes_of_day
+from storage.metrics import stage
+from storage.session_store import SessionState
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import multiprocessing
 import random
-import re
-
-# Simple in-memory context (resets when server restarts)
-USER_MEMORY = {
-    "last_query": None,
-    "last_best_option": None,
-    "name": None,
-}
+import threading
+import time
 
 
 def _format_option(opt: dict) -> str:
@@ -27,7 +29,104 @@ def _format_option(opt: dict) -> str:
     )
 
 
-def respond_intelligently(message: str, routes: list[dict], kb_dir) -> str:
+# chat priority -> journey planner objective
+JOURNEY_OBJECTIVES = {"price": "cheapest", "time": "earliest", "comfort": "fewest_transfers"}
+
+
+def _format_journey(origin: str, destination: str, journey: dict) -> str:
+    """Pretty formatting for a multi-leg itinerary."""
+    steps = "".join(
+        f"{i}. {leg['mode'].upper()} {leg['origin']} → {leg['destination']}"
+        f" ({leg['departure']} – {leg['arrival']}, ₹{leg['price']})\n"
+        for i, leg in enumerate(journey["legs"], 1)
+    )
+    return (
+        f"📍 No direct transport for **{origin} → {destination}**, "
+        f"but you can connect ({journey['transfers']} change{'s' if journey['transfers'] != 1 else ''}):\n\n"
+        f"{steps}\n"
+        f"💰 Total Fare: ₹{journey['price']}\n"
+        f"🕒 {journey['departure']} → {journey['arrival']} ({journey['duration_mins']} mins)\n\n"
+        "Would you like the fastest or cheapest alternative instead?"
+    )
+
+
+# intents whose reply depends only on the parsed message, the catalog and
+# (knowledge) the knowledge-base files; greetings are randomized and name
+# replies write per-session state
+CACHEABLE_INTENTS = {"identity", "rush", "websites", "packing", "route", "knowledge", "fallback"}
+
+
+# (intent, needs both cities) in precedence order; the first that applies wins
+INTENT_PRECEDENCE = (
+    ("greeting", False),
+    ("remember_name", False),
+    ("identity", False),
+    ("rush", False),
+    ("websites", False),
+    ("packing", False),
+    ("route", True),
+    ("knowledge", False),
+)
+
+
+def classify_message(message: str, catalog: RouteCatalog, router: IntentRouter = default_router) -> dict:
+    """
+    Parse a chat message into an intent plus the slots its reply needs:
+    {"intent", "msg", "origin", "destination", "priority", "when", "hits"}.
+    Keywords come from one router pass; cities are resolved only for routes.
+    "when" is the departure-time constraint of a route question, if any.
+    """
+    msg = (message or "").lower().strip()
+    parsed = {"intent": "empty", "msg": msg, "origin": None, "destination": None,
+              "priority": None, "when": None, "hits": None}
+    if not msg:
+        return parsed
+
+    with stage("intent_scan"):
+        routed = router.scan(msg)
+    parsed["hits"] = routed
+    for intent, needs_cities in INTENT_PRECEDENCE:
+        if not needs_cities:
+            if intent in routed.intents:
+                parsed["intent"] = intent
+                return parsed
+            continue
+
+        # Extract Cities (aliases + fuzzy, in message order)
+        with stage("city_resolve"):
+            cities = catalog.resolver.resolve(msg)
+        if len(cities) >= 2:
+            # Decide user intent: cheap vs fast vs comfort
+            priority = "price"
+            if "priority:time" in routed.slots: priority = "time"
+            elif "priority:comfort" in routed.slots: priority = "comfort"
+            parsed.update(intent=intent, origin=cities[0], destination=cities[1], priority=priority,
+                          when=parse_time_query(msg, routed))
+            return parsed
+
+    parsed["intent"] = "fallback"
+    return parsed
+
+
+def reply_cache_key(parsed: dict, kb_dir=None):
+    """
+    Normalized cache key for a parsed message, or None if its reply must
+    not be cached. Knowledge replies are keyed on the knowledge-base file
+    signature too, since editing those files does not bump the catalog version.
+    """
+    intent = parsed["intent"]
+    if intent not in CACHEABLE_INTENTS:
+        return None
+    if intent == "route":
+        return ("chat", intent, parsed["origin"], parsed["destination"], parsed["priority"],
+                parsed["when"])
+    if intent == "knowledge":
+        return ("chat", intent, parsed["msg"], kb_signature(kb_dir))
+    return ("chat", intent)
+
+
+def respond_intelligently(message: str, routes, kb_dir, cache=None,
+                          session: Optional[SessionState] = None) -> str:
     """
     FINAL Natural Language Conversational Travel Assistant Engine.
     Handles:
@@ -37,138 +136,312 @@ def respond_intelligently(message: str, routes: list[dict], kb_dir) -> str:
     - Website booking guidance
     - Seasonal rush planning
     - General travel preparation
+
+    `routes` is a RouteCatalog (preferred) or a plain list of route dicts.
+    With a ResponseCache, replies of cacheable intents are reused until the
+    catalog version changes. `session` carries the caller's conversation
+    state (name, last query, last best option); without one the reply is
+    computed against a throwaway state.
     """
 
     if not message or not message.strip():
         return "🙂 I didn't receive anything. Try asking *'Best way from Delhi to Agra?'*"
 
-    msg = message.lower().strip()
-    USER_MEMORY["last_query"] = message
-
-    # ----------------------------------------
-    # 1️⃣ Greeting / Identity Handling
-    # ----------------------------------------
-    greetings = ["hi", "hello", "hey", "namaste", "good morning", "good evening"]
-
-    if any(g in msg for g in greetings):
-        return random.choice([
-            "👋 Hey! Where are you planning to travel?",
-            "Hello 😊 tell me your travel route and I’ll guide you!",
-            "Hi! You can ask: *best train from Delhi to Jaipur*"
-        ])
-
-    if "my name is" in msg:
-        name = msg.split("my name is")[-1].strip().split(" ")[0].title()
-        USER_MEMORY["name"] = name
-        return f"Nice to meet you, {name}! Tell me your travel query 😊."
-
-    if "your name" in msg:
-        return "You can call me **TRAVIAAI** 🤖 — your intelligent travel assistant."
-
-    # ----------------------------------------
-    # 2️⃣ Extract Cities Using Fuzzy Matching
-    # ----------------------------------------
-    cities = list({r['origin'] for r in routes} | {r['destination'] for r in routes})
-    extracted = process.extract(msg, cities, limit=5, scorer=fuzz.partial_ratio)
-    extracted = [c for c in extracted if c[1] > 60]
-
-    origin = extracted[0][0] if len(extracted) > 0 else None
-    destination = extracted[1][0] if len(extracted) > 1 else None
-
-    # ----------------------------------------
-    # 3️⃣ Seasonal Rush / Holiday Travel Guidance
-    # ----------------------------------------
-    rush_keywords = ["holiday", "crowd", "festival", "rush", "peak", "long weekend"]
-    if any(word in msg for word in rush_keywords):
-        return (
-            "📌 **Peak Travel Advisory**:\n"
-            "Travel tends to be crowded during:\n"
-            "- 🚂 Long weekends\n"
-            "- 🎉 National holidays (Diwali, Christmas, Onam, Eid, Pongal)\n"
-            "- 💼 Summer vacations\n\n"
-            "**Smart Tips:**\n"
-            "✔ Book 20–45 days early\n"
-            "✔ Avoid Friday evenings\n"
-            "✔ Compare prices on MakeMyTrip, IRCTC, Redbus, IXIGO\n"
-            "✔ Keep digital documents & buffer time\n\n"
-            "Want me to search best options for your route now?"
-        )
-
-    # ----------------------------------------
-    # 4️⃣ Website Recommendation Intent
-    # ----------------------------------------
-    if any(x in msg for x in ["where to book", "website", "app", "online booking"]):
-        return (
-            "🛒 **Best Platforms to Book:**\n"
-            "- 🚆 Train → **IRCTC, IXIGO, MakeMyTrip**\n"
-            "- 🚌 Bus → **RedBus, AbhiBus, Goibibo**\n"
-            "- ✈️ Flights → **Cleartrip, IXIGO, MakeMyTrip**\n"
-            "- 🚕 Cab → **Uber, Ola, Rapido**\n\n"
-            "Tell me your route and I'll compare estimated prices."
-        )
-
-    # ----------------------------------------
-    # 5️⃣ Planning / Packing Help
-    # ----------------------------------------
-    if any(word in msg for word in ["prepare", "packing", "checklist", "travel tips"]):
-        return (
-            "🧳 **Travel Preparation Guide:**\n"
-            "• Keep ID, tickets, hotel booking copies\n"
-            "• Carry powerbank, water, medicines\n"
-            "• Reach station/airport early (Train: 30 min / Flight: 2 hrs)\n"
-            "• Download offline maps\n"
-            "• Share live location during solo travel\n\n"
-            "Want safety rules or booking suggestions?"
-        )
-
-    # ----------------------------------------
-    # 6️⃣ If Route Identified → Recommend Best Option
-    # ----------------------------------------
-    if origin and destination:
-        matches = [
-            r for r in routes
-            if fuzz.partial_ratio(r['origin'], origin) > 65
-            and fuzz.partial_ratio(r['destination'], destination) > 65
-        ]
-
-        if not matches:
+    catalog = routes if isinstance(routes, RouteCatalog) else RouteCatalog(routes)
+    if session is None:
+        session = SessionState()
+    session.last_query = message
+    parsed = classify_message(message, catalog)
+
+    key = reply_cache_key(parsed, kb_dir) if cache is not None and catalog.version is not None else None
+    if key is not None:
+        hit = cache.get(key, catalog.version)
+        if hit is not None:
+            reply, best = hit
+            if best is not None:
+                session.last_best_option = best
+            return reply
+
+    before = session.last_best_option
+    with stage(f"reply_{parsed['intent']}"):
+        reply = INTENT_HANDLERS[parsed["intent"]](parsed, message, catalog, kb_dir, session)
+    if key is not None:
+        best = session.last_best_option
+        cache.put(key, catalog.version, (reply, best if best is not before else None))
+    return reply
+
+
+# ----------------------------------------
+# Batch replay: many independent messages against one catalog snapshot
+# ----------------------------------------
+# threads shared by every batch in this process; chat work is mostly
+# Python, so past the core count extra threads mainly add overlap
+BATCH_MAX_WORKERS = 8
+
+_batch_pool: Optional[ThreadPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+
+
+def _get_batch_pool() -> ThreadPoolExecutor:
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ThreadPoolExecutor(BATCH_MAX_WORKERS, thread_name_prefix="chat-batch")
+    return _batch_pool
+
+
+def _respond_chunk(messages: List[str], catalog: RouteCatalog, kb_dir, cache) -> List[Dict]:
+    out = []
+    for message in messages:
+        t0 = time.perf_counter()
+        try:
+            item = {"reply": respond_intelligently(message, catalog, kb_dir, cache=cache)}
+        except Exception as exc:
+            # one bad message must not sink the rest of the replay
+            item = {"error": f"{type(exc).__name__}: {exc}"}
+        item["ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        out.append(item)
+    return out
+
+
+# (catalog, kb_dir, cache) inherited by forked batch workers
+_fork_state = None
+
+
+def _respond_chunk_forked(messages: List[str]) -> List[Dict]:
+    return _respond_chunk(messages, *_fork_state)
+
+
+def respond_batch(messages: List[str], catalog: RouteCatalog, kb_dir, cache=None,
+                  workers: int = BATCH_MAX_WORKERS, processes: bool = False) -> List[Dict]:
+    """
+    Answer many messages against one catalog, in input order, as
+    {"reply", "ms"} or {"error", "ms"} per item. Messages are independent:
+    each gets a throwaway session, so names and "last option" do not carry
+    over between items. Repeats of a message (same words, any case or
+    spacing) are answered once and carry "duplicate_of": first index.
+
+    Distinct messages are split into `workers` contiguous chunks run on the
+    shared thread pool (at most BATCH_MAX_WORKERS run at once).
+    processes=True forks that many workers instead, which inherit the
+    catalog without pickling it; use it from scripts only, forking a
+    threaded server is unsafe.
+    """
+    messages = list(messages)
+    first: Dict[str, int] = {}
+    unique: List[str] = []
+    slots: List[int] = []
+    for i, message in enumerate(messages):
+        norm = " ".join((message or "").lower().split())
+        slot = first.setdefault(norm, len(unique))
+        if slot == len(unique):
+            unique.append(message)
+        slots.append(slot)
+
+    workers = max(1, min(int(workers), len(unique) or 1))
+    if workers == 1:
+        answers = _respond_chunk(unique, catalog, kb_dir, cache)
+    else:
+        size = -(-len(unique) // workers)
+        chunks = [unique[i:i + size] for i in range(0, len(unique), size)]
+        if processes:
+            global _fork_state
+            _fork_state = (catalog, kb_dir, cache)
+            try:
+                ctx = multiprocessing.get_context("fork")
+                with ctx.Pool(len(chunks)) as pool:
+                    parts = pool.map(_respond_chunk_forked, chunks)
+            finally:
+                _fork_state = None
+        else:
+            pool = _get_batch_pool()
+            futures = [pool.submit(_respond_chunk, chunk, catalog, kb_dir, cache) for chunk in chunks]
+            parts = [f.result() for f in futures]
+        answers = [item for part in parts for item in part]
+
+    owner = {slot: i for i, slot in reversed(list(enumerate(slots)))}
+    results = []
+    for i, slot in enumerate(slots):
+        if owner[slot] == i:
+            results.append(answers[slot])
+        else:
+            results.append(dict(answers[slot], duplicate_of=owner[slot]))
+    return results
+
+
+# ----------------------------------------
+# Intent handlers: (parsed, message, catalog, kb_dir, session) -> reply
+# ----------------------------------------
+
+def _reply_greeting(parsed, message, catalog, kb_dir, session) -> str:
+    return random.choice([
+        "👋 Hey! Where are you planning to travel?",
+        "Hello 😊 tell me your travel route and I’ll guide you!",
+        "Hi! You can ask: *best train from Delhi to Jaipur*"
+    ])
+
+
+def _reply_remember_name(parsed, message, catalog, kb_dir, session) -> str:
+    # the name is the first word after the "my name is" span
+    hit = parsed["hits"].span("remember_name")
+    words = parsed["msg"][hit.end:].split()
+    name = words[0].strip(".,!?").title() if words else ""
+    session.name = name
+    return f"Nice to meet you, {name}! Tell me your travel query 😊."
+
+
+def _reply_identity(parsed, message, catalog, kb_dir, session) -> str:
+    return "You can call me **TRAVIAAI** 🤖 — your intelligent travel assistant."
+
+
+# ----------------------------------------
+# 3️⃣ Seasonal Rush / Holiday Travel Guidance
+# ----------------------------------------
+def _reply_rush(parsed, message, catalog, kb_dir, session) -> str:
+    return (
+        "📌 **Peak Travel Advisory**:\n"
+        "Travel tends to be crowded during:\n"
+        "- 🚂 Long weekends\n"
+        "- 🎉 National holidays (Diwali, Christmas, Onam, Eid, Pongal)\n"
+        "- 💼 Summer vacations\n\n"
+        "**Smart Tips:**\n"
+        "✔ Book 20–45 days early\n"
+        "✔ Avoid Friday evenings\n"
+        "✔ Compare prices on MakeMyTrip, IRCTC, Redbus, IXIGO\n"
+        "✔ Keep digital documents & buffer time\n\n"
+        "Want me to search best options for your route now?"
+    )
+
+
+# ----------------------------------------
+# 4️⃣ Website Recommendation Intent
+# ----------------------------------------
+def _reply_websites(parsed, message, catalog, kb_dir, session) -> str:
+    return (
+        "🛒 **Best Platforms to Book:**\n"
+        "- 🚆 Train → **IRCTC, IXIGO, MakeMyTrip**\n"
+        "- 🚌 Bus → **RedBus, AbhiBus, Goibibo**\n"
+        "- ✈️ Flights → **Cleartrip, IXIGO, MakeMyTrip**\n"
+        "- 🚕 Cab → **Uber, Ola, Rapido**\n\n"
+        "Tell me your route and I'll compare estimated prices."
+    )
+
+
+# ----------------------------------------
+# 5️⃣ Planning / Packing Help
+# ----------------------------------------
+def _reply_packing(parsed, message, catalog, kb_dir, session) -> str:
+    return (
+        "🧳 **Travel Preparation Guide:**\n"
+        "• Keep ID, tickets, hotel booking copies\n"
+        "• Carry powerbank, water, medicines\n"
+        "• Reach station/airport early (Train: 30 min / Flight: 2 hrs)\n"
+        "• Download offline maps\n"
+        "• Share live location during solo travel\n\n"
+        "Want safety rules or booking suggestions?"
+    )
+
+
+# ----------------------------------------
+# 6️⃣ If Route Identified → Recommend Best Option
+# ----------------------------------------
+# departures listed when a route question names a time
+TIMED_LISTING = 3
+
+
+def _departure_label(r: dict) -> str:
+    minute = minutes_of_day(r.get("departure"))
+    return "on demand" if minute is None else format_minute(minute)
+
+
+def _timed_matches(parsed, catalog) -> List[dict]:
+    """The route's rows that fit the message's time constraint, in departure order."""
+    when = parsed["when"]
+    if when.window is not None:
+        return catalog.departures_between(parsed["origin"], parsed["destination"], when.window)
+    return catalog.next_departures(parsed["origin"], parsed["destination"], when.after,
+                                   n=TIMED_LISTING)
+
+
+def _reply_route(parsed, message, catalog, kb_dir, session) -> str:
+    origin, destination, priority = parsed["origin"], parsed["destination"], parsed["priority"]
+    when = parsed["when"]
+    # the requested priority plus the alternatives, from the materialized table
+    priorities = (priority, "price", "time")
+    ranked = catalog.recommend(origin, destination, priorities, k=1)
+
+    if not ranked[priority]:
+        # no direct row: try connecting legs
+        depart_after = 0 if when is None else (
+            when.window.start if when.window is not None else when.after)
+        journeys = catalog.timetable.plan(origin, destination, depart_after=depart_after,
+                                          objective=JOURNEY_OBJECTIVES[priority], k=1)
+        if not journeys:
             return f"❌ I found **{origin} → {destination}**, but no exact transport. Try nearby cities?"
+        session.last_best_option = journeys[0]
+        return _format_journey(origin, destination, journeys[0])
+
+    timing = ""
+    if when is not None:
+        timed = _timed_matches(parsed, catalog)
+        if timed:
+            # only these departures count: one columnar pass over them
+            ranked = rank_by_priorities(timed, priorities, k=1)
+            heading = "Next departures" if when.window is None else f"Departures {when.label}"
+            timing = f"🕐 {heading}:\n" + "".join(
+                f"• {_departure_label(r)} {r['mode'].upper()} ₹{r['price']}"
+                f" ({r['duration_mins']} mins)\n"
+                for r in timed[:TIMED_LISTING]
+            ) + "\n"
+        else:
+            timing = f"⏰ Nothing leaves {when.label}, so here is the best of the whole day.\n\n"
+
+    best = ranked[priority][0]
+    session.last_best_option = best
+
+    alternatives = ""
+    cheapest, fastest = ranked["price"][0], ranked["time"][0]
+    if cheapest["id"] != best["id"]:
+        alternatives += f"💸 Cheapest: {cheapest['mode'].upper()} at ₹{cheapest['price']}\n"
+    if fastest["id"] != best["id"]:
+        alternatives += f"⚡ Fastest: {fastest['mode'].upper()} in {fastest['duration_mins']} mins\n"
+    if alternatives:
+        alternatives += "\n"
 
-        # Decide user intent: cheap vs fast vs comfort
-        priority = "price"
-        if "fast" in msg or "quick" in msg: priority = "time"
-        elif "comfortable" in msg or "luxury" in msg: priority = "comfort"
-
-        recs = recommend_transport_options(matches, priority)
-        best = recs[0]
-        USER_MEMORY["last_best_option"] = best
-
-        return (
-            f"📍 Found a match for **{origin} → {destination}**\n"
-            f"🔍 Filter applied: **{'Cheapest' if priority=='price' else 'Fastest'} travel option**\n\n"
-            f"🚗 **Best Mode: {best['mode'].upper()}**\n"
-            f"🏁 Route: {best['origin']} → {best['destination']}\n"
-            f"💰 Fare: ₹{best['price']}\n"
-            f"⭐ Rating: {best['rating']}/5\n"
-            f"🕒 Travel Time: {best['duration_mins']} mins\n\n"
-            "Would you like:\n"
-            "👉 price comparison websites?\n"
-            "👉 alternative routes?\n"
-            "👉 safety / baggage rules?"
-        )
-
-    # ----------------------------------------
-    # 7️⃣ Knowledge Base Queries (Safety, Baggage)
-    # ----------------------------------------
-    if any(word in msg for word in ["safety", "baggage", "rules", "luggage"]):
-        ctx = retrieve_context(message, kb_dir)
-        if ctx:
-            top = ctx[0]
-            return f"📘 **{top['title'].replace('_', ' ').title()}**\n\n{top['snippet']}..."
-
-    # ----------------------------------------
-    # 8️⃣ Generic fallback
-    # ----------------------------------------
+    return (
+        f"📍 Found a match for **{origin} → {destination}**\n"
+        f"🔍 Filter applied: **{'Cheapest' if priority=='price' else 'Fastest'} travel option**\n\n"
+        f"{timing}"
+        f"🚗 **Best Mode: {best['mode'].upper()}**\n"
+        f"🏁 Route: {best['origin']} → {best['destination']}\n"
+        + (f"🛫 Departs: {_departure_label(best)}\n" if when is not None else "") +
+        f"💰 Fare: ₹{best['price']}\n"
+        f"⭐ Rating: {best['rating']}/5\n"
+        f"🕒 Travel Time: {best['duration_mins']} mins\n\n"
+        f"{alternatives}"
+        "Would you like:\n"
+        "👉 price comparison websites?\n"
+        "👉 alternative routes?\n"
+        "👉 safety / baggage rules?"
+    )
+
+
+# ----------------------------------------
+# 7️⃣ Knowledge Base Queries (Safety, Baggage)
+# ----------------------------------------
+def _reply_knowledge(parsed, message, catalog, kb_dir, session) -> str:
+    ctx = retrieve_context(message, kb_dir)
+    if ctx:
+        top = ctx[0]
+        return f"📘 **{top['title'].replace('_', ' ').title()}**\n\n{top['snippet']}..."
+    return _reply_fallback(parsed, message, catalog, kb_dir, session)
+
+
+# ----------------------------------------
+# 8️⃣ Generic fallback
+# ----------------------------------------
+def _reply_fallback(parsed, message, catalog, kb_dir, session) -> str:
     return (
         "🤖 I can help with:\n"
         "• Best routes & modes (train/bus/flight/cab)\n"
@@ -177,4 +450,17 @@ def respond_intelligently(message: str, routes: list[dict], kb_dir) -> str:
         "• Safety & baggage rules\n"
         "• Website booking suggestions\n\n"
         "Try typing: *cheapest delhi to agra* or *best flight mumbai to goa* ✈️"
-    )
\ No newline at end of file
+    )
+
+
+INTENT_HANDLERS = {
+    "greeting": _reply_greeting,
+    "remember_name": _reply_remember_name,
+    "identity": _reply_identity,
+    "rush": _reply_rush,
+    "websites": _reply_websites,
+    "packing": _reply_packing,
+    "route": _reply_route,
+    "knowledge": _reply_knowledge,
+    "fallback": _reply_fallback,
+}
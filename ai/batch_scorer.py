@@ -0,0 +1,137 @@
+"""
+Vectorized scorer for transport options.
+
+Route attributes are held in columnar NumPy arrays and every priority is a
+single array expression, so scoring 1M options is a handful of array ops
+instead of 1M Python iterations. Top-k uses argpartition, not a full sort.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PRIORITIES = ("price", "time", "comfort", "eco")
+
+# greener modes get a boost under priority="eco"
+ECO_FACTORS = {"train": 1.5, "bus": 1.5, "flight": 0.7}
+
+
+def _column(rows: Sequence[Dict], key: str, default: float) -> np.ndarray:
+    # same coercion as the old per-row scorer: missing/None/0 -> default
+    return np.fromiter(
+        (float(r.get(key, default) or default) for r in rows),
+        dtype=np.float64, count=len(rows),
+    )
+
+
+class RouteBatch:
+    """Columnar view of a list of route dicts (rows are kept, not copied)."""
+
+    __slots__ = ("rows", "price", "duration", "seats", "rating", "eco")
+
+    def __init__(self, rows: Sequence[Dict], price: np.ndarray, duration: np.ndarray,
+                 seats: np.ndarray, rating: np.ndarray, eco: np.ndarray):
+        self.rows = rows
+        self.price = price
+        self.duration = duration
+        self.seats = seats
+        self.rating = rating
+        self.eco = eco
+
+    @classmethod
+    def from_dicts(cls, rows: Sequence[Dict]) -> "RouteBatch":
+        eco = np.fromiter(
+            (ECO_FACTORS.get((r.get("mode") or "").lower(), 1.0) for r in rows),
+            dtype=np.float64, count=len(rows),
+        )
+        return cls(
+            rows,
+            price=_column(rows, "price", 0.0),
+            duration=_column(rows, "duration_mins", 60.0),
+            seats=_column(rows, "seats_available", 1.0),
+            rating=_column(rows, "rating", 4.0),
+            eco=eco,
+        )
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+
+def score_batch(batch: RouteBatch, priority: str = "price") -> np.ndarray:
+    """Scores for every row, rounded to 3 decimals like the dict scorer."""
+    if priority == "price":
+        score = 1000 / (batch.price + 1) + batch.rating * 5 + batch.seats * 0.5
+    elif priority == "time":
+        score = 2000 / (batch.duration + 1) + batch.rating * 5
+    elif priority == "comfort":
+        score = batch.rating * 20 + batch.seats * 0.2
+    elif priority == "eco":
+        score = batch.eco * 1000 / (batch.price + 1) + batch.rating * 3
+    else:
+        score = batch.rating * 10
+    return np.round(score, 3)
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None,
+                  mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Indices of the k best scores, best first. Ties keep input order, matching
+    the stable sort of the dict scorer. k=None ranks everything.
+    """
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+    if k is not None and k < len(candidates):
+        if k <= 0:
+            return candidates[:0]
+        neg = -scores[candidates]
+        kth = -neg[np.argpartition(neg, k - 1)[k - 1]]
+        # keep everything tied with the k-th score so the stable sort decides
+        candidates = candidates[scores[candidates] >= kth]
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order][:k]
+
+
+def rank_batch(batch: RouteBatch, priority: str = "price", k: Optional[int] = None,
+               max_budget: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(row indices best-first, scores for all rows)."""
+    scores = score_batch(batch, priority)
+    mask = batch.price <= max_budget if max_budget is not None else None
+    return top_k_indices(scores, k, mask), scores
+
+
+def rows_with_scores(batch: RouteBatch, order: np.ndarray, scores: np.ndarray) -> List[Dict]:
+    out = []
+    for i in order.tolist():
+        new_opt = dict(batch.rows[i])
+        new_opt["score"] = float(scores[i])
+        out.append(new_opt)
+    return out
+
+
+def rank_priorities(batch: RouteBatch, priorities: Sequence[str] = PRIORITIES,
+                    k: Optional[int] = 1,
+                    max_budget: Optional[float] = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """{priority: (top-k row indices, scores)} over the same columns and budget mask."""
+    mask = batch.price <= max_budget if max_budget is not None else None
+    ranked = {}
+    for p in priorities:
+        scores = score_batch(batch, p)
+        ranked[p] = (top_k_indices(scores, k, mask), scores)
+    return ranked
+
+
+def pareto_indices(batch: RouteBatch, max_budget: Optional[float] = None) -> np.ndarray:
+    """
+    Rows not beaten on both price and duration, cheapest first. A row is
+    dropped if another is no more expensive and strictly faster (or equally
+    fast and strictly cheaper).
+    """
+    candidates = np.arange(len(batch))
+    if max_budget is not None:
+        candidates = candidates[batch.price <= max_budget]
+    if len(candidates) == 0:
+        return candidates
+
+    by_price = candidates[np.lexsort((batch.duration[candidates], batch.price[candidates]))]
+    duration = batch.duration[by_price]
+    # fastest seen among all cheaper-or-equal rows before each position
+    best_before = np.concatenate(([np.inf], np.minimum.accumulate(duration)[:-1]))
+    return by_price[duration < best_before]
@@ -0,0 +1,471 @@
+"""
+Process-wide route catalog: the transports table loaded once into compact
+columns (ai/route_columns.py) and shared read-only by every request. When
+the catalog version changes it is patched with the rows named in the
+catalog_changes log, or rebuilt if the log can't say.
+"""
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import mmap
+import os
+import pickle
+import struct
+import threading
+
+import numpy as np
+
+from ai.batch_scorer import PRIORITIES
+from ai.city_resolver import CityResolver
+from ai.journey_planner import Timetable
+from ai.recommendation_table import RecommendationTable
+from ai.recommender import rank_by_priorities
+from ai.route_columns import CATALOG_FIELDS, MINUTE_BITS, ONDEMAND, SELECT_CATALOG, RouteColumns
+from storage.schema import DAY_MINS, catalog_changes, catalog_version
+from storage.queries import TimeWindow
+
+
+# columns the journey planner reads; changes to anything else (seats,
+# rating, name) let a patched catalog rebind the built timetable to its rows
+TIMETABLE_FIELDS = ("mode", "origin", "destination", "departure", "arrival",
+                    "duration_mins", "price")
+
+
+class RouteRows(Sequence):
+    """Catalog rows by position, each read out as a fresh dict."""
+
+    def __init__(self, columns: RouteColumns):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.columns.rows(i)
+        if i < 0:
+            i += len(self.columns)
+        if not 0 <= i < len(self.columns):
+            raise IndexError(i)
+        return self.columns.row(i)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return self.columns.iter_rows()
+
+
+class RoutesById(Mapping):
+    """id -> row dict, looked up through the columns' id index."""
+
+    def __init__(self, columns: RouteColumns):
+        self.columns = columns
+
+    def __getitem__(self, rid) -> Dict:
+        i = self.columns.find(rid)
+        if i is None:
+            raise KeyError(rid)
+        return self.columns.row(i)
+
+    def __contains__(self, rid) -> bool:
+        return self.columns.find(rid) is not None
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __iter__(self) -> Iterator[str]:
+        ids = self.columns.ids
+        return (ids[s] for s in self.columns.slot.tolist())
+
+
+class RouteCatalog:
+    """
+    Read-only snapshot of the transports table.
+    - cities: sorted city vocabulary (origins + destinations)
+    - routes / by_id: every row, by position or id
+    - routes_between / departures_between / next_departures: a city pair
+      is one slice of the sorted columns, already in departure order
+    - routes_for_mode and every `mode` filter: the columns' per-mode index
+    - recommend: best options per priority, from the materialized
+      RecommendationTable
+
+    Rows are returned as new dicts of CATALOG_FIELDS; extra_json is not
+    held in memory (storage.queries.fetch_extra reads it for returned rows).
+    `patched` derives the next snapshot from a few changed rows without
+    touching this one, so readers never see a half-updated catalog.
+    """
+
+    def __init__(self, routes: Iterable[Dict], version: Optional[int] = None):
+        self._use(RouteColumns.build(tuple(r.get(f) for f in CATALOG_FIELDS) for r in routes),
+                  version)
+
+    @classmethod
+    def from_columns(cls, columns: RouteColumns, version: Optional[int] = None) -> "RouteCatalog":
+        catalog = cls.__new__(cls)
+        catalog._use(columns, version)
+        return catalog
+
+    def _use(self, columns: RouteColumns, version: Optional[int]) -> None:
+        self.version = version
+        self.columns = columns
+        self.routes = RouteRows(columns)
+        self.by_id = RoutesById(columns)
+        keys, names = columns.city_keys.texts, columns.city_names
+        self.cities: List[str] = sorted(
+            names[c] for c in np.flatnonzero(columns.city_refs).tolist() if keys[c])
+        self._resolver: Optional[CityResolver] = None
+        self._timetable: Optional[Timetable] = None
+        self._recommendations: Optional[RecommendationTable] = None
+
+    def patched(self, changed: List[Dict], deleted: Iterable[str],
+                version: Optional[int] = None) -> "RouteCatalog":
+        """
+        New catalog with `changed` rows upserted and `deleted` ids removed.
+        The columns are merged, not rebuilt; the city resolver is kept
+        unless the vocabulary changed, the timetable is rebound to the new
+        rows unless a TIMETABLE_FIELDS column changed, and recommendations
+        are re-ranked only for the city pairs of changed rows.
+        """
+        columns = self.columns
+        gone: List[int] = []
+        structural = False
+        for rid in deleted:
+            i = columns.find(rid)
+            if i is not None:
+                gone.append(i)
+                structural = True
+        for r in changed:
+            i = columns.find(r.get("id"))
+            if i is None:
+                structural = True
+                continue
+            gone.append(i)
+            if not structural:
+                old = columns.row(i)
+                structural = any(old.get(f) != r.get(f) for f in TIMETABLE_FIELDS)
+
+        new = RouteCatalog.from_columns(
+            columns.patched([tuple(r.get(f) for f in CATALOG_FIELDS) for r in changed], gone),
+            version)
+        if new.cities == self.cities:
+            new._resolver = self._resolver
+        if self._timetable is not None and not structural:
+            # same legs, moved rows: untouched rows keep their string slot,
+            # changed ones (gone[j] is changed[j] here) are found by id
+            row_map = new.columns.slot_row[columns.slot]
+            for i, r in zip(gone, changed):
+                row_map[i] = new.columns.find(r.get("id"))
+            new._timetable = self._timetable.rebound(new.routes, row_map)
+        if self._recommendations is not None:
+            added = new.columns.key[new.columns.slot >= len(columns.ids)]
+            pairs = np.concatenate((columns.key[np.asarray(gone, dtype=np.int64)], added))
+            new._recommendations = self._recommendations.patched(new.columns,
+                                                                 (pairs >> MINUTE_BITS).tolist())
+        return new
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    @property
+    def resolver(self) -> CityResolver:
+        """City resolver over this catalog's vocabulary, built on first use."""
+        if self._resolver is None:
+            self._resolver = CityResolver(self.cities)
+        return self._resolver
+
+    @property
+    def timetable(self) -> Timetable:
+        """Multi-leg journey planner over this catalog, built on first use."""
+        if self._timetable is None:
+            self._timetable = Timetable(self.routes)
+        return self._timetable
+
+    @property
+    def recommendations(self) -> RecommendationTable:
+        """Top-k options per city pair and priority, ranked once on first use."""
+        if self._recommendations is None:
+            return self.build_recommendations()
+        return self._recommendations
+
+    def build_recommendations(self) -> RecommendationTable:
+        """Rank the RecommendationTable now unless it is already built."""
+        with _ranking_lock:
+            if self._recommendations is None:
+                self._recommendations = RecommendationTable.build(self.columns)
+        return self._recommendations
+
+    def warm(self) -> "RouteCatalog":
+        """Build the resolver, timetable, recommendations and mode index now."""
+        if self._resolver is None:
+            self._resolver = CityResolver(self.cities)
+        if self._timetable is None:
+            self._timetable = Timetable(self.routes)
+        self.build_recommendations()
+        self.columns.build_mode_index()
+        return self
+
+    def recommend(self, origin: str, destination: str,
+                  priorities: Sequence[str] = ("price", "time", "comfort"), k: int = 1,
+                  max_budget: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """
+        Best k routes per priority between two cities, as
+        rank_by_priorities(routes_between(...)) returns them. One keyed
+        lookup in the materialized table; a budget, a k beyond the table's
+        or an unknown priority is scored live over the pair's rows.
+        """
+        table = self.recommendations
+        if max_budget is not None or k > table.k or not set(priorities) <= set(PRIORITIES):
+            return rank_by_priorities(self.routes_between(origin, destination), priorities,
+                                      k=k, max_budget=max_budget)
+        return table.lookup(self.columns, self.columns.pair_code(origin, destination),
+                            priorities, k)
+
+    def _rows(self, ranges: List[Tuple[int, int]], mode: Optional[str]):
+        """Row indices covering `ranges` in order, keeping only `mode` rows if given."""
+        if mode:
+            # the mode index narrowed to each range, not a scan of the range
+            parts = [self.columns.mode_range(mode, lo, hi) for lo, hi in ranges]
+        elif len(ranges) == 1:
+            return slice(*ranges[0])
+        else:
+            parts = [np.arange(lo, hi) for lo, hi in ranges]
+        return np.concatenate(parts or [np.zeros(0, np.int64)])
+
+    def routes_for_mode(self, mode: str) -> List[Dict]:
+        """Every row of `mode` (any case), in catalog order."""
+        return self.columns.rows(self.columns.of_mode(mode))
+
+    def routes_between(self, origin: str, destination: str,
+                       mode: Optional[str] = None) -> List[Dict]:
+        """Rows from origin to destination (any case), in departure order."""
+        pair = self.columns.pair_code(origin, destination)
+        if pair is None:
+            return []
+        return self.columns.rows(self._rows([self.columns.key_range(pair)], mode))
+
+    def departures_between(self, origin: str, destination: str, window: TimeWindow,
+                           mode: Optional[str] = None) -> List[Dict]:
+        """
+        Rows leaving inside `window`, in departure order (a window past
+        midnight lists the evening first), then on-demand rows if the
+        window takes them. Binary searches on the sorted keys.
+        """
+        pair = self.columns.pair_code(origin, destination)
+        if pair is None:
+            return []
+        key_range = self.columns.key_range
+        if window.start <= window.end:
+            ranges = [key_range(pair, window.start, window.end)]
+        else:
+            ranges = [key_range(pair, window.start, DAY_MINS - 1), key_range(pair, 0, window.end)]
+        if window.ondemand:
+            ranges.append(key_range(pair, ONDEMAND, ONDEMAND))
+        return self.columns.rows(self._rows(ranges, mode))
+
+    def next_departures(self, origin: str, destination: str, after: int, n: int = 5,
+                        mode: Optional[str] = None, ondemand: bool = True) -> List[Dict]:
+        """
+        The next `n` departures at or after minute `after`: on-demand rows
+        first (they leave right away, unless `ondemand` is False), then the
+        scheduled ones, continuing into the next day when today's run out.
+        """
+        pair = self.columns.pair_code(origin, destination)
+        if pair is None:
+            return []
+        key_range = self.columns.key_range
+        lo, hi = key_range(pair, 0, DAY_MINS - 1)
+        start = key_range(pair, after, DAY_MINS - 1)[0]
+        ranges = [key_range(pair, ONDEMAND, ONDEMAND)] if ondemand else []
+        ranges += [(start, hi), (lo, start)]
+        index = self._rows(ranges, mode)
+        return self.columns.rows(index[:n] if isinstance(index, np.ndarray) else index)
+
+
+_catalog: Optional[RouteCatalog] = None
+_catalog_lock = threading.Lock()
+# one full reload at a time, outside _catalog_lock so patches and readers are not held up
+_reload_lock = threading.Lock()
+# one full ranking at a time: concurrent first users wait instead of each building
+_ranking_lock = threading.Lock()
+
+
+def load_catalog(db, version: Optional[int] = None) -> RouteCatalog:
+    cursor = db.cursor()
+    cursor.row_factory = None       # plain tuples straight into the column builder
+    return RouteCatalog.from_columns(RouteColumns.build(cursor.execute(SELECT_CATALOG)), version)
+
+
+# past this share of changed rows a full reload is cheaper than patching
+PATCH_MAX_FRACTION = 0.25
+
+
+def patch_catalog(db, catalog: RouteCatalog, version: int) -> Optional[RouteCatalog]:
+    """
+    `catalog` brought up to `version` from the catalog_changes log, reading
+    only the changed rows; None if the log cannot cover the gap, or once
+    patched-away rows hold as many string slots as live ones (a reload
+    compacts them).
+    """
+    if catalog.version is None or catalog.columns.garbage > len(catalog):
+        return None
+    ids = catalog_changes(db, catalog.version, version)
+    if ids is None or len(ids) > max(1000, PATCH_MAX_FRACTION * len(catalog)):
+        return None
+    ids = list(ids)
+    changed: List[Dict] = []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        changed.extend(dict(r) for r in db.execute(
+            f"{SELECT_CATALOG} WHERE id IN ({marks})", chunk))
+    found = {r["id"] for r in changed}
+    return catalog.patched(changed, [i for i in ids if i not in found], version)
+
+
+def _current(catalog: RouteCatalog, version: int) -> bool:
+    return catalog.version is not None and catalog.version >= version
+
+
+def get_catalog(db) -> RouteCatalog:
+    """
+    Return the shared catalog, bringing it up to date if `transports`
+    changed since it was built: patched from the change log when possible,
+    otherwise reloaded. The staleness check is a single-row read.
+    Versions only grow, so a request that read its version before another
+    thread moved the catalog on is served the newer catalog, never a reload
+    back to the older one.
+    """
+    global _catalog
+    version = catalog_version(db)
+    catalog = _catalog
+    if catalog is not None and _current(catalog, version):
+        return catalog
+
+    with _catalog_lock:
+        if _catalog is not None and not _current(_catalog, version):
+            catalog = patch_catalog(db, _catalog, version)
+            if catalog is not None:
+                _catalog = catalog
+        if _catalog is not None and _current(_catalog, version):
+            return _catalog
+    return _reload(db, version)
+
+
+def _reload(db, version: int) -> RouteCatalog:
+    """
+    Full reload for get_catalog. The new catalog is loaded and ranked
+    before it is shared, so every later patch carries the table, and only
+    the swap itself holds _catalog_lock.
+    """
+    global _catalog
+    with _reload_lock:
+        catalog = _catalog
+        if catalog is not None and _current(catalog, version):
+            return catalog      # reloaded by another thread meanwhile
+        catalog = load_catalog(db, version)
+        catalog.build_recommendations()
+        with _catalog_lock:
+            if _catalog is None or not _current(_catalog, version):
+                _catalog = catalog
+            return _catalog
+
+
+def invalidate_catalog() -> None:
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+# ------- Snapshot -------
+# magic, catalog version, payload offset, payload length, buffer count
+_SNAPSHOT_HEADER = struct.Struct("<8sqQQI4x")
+_SNAPSHOT_MAGIC = b"RCATSNP5"
+_SNAPSHOT_ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return -(-n // _SNAPSHOT_ALIGN) * _SNAPSHOT_ALIGN
+
+
+def save_snapshot(catalog: RouteCatalog, path: Path) -> int:
+    """
+    Write `catalog` with its resolver, timetable, recommendations and
+    mode index already built. Pickle protocol 5 keeps their arrays out of
+    band, stored raw and aligned so `load_snapshot` can map them instead of
+    copying.
+    Returns the file size.
+    """
+    catalog.warm()      # built so they are part of the file
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(catalog, protocol=5, buffer_callback=buffers.append)
+    raws = [b.raw() for b in buffers]
+
+    table_at = _SNAPSHOT_HEADER.size
+    payload_at = _align(table_at + 16 * len(raws))
+    offsets = []
+    offset = _align(payload_at + len(payload))
+    for raw in raws:
+        offsets.append(offset)
+        offset = _align(offset + raw.nbytes)
+
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, catalog.version or 0,
+                                      payload_at, len(payload), len(raws)))
+        for at, raw in zip(offsets, raws):
+            f.write(struct.pack("<QQ", at, raw.nbytes))
+        f.seek(payload_at)
+        f.write(payload)
+        for at, raw in zip(offsets, raws):
+            f.seek(at)
+            f.write(raw)
+        f.truncate(offset)
+    os.replace(tmp, path)
+    return offset
+
+
+def load_snapshot(path: Path) -> Optional[RouteCatalog]:
+    """
+    Catalog from a snapshot written by `save_snapshot`, or None if missing
+    or unreadable. The file is memory-mapped: catalog columns and timetable
+    arrays are read-only views of it, so forked workers share one copy through the page cache.
+    Only load snapshots this app wrote (they are pickles).
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    view = memoryview(mm)
+    try:
+        magic, version, payload_at, size, n = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != _SNAPSHOT_MAGIC:
+            return None
+        table = [struct.unpack_from("<QQ", view, _SNAPSHOT_HEADER.size + 16 * i) for i in range(n)]
+        catalog = pickle.loads(view[payload_at:payload_at + size],
+                               buffers=[view[at:at + nbytes] for at, nbytes in table])
+    except Exception:
+        # truncated, foreign or from an older code version: rebuilt by the caller
+        return None
+    return catalog if isinstance(catalog, RouteCatalog) and catalog.version == version else None
+
+
+def warm_catalog(db, snapshot: Optional[Path] = None) -> RouteCatalog:
+    """
+    Install the shared catalog before serving: from `snapshot` when it is
+    current (or can be patched up to date), else from SQLite. The snapshot
+    is rewritten whenever it was stale.
+    """
+    global _catalog
+    version = catalog_version(db)
+    catalog = load_snapshot(snapshot) if snapshot else None
+    fresh = catalog is not None and catalog.version == version
+    if catalog is not None and not fresh:
+        catalog = patch_catalog(db, catalog, version)
+    if catalog is None:
+        catalog = load_catalog(db, version)
+    catalog.warm()
+    if snapshot and not fresh:
+        save_snapshot(catalog, snapshot)
+    with _catalog_lock:
+        _catalog = catalog
+    return catalog
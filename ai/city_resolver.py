@@ -0,0 +1,138 @@
+"""
+City resolver for chat messages: alias/misspelling table, trigram candidate
+index and a cached fuzzy re-rank over the few candidates the index returns.
+Built once per catalog, so per-message cost no longer grows with routes.
+"""
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+from rapidfuzz import fuzz
+
+# alternate names / common misspellings -> canonical catalog name
+CITY_ALIASES = {
+    "bangalore": "Bengaluru",
+    "banglore": "Bengaluru",
+    "bengaluru city": "Bengaluru",
+    "blr": "Bengaluru",
+    "bombay": "Mumbai",
+    "madras": "Chennai",
+    "calcutta": "Kolkata",
+    "gurgaon": "Gurugram",
+    "mysore": "Mysuru",
+    "vizag": "Visakhapatnam",
+    "new delhi": "Delhi",
+    "poona": "Pune",
+    "hyd": "Hyderabad",
+    "secunderabad": "Hyderabad",
+    "kovai": "Coimbatore",
+    "igi": "IGI Airport",
+}
+
+# travel vocabulary that must never be fuzzy-matched to a city
+STOPWORDS = {
+    "from", "to", "via", "and", "the", "for", "with", "best", "cheap", "cheapest",
+    "fast", "fastest", "quick", "route", "routes", "travel", "trip", "ticket",
+    "tickets", "train", "trains", "bus", "buses", "flight", "flights", "taxi",
+    "cab", "bike", "book", "today", "tomorrow", "morning", "evening", "night",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class CityResolver:
+    """
+    Resolve free-text city mentions to canonical catalog names.
+    - exact lookup on lowercased names and aliases
+    - otherwise trigram candidates, re-ranked with fuzz.ratio
+    - phrase results are LRU-cached
+    """
+
+    def __init__(self, cities: Iterable[str], aliases: Optional[Dict[str, str]] = None,
+                 min_score: float = 80.0, max_candidates: int = 8,
+                 max_words: int = 3, cache_size: int = 8192):
+        self.cities: List[str] = list(cities)
+        self.min_score = min_score
+        self.max_candidates = max_candidates
+        self.max_words = max_words
+
+        ids = {c.lower(): i for i, c in enumerate(self.cities)}
+        # searchable keys: (lowercased name or alias, canonical city id)
+        self._keys: List[Tuple[str, int]] = list(ids.items())
+        for alias, canonical in (CITY_ALIASES if aliases is None else aliases).items():
+            cid = ids.get(canonical.lower())
+            if cid is not None and alias.lower() not in ids:
+                self._keys.append((alias.lower(), cid))
+
+        self._exact: Dict[str, int] = {key: cid for key, cid in self._keys}
+        self._grams: Dict[str, List[int]] = defaultdict(list)
+        for kid, (key, _) in enumerate(self._keys):
+            for g in set(trigrams(key)):
+                self._grams[g].append(kid)
+
+        self._common_gram_limit = max(64, len(self._keys) // 50)
+
+        self.cache_size = cache_size
+        self.resolve_phrase = lru_cache(maxsize=cache_size)(self._resolve_phrase)
+
+    def __getstate__(self):
+        # the phrase cache is per process; catalog snapshots carry the indexes only
+        state = dict(self.__dict__)
+        del state["resolve_phrase"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.resolve_phrase = lru_cache(maxsize=self.cache_size)(self._resolve_phrase)
+
+    def _resolve_phrase(self, phrase: str) -> Optional[Tuple[int, float]]:
+        """(city id, score) for a lowercased phrase, or None."""
+        cid = self._exact.get(phrase)
+        if cid is not None:
+            return cid, 100.0
+        if len(phrase) < 4 or any(w in STOPWORDS for w in phrase.split()):
+            return None
+
+        postings = [self._grams[g] for g in set(trigrams(phrase)) if g in self._grams]
+        if not postings:
+            return None
+        # skip very common grams ("pur", "bad") unless nothing else is left
+        rare = [p for p in postings if len(p) <= self._common_gram_limit] or postings
+        counts = Counter(chain.from_iterable(rare))
+
+        best_kid, best_score = -1, 0.0
+        for kid, _ in counts.most_common(self.max_candidates):
+            score = fuzz.ratio(phrase, self._keys[kid][0])
+            if score > best_score:
+                best_kid, best_score = kid, score
+        if best_score < self.min_score:
+            return None
+        return self._keys[best_kid][1], best_score
+
+    def resolve(self, message: str) -> List[str]:
+        """Canonical cities mentioned in `message`, in the order they appear."""
+        words = _WORD_RE.findall(message.lower())
+        found: List[str] = []
+        i = 0
+        while i < len(words):
+            # best-scoring phrase starting at word i; ties go to the longer phrase
+            best = None
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                hit = self.resolve_phrase(" ".join(words[i:i + n]))
+                if hit and (best is None or hit[1] > best[1]):
+                    best = (hit[0], hit[1], n)
+            if best is None:
+                i += 1
+                continue
+            city = self.cities[best[0]]
+            if city not in found:
+                found.append(city)
+            i += best[2]
+        return found
@@ -0,0 +1,103 @@
+"""
+Intent router for chat messages.
+
+Every keyword phrase of every intent is loaded into one word-level trie.
+A scan tokenizes the message once and walks the trie from each word, so it
+returns all intent and slot hits with their spans in a single pass, with
+whole-word matching ("hi" no longer fires inside "delhi"). Cost per message
+is linear in its length (times the longest phrase, a few words) and does
+not grow with the number of intents or keywords.
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set
+import re
+
+# intent -> keyword phrases (whole words, lowercase)
+INTENT_PATTERNS: Dict[str, Sequence[str]] = {
+    "greeting": ["hi", "hii", "hello", "hey", "namaste", "good morning", "good evening"],
+    "remember_name": ["my name is"],
+    "identity": ["your name"],
+    "rush": ["holiday", "holidays", "crowd", "crowded", "crowds", "festival", "festivals",
+             "rush", "peak", "long weekend", "long weekends"],
+    "websites": ["where to book", "website", "websites", "app", "apps", "online booking"],
+    "packing": ["prepare", "preparation", "packing", "checklist", "travel tips"],
+    "knowledge": ["safety", "baggage", "rules", "luggage"],
+}
+
+# slot -> keyword phrases; "priority" slots pick how route options are ranked,
+# "time" slots restrict them to a departure window
+SLOT_PATTERNS: Dict[str, Sequence[str]] = {
+    "priority:time": ["fast", "faster", "fastest", "quick", "quicker", "quickest", "quickly"],
+    "priority:comfort": ["comfort", "comfortable", "luxury", "luxurious"],
+    "priority:price": ["cheap", "cheaper", "cheapest", "budget", "affordable"],
+    # departure time slots (ai/time_window.py)
+    "time:early_morning": ["early morning", "dawn", "sunrise"],
+    "time:morning": ["morning"],
+    "time:afternoon": ["afternoon", "noon", "midday"],
+    "time:evening": ["evening", "sunset"],
+    "time:night": ["night", "tonight", "overnight", "late night", "midnight"],
+    "time:next": ["next", "now", "soon", "soonest", "right now", "leaving now"],
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_END = ""   # trie key holding the labels of a complete phrase
+
+
+class Hit(NamedTuple):
+    label: str      # intent name or slot name
+    start: int
+    end: int
+
+
+class RoutedMessage(NamedTuple):
+    intents: Set[str]
+    slots: Dict[str, Hit]   # first hit per slot
+    hits: List[Hit]
+
+    def span(self, label: str) -> Optional[Hit]:
+        for hit in self.hits:
+            if hit.label == label:
+                return hit
+        return None
+
+
+class IntentRouter:
+    """Built once from the phrase tables; `scan` expects a lowercased message."""
+
+    def __init__(self, intents: Optional[Dict[str, Sequence[str]]] = None,
+                 slots: Optional[Dict[str, Sequence[str]]] = None):
+        self.intents = dict(INTENT_PATTERNS if intents is None else intents)
+        self.slots = dict(SLOT_PATTERNS if slots is None else slots)
+        self._trie: Dict = {}
+        self._max_words = 1
+        for label, phrases in list(self.intents.items()) + list(self.slots.items()):
+            for phrase in phrases:
+                words = _WORD_RE.findall(phrase.lower())
+                if not words:
+                    continue
+                node = self._trie
+                for word in words:
+                    node = node.setdefault(word, {})
+                node.setdefault(_END, []).append(label)
+                self._max_words = max(self._max_words, len(words))
+
+    def scan(self, msg: str) -> RoutedMessage:
+        tokens = [(m.group(), m.start(), m.end()) for m in _WORD_RE.finditer(msg)]
+        hits: List[Hit] = []
+        for i, (_, start, _) in enumerate(tokens):
+            node = self._trie
+            for word, _, end in tokens[i:i + self._max_words]:
+                node = node.get(word)
+                if node is None:
+                    break
+                for label in node.get(_END, ()):
+                    hits.append(Hit(label, start, end))
+
+        intents = {h.label for h in hits if h.label in self.intents}
+        slots: Dict[str, Hit] = {}
+        for h in hits:
+            if h.label in self.slots:
+                slots.setdefault(h.label, h)
+        return RoutedMessage(intents, slots, hits)
+
+
+default_router = IntentRouter()
@@ -0,0 +1,393 @@
+"""
+Multi-leg journey planner over the transports table.
+
+Every row is a leg between two cities. Scheduled legs (HH:MM departure) are
+unrolled over `days` consecutive days into one connection array sorted by
+departure time, CSA style. On-demand legs (taxis, bikes: departure "ASAP")
+leave whenever the traveller is ready.
+
+- earliest / fewest_transfers: round-based connection scan. Round k holds
+  the earliest arrival at every city using at most k legs and is a single
+  vectorised pass over the connections in the time window.
+- cheapest: label-setting search ordered by fare, keeping (fare, arrival)
+  Pareto labels per city.
+
+Changing onto a leg costs MIN_LAYOVER_MINS of that leg's mode (not for the
+first leg). Times are minutes from midnight of the travel day.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import copy
+import heapq
+
+import numpy as np
+
+from storage.queries import parse_minutes
+from storage.schema import minutes_of_day
+
+OBJECTIVES = ("earliest", "cheapest", "fewest_transfers")
+
+# time needed to change onto a leg of this mode
+MIN_LAYOVER_MINS = {"flight": 60, "train": 20, "bus": 15, "taxi": 5, "bike": 5}
+DEFAULT_LAYOVER_MINS = 15
+
+DAY_MINS = 24 * 60
+# default cap on door-to-door time; overnight legs plus a next-day connection fit
+MAX_JOURNEY_MINS = 36 * 60
+_INF = np.iinfo(np.int32).max // 2
+
+
+def parse_hhmm(value) -> Optional[int]:
+    """'06:30' -> 390; None for on-demand values such as 'ASAP'."""
+    return minutes_of_day(value)
+
+
+def format_minutes(minutes: int) -> str:
+    """390 -> '06:30'; times on later days get a '+N' suffix."""
+    day, rem = divmod(int(minutes), DAY_MINS)
+    text = f"{rem // 60:02d}:{rem % 60:02d}"
+    return f"{text}+{day}" if day else text
+
+
+class Timetable:
+    """
+    Connection structure built once per catalog.
+    - c_*: scheduled connections over `days` days, sorted by departure
+    - f_*: on-demand legs, also indexed per origin city
+    - leg ids: connection index c, or n_connections + j for on-demand leg j
+    """
+
+    def __init__(self, routes: Sequence[Dict], days: int = 2,
+                 min_layover: Optional[Dict[str, int]] = None):
+        self.routes = routes
+        self.days = days
+        layovers = dict(MIN_LAYOVER_MINS, **(min_layover or {}))
+
+        self.city_ids: Dict[str, int] = {}
+        self.cities: List[str] = []
+        sched: Tuple[List, ...] = ([], [], [], [], [], [], [])
+        ondemand: Tuple[List, ...] = ([], [], [], [], [], [])
+        for i, r in enumerate(routes):
+            o = self._intern(r.get("origin"))
+            d = self._intern(r.get("destination"))
+            if o is None or d is None or o == d:
+                continue
+            mode = (r.get("mode") or "").lower()
+            lay = layovers.get(mode, DEFAULT_LAYOVER_MINS)
+            dur = max(int(r.get("duration_mins") or 0), 1)
+            price = float(r.get("price") or 0)
+            dep = parse_hhmm(r.get("departure"))
+            if dep is None:
+                for col, v in zip(ondemand, (o, d, dur, price, lay, i)):
+                    col.append(v)
+            else:
+                for col, v in zip(sched, (dep, dur, o, d, price, lay, i)):
+                    col.append(v)
+
+        dep, dur, frm, to, price, lay, route = (np.asarray(c) for c in sched)
+        offsets = np.repeat(np.arange(days, dtype=np.int32) * DAY_MINS, len(dep))
+        c_dep = np.tile(dep.astype(np.int32), days) + offsets
+        order = np.argsort(c_dep, kind="stable")
+        self.c_dep = c_dep[order]
+        self.c_arr = self.c_dep + np.tile(dur.astype(np.int32), days)[order]
+        self.c_from = np.tile(frm.astype(np.int32), days)[order]
+        self.c_to = np.tile(to.astype(np.int32), days)[order]
+        self.c_price = np.tile(price.astype(np.float64), days)[order]
+        self.c_lay = np.tile(lay.astype(np.int32), days)[order]
+        self.c_route = np.tile(route.astype(np.int32), days)[order]
+
+        f_from, f_to, f_dur, f_price, f_lay, f_route = (np.asarray(c) for c in ondemand)
+        self.f_from = f_from.astype(np.int32)
+        self.f_to = f_to.astype(np.int32)
+        self.f_dur = f_dur.astype(np.int32)
+        self.f_price = f_price.astype(np.float64)
+        self.f_lay = f_lay.astype(np.int32)
+        self.f_route = f_route.astype(np.int32)
+
+        # per-city outgoing legs for the label search (CSR over from-city)
+        n = len(self.cities)
+        self._out_order = np.lexsort((self.c_dep, self.c_from))
+        self._out_ptr = np.searchsorted(self.c_from[self._out_order], np.arange(n + 1))
+        self._out_dep = self.c_dep[self._out_order]
+        self._out_arr = self.c_arr[self._out_order]
+        self._out_to = self.c_to[self._out_order]
+        self._out_price = self.c_price[self._out_order]
+        self._out_lay = self.c_lay[self._out_order]
+        self._f_order = np.argsort(self.f_from, kind="stable")
+        self._f_ptr = np.searchsorted(self.f_from[self._f_order], np.arange(n + 1))
+
+        # one edge per leg, ignoring time, for fare lower bounds
+        self._e_from = np.concatenate((frm, f_from)).astype(np.int32)
+        self._e_to = np.concatenate((to, f_to)).astype(np.int32)
+        self._e_price = np.concatenate((price, f_price)).astype(np.float64)
+
+    def rebound(self, routes: Sequence[Dict], row_map: np.ndarray) -> "Timetable":
+        """
+        This timetable over `routes`, the same legs at new positions: row i
+        of the old routes is routes[row_map[i]]. Connection arrays are
+        shared; only the row references are remapped.
+        """
+        new = copy.copy(self)
+        new.routes = routes
+        new.c_route = row_map[self.c_route].astype(np.int32)
+        new.f_route = row_map[self.f_route].astype(np.int32)
+        return new
+
+    def _intern(self, name) -> Optional[int]:
+        key = (name or "").strip().lower()
+        if not key:
+            return None
+        cid = self.city_ids.get(key)
+        if cid is None:
+            cid = self.city_ids[key] = len(self.cities)
+            self.cities.append(name.strip())
+        return cid
+
+    @property
+    def n_connections(self) -> int:
+        return len(self.c_dep)
+
+    def __len__(self) -> int:
+        return self.n_connections + len(self.f_from)
+
+    # ------- Queries -------
+
+    def plan(self, origin: str, destination: str, depart_after: Union[int, str] = 0,
+             objective: str = "earliest", k: int = 3, max_legs: int = 4,
+             max_duration: int = MAX_JOURNEY_MINS) -> List[Dict]:
+        """
+        Up to k itineraries from origin to destination leaving at or after
+        `depart_after` (minutes or 'HH:MM'; ValueError otherwise) and
+        arriving within max_duration.
+        - earliest: sorted by arrival
+        - fewest_transfers: sorted by number of legs, then arrival
+        - cheapest: sorted by total fare (later entries trade fare for time)
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {OBJECTIVES}")
+        t0 = (depart_after if isinstance(depart_after, int)
+              else parse_minutes(depart_after, "depart_after"))
+        src = self.city_ids.get((origin or "").strip().lower())
+        dst = self.city_ids.get((destination or "").strip().lower())
+        if src is None or dst is None or src == dst or k < 1:
+            return []
+
+        deadline = min(t0 + max_duration, self.days * DAY_MINS)
+        found = self._rounds(src, dst, t0, deadline, k, max_legs)
+        if objective == "cheapest":
+            if found:
+                # the time-ranked itineraries bound the fares worth searching
+                fares = sorted(fare for _, _, fare in found)
+                max_fare = fares[k - 1] if len(fares) >= k else float("inf")
+                found = self._cheapest(src, dst, t0, deadline, k, max_legs, max_fare)
+        elif objective == "fewest_transfers":
+            found.sort(key=lambda it: (len(it[0]), it[1][-1], it[2]))
+        else:
+            found.sort(key=lambda it: (it[1][-1], len(it[0]), it[2]))
+        return [self._itinerary(legs, times) for legs, times, _ in found[:k]]
+
+    def _rounds(self, src: int, dst: int, t0: int, deadline: int, k: int,
+                max_legs: int) -> List[Tuple]:
+        lo = int(np.searchsorted(self.c_dep, t0, "left"))
+        hi = int(np.searchsorted(self.c_dep, deadline, "right"))
+        c_ids = np.arange(lo, hi)
+        dep, arr = self.c_dep[lo:hi], self.c_arr[lo:hi]
+        frm, to = self.c_from[lo:hi], self.c_to[lo:hi]
+        keep = arr <= deadline
+        lay = np.where(frm == src, 0, self.c_lay[lo:hi])
+        f_lay = np.where(self.f_from == src, 0, self.f_lay)
+        n_conn = self.n_connections
+
+        prev = np.full(len(self.cities), _INF, dtype=np.int64)
+        prev[src] = t0
+        arrivals, parents = [prev], [np.full(len(self.cities), -1, dtype=np.int64)]
+        finals: List[Tuple[int, int, int]] = []   # (arrival, round, leg id) into dst
+        for rnd in range(1, max_legs + 1):
+            mask = keep & (prev[frm] + lay <= dep)
+            hit = np.flatnonzero(mask)
+            f_arr = prev[self.f_from] + f_lay + self.f_dur
+            f_hit = np.flatnonzero(f_arr <= deadline)
+
+            cand_to = np.concatenate((to[hit], self.f_to[f_hit]))
+            cand_arr = np.concatenate((arr[hit].astype(np.int64), f_arr[f_hit]))
+            cand_leg = np.concatenate((c_ids[hit], n_conn + f_hit))
+            into_dst = np.flatnonzero(cand_to == dst)
+            finals.extend(zip(cand_arr[into_dst].tolist(), [rnd] * len(into_dst),
+                              cand_leg[into_dst].tolist()))
+
+            cur = prev.copy()
+            np.minimum.at(cur, cand_to, cand_arr)
+            parent = np.full(len(self.cities), -1, dtype=np.int64)
+            won = np.flatnonzero((cand_arr == cur[cand_to]) & (cand_arr < prev[cand_to]))
+            parent[cand_to[won]] = cand_leg[won]
+            arrivals.append(cur)
+            parents.append(parent)
+            if not won.size:
+                break
+            prev = cur
+            # later legs only matter if they can beat the k-th best arrival so far
+            if len(finals) >= k:
+                bound = sorted(a for a, _, _ in finals)[k - 1]
+                keep &= arr <= bound
+
+        seen, out = set(), []
+        for arrival, rnd, leg in sorted(finals):
+            legs = self._path(arrivals, parents, self._leg_from(leg), rnd - 1) + [leg]
+            key = tuple(legs)
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append(self._timed(legs, arrivals, src))
+        return out
+
+    def _path(self, arrivals, parents, city: int, rnd: int) -> List[int]:
+        legs: List[int] = []
+        while rnd > 0 and arrivals[rnd][city] != arrivals[0][city]:
+            while parents[rnd][city] < 0:
+                rnd -= 1
+            leg = int(parents[rnd][city])
+            legs.append(leg)
+            city = self._leg_from(leg)
+            rnd -= 1
+        legs.reverse()
+        return legs
+
+    def _cheapest(self, src: int, dst: int, t0: int, deadline: int, k: int,
+                  max_legs: int, max_fare: float = float("inf"),
+                  max_labels: int = 200_000) -> List[Tuple]:
+        # A* on fare: labels are popped by fare + a lower bound of the remaining
+        # fare, which is the same for every label at a city, so per city they
+        # still come out cheapest first
+        rest = self._fare_bounds(dst)
+        if not np.isfinite(rest[src]):
+            return []
+        # labels that cannot finish within max_fare are never created
+        reachable = np.isfinite(rest)
+        budget = np.full(len(self.cities), -np.inf)
+        budget[reachable] = max_fare - rest[reachable]
+
+        # labels: (fare, arrival, legs, city, leg id, parent label)
+        labels = [(0.0, t0, 0, src, -1, -1)]
+        heap = [(float(rest[src]), t0, 0)]
+        settled_arr = np.full(len(self.cities), _INF, dtype=np.int64)
+        found: List[Tuple] = []
+        settled = 0
+        while heap and len(found) < k and settled < max_labels:
+            _, arrival, idx = heapq.heappop(heap)
+            fare, _, n_legs, city, _, _ = labels[idx]
+            if city == dst:
+                # every distinct arrival is an alternative, dearer ones come later
+                found.append(self._label_path(labels, idx))
+                continue
+            # labels settled earlier are no dearer; keep this one only if it is faster
+            if arrival >= settled_arr[city]:
+                continue
+            settled_arr[city] = arrival
+            settled += 1
+            if n_legs >= max_legs:
+                continue
+
+            a, b = self._out_ptr[city], self._out_ptr[city + 1]
+            a += int(np.searchsorted(self._out_dep[a:b], arrival, "left"))
+            to = self._out_to[a:b]
+            c_arr = self._out_arr[a:b]
+            c_fare = fare + self._out_price[a:b]
+            ok = (c_arr < np.minimum(settled_arr[to], deadline + 1)) & (c_fare <= budget[to])
+            if n_legs:
+                ok &= self._out_dep[a:b] >= arrival + self._out_lay[a:b]
+            legs = self._out_order[a:b][ok], to[ok], c_arr[ok], c_fare[ok]
+
+            fs = self._f_order[self._f_ptr[city]:self._f_ptr[city + 1]]
+            if fs.size:
+                f_to = self.f_to[fs]
+                f_arr = arrival + (self.f_lay[fs] if n_legs else 0) + self.f_dur[fs]
+                f_fare = fare + self.f_price[fs]
+                ok = (f_arr <= deadline) & (f_fare <= budget[f_to])
+                legs = tuple(np.concatenate(pair) for pair in zip(
+                    legs, (self.n_connections + fs[ok], f_to[ok], f_arr[ok], f_fare[ok])))
+
+            keys = (legs[3] + rest[legs[1]]).tolist()
+            for key, leg, leg_to, leg_arr, leg_fare in zip(keys, *(col.tolist() for col in legs)):
+                labels.append((leg_fare, leg_arr, n_legs + 1, leg_to, leg, idx))
+                heapq.heappush(heap, (key, leg_arr, len(labels) - 1))
+
+        return [self._timed(legs, None, src, t0) for legs in found]
+
+    def _fare_bounds(self, dst: int) -> np.ndarray:
+        """Cheapest fare from every city to dst, ignoring time (Bellman-Ford on leg fares)."""
+        bound = np.full(len(self.cities), np.inf)
+        bound[dst] = 0.0
+        for _ in range(len(self.cities)):
+            nxt = bound.copy()
+            np.minimum.at(nxt, self._e_from, self._e_price + bound[self._e_to])
+            if np.array_equal(nxt, bound):
+                break
+            bound = nxt
+        return bound
+
+    @staticmethod
+    def _label_path(labels, idx: int) -> List[int]:
+        legs = []
+        while labels[idx][4] >= 0:
+            legs.append(labels[idx][4])
+            idx = labels[idx][5]
+        legs.reverse()
+        return legs
+
+    # ------- Leg helpers -------
+
+    def _leg_from(self, leg: int) -> int:
+        if leg < self.n_connections:
+            return int(self.c_from[leg])
+        return int(self.f_from[leg - self.n_connections])
+
+    def _leg_to(self, leg: int) -> int:
+        if leg < self.n_connections:
+            return int(self.c_to[leg])
+        return int(self.f_to[leg - self.n_connections])
+
+    def _timed(self, legs: List[int], arrivals, src: int, t0: Optional[int] = None) -> Tuple:
+        """(legs, [dep, arr, dep, arr, ...], fare) with on-demand legs timed from arrival."""
+        times: List[int] = []
+        fare = 0.0
+        ready = t0 if t0 is not None else int(arrivals[0][src])
+        for i, leg in enumerate(legs):
+            if leg < self.n_connections:
+                dep, arr = int(self.c_dep[leg]), int(self.c_arr[leg])
+                fare += float(self.c_price[leg])
+            else:
+                j = leg - self.n_connections
+                dep = ready + (int(self.f_lay[j]) if i else 0)
+                arr = dep + int(self.f_dur[j])
+                fare += float(self.f_price[j])
+            times += [dep, arr]
+            ready = arr
+        return legs, times, round(fare, 2)
+
+    def _itinerary(self, legs: List[int], times: List[int]) -> Dict:
+        out_legs = []
+        fare = 0.0
+        for i, leg in enumerate(legs):
+            if leg < self.n_connections:
+                route = self.routes[int(self.c_route[leg])]
+            else:
+                route = self.routes[int(self.f_route[leg - self.n_connections])]
+            fare += float(route.get("price") or 0)
+            out_legs.append({
+                "id": route.get("id"),
+                "mode": route.get("mode"),
+                "name": route.get("name"),
+                "origin": route.get("origin"),
+                "destination": route.get("destination"),
+                "departure": format_minutes(times[2 * i]),
+                "arrival": format_minutes(times[2 * i + 1]),
+                "duration_mins": times[2 * i + 1] - times[2 * i],
+                "price": route.get("price"),
+            })
+        return {
+            "legs": out_legs,
+            "departure": format_minutes(times[0]),
+            "arrival": format_minutes(times[-1]),
+            "duration_mins": times[-1] - times[0],
+            "price": round(fare, 2),
+            "transfers": len(legs) - 1,
+        }
@@ -0,0 +1,180 @@
+"""
+Batch website-offer simulation.
+
+All routes in a request are simulated in one NumPy pass. Randomness comes
+from a counter-based hash of (route, time bucket, site slot), so the same
+route shows the same offers for the whole bucket, in every worker process.
+Results are cached per (route id, bucket, max_sites) until the bucket ends.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+# Website providers mapping
+WEBSITE_PROVIDERS = {
+    "bike": ["Rapido", "Uber Moto", "Ola Bike", "QuickRide"],
+    "taxi": ["Uber", "Ola Cabs", "Meru Cabs", "MegaTaxi"],
+    "bus": ["RedBus", "AbhiBus", "MakeMyTrip Bus", "Goibibo Bus"],
+    "train": ["IRCTC", "MakeMyTrip Train", "Goibibo Train", "PayTM Rail"],
+    "flight": ["MakeMyTrip", "Goibibo", "ClearTrip", "IXIGO"]
+}
+DEFAULT_PROVIDERS = ["TravelNow", "BookMyRide", "EasyTrip"]
+
+DISCOUNTS = np.array([0, 5, 10, 15])
+
+# offers are stable within a bucket and re-rolled when it changes
+OFFER_BUCKET_SECS = 15 * 60
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def offer_bucket(now: Optional[float] = None) -> int:
+    return int((time.time() if now is None else now) // OFFER_BUCKET_SECS)
+
+
+def route_key(option: Dict) -> str:
+    rid = option.get("id")
+    if rid:
+        return str(rid)
+    return "|".join(str(option.get(k, "")) for k in ("mode", "name", "origin", "destination"))
+
+
+def base_price(option: Dict) -> float:
+    try:
+        price = float(option.get("price", 0) or 0)
+    except Exception:
+        price = 0.0
+    return price if price > 0 else 500.0
+
+
+def _route_seed(key: str, bucket: int) -> int:
+    digest = hashlib.blake2b(f"{key}:{bucket}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(keys: np.ndarray, stream: int) -> np.ndarray:
+    """Deterministic uniforms in [0, 1), one per key, independent per stream."""
+    bits = _splitmix64(keys ^ np.uint64((stream * 0xD1B54A32D192ED03) & 0xFFFFFFFFFFFFFFFF))
+    return (bits >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _simulate(routes: Sequence[Dict], keys: Sequence[str], prices: Sequence[float],
+              bucket: int, max_sites: int) -> List[List[Dict]]:
+    providers = [
+        WEBSITE_PROVIDERS.get((r.get("mode") or "").lower(), DEFAULT_PROVIDERS)[:max_sites]
+        for r in routes
+    ]
+    width = max((len(p) for p in providers), default=0)
+    if width == 0:
+        return [[] for _ in routes]
+
+    base = np.array(prices, dtype=np.float64)
+    seeds = np.array([_route_seed(k, bucket) for k in keys], dtype=np.uint64)
+    slots = np.arange(width, dtype=np.uint64)
+    slot_keys = _splitmix64(seeds[:, None] + slots[None, :] * _GOLDEN)
+
+    # same distributions as the old per-site random.uniform / random.choice
+    variation = -0.15 + 0.40 * _uniform(slot_keys, 1)
+    discount = DISCOUNTS[(_uniform(slot_keys, 2) * len(DISCOUNTS)).astype(np.int64)]
+    list_price = np.round(base[:, None] * (1 + variation), 2)
+    final_price = np.round(list_price * (1 - discount / 100.0), 2)
+
+    counts = np.array([len(p) for p in providers])
+    valid = slots[None, :].astype(np.int64) < counts[:, None]
+    order = np.argsort(np.where(valid, final_price, np.inf), axis=1, kind="stable")
+
+    list_rows, disc_rows, final_rows = list_price.tolist(), discount.tolist(), final_price.tolist()
+    out = []
+    for i, sites in enumerate(providers):
+        offers = []
+        for j in order[i, :len(sites)].tolist():
+            offers.append({
+                "site": sites[j],
+                "list_price": list_rows[i][j],
+                "discount": disc_rows[i][j],
+                "final_price": final_rows[i][j],
+                "cta_text": f"Book on {sites[j]}"
+            })
+        out.append(offers)
+    return out
+
+
+class OfferCache:
+    """Bounded TTL cache: (route key, bucket, max_sites) -> (base price, offers)."""
+
+    def __init__(self, max_entries: int = 100_000, ttl: float = OFFER_BUCKET_SECS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple, Tuple[float, float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple, price: float) -> Optional[List[Dict]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, stored_price, offers = entry
+        # a catalog price change invalidates the entry early
+        if stored_price != price or time.monotonic() - stored_at > self.ttl:
+            return None
+        return offers
+
+    def put_many(self, items: Sequence[Tuple[Tuple, float, List[Dict]]]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key, price, offers in items:
+                self._data[key] = (now, price, offers)
+                self._data.move_to_end(key)
+            # entries are in insertion order, so expired ones sit at the front
+            while self._data:
+                stored_at = next(iter(self._data.values()))[0]
+                if len(self._data) <= self.max_entries and now - stored_at <= self.ttl:
+                    break
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+offer_cache = OfferCache()
+
+
+def simulate_offers_batch(routes: Sequence[Dict], max_sites: int = 4,
+                          now: Optional[float] = None) -> List[List[Dict]]:
+    """
+    Offers for every route, each list sorted by final_price (cheapest first).
+    Returned lists are shared with the cache; treat them as read-only.
+    """
+    bucket = offer_bucket(now)
+    keys = [(route_key(r), bucket, max_sites) for r in routes]
+    prices = [base_price(r) for r in routes]
+    out: List[Optional[List[Dict]]] = [None] * len(routes)
+    misses = []
+    for i, key in enumerate(keys):
+        offers = offer_cache.get(key, prices[i])
+        if offers is None:
+            misses.append(i)
+        else:
+            out[i] = offers
+
+    if misses:
+        fresh = _simulate([routes[i] for i in misses], [keys[i][0] for i in misses],
+                          [prices[i] for i in misses], bucket, max_sites)
+        for i, offers in zip(misses, fresh):
+            out[i] = offers
+        offer_cache.put_many([(keys[i], prices[i], out[i]) for i in misses])
+    return out
@@ -1,8 +1,24 @@
 """
-Simple file-based RAG: keyword scoring for travel tips / rules.
+Simple file-based RAG: BM25 over passages of the knowledge-base .txt files.
+
+The index is built once per directory and rebuilt only when a file is
+added, removed or modified (mtime), so a query reads posting lists only.
 """
+from collections import Counter, defaultdict
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Tuple
+import math
+import re
+import threading
+import time
+
+from storage.metrics import stage
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
 
 
 def load_kb_files(kb_dir: Path) -> List[Dict]:
@@ -16,22 +32,126 @@ def load_kb_files(kb_dir: Path) -> List[Dict]:
     return docs
 
 
-def score_doc(question: str, doc: Dict) -> float:
-    q_words = question.lower().split()
-    text = (doc["title"] + " " + doc["content"]).lower()
-    score = 0
-    for w in q_words:
-        if w in text:
-            score += 1
-    return score
+def chunk_passages(text: str, max_chars: int = 400) -> List[str]:
+    """Split on blank lines, then pack paragraphs into ~max_chars passages."""
+    passages, buf = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        if buf and len(buf) + len(para) + 2 > max_chars:
+            passages.append(buf)
+            buf = para
+        else:
+            buf = f"{buf}\n\n{para}" if buf else para
+    if buf:
+        passages.append(buf)
+    return passages
+
+
+class KnowledgeBaseIndex:
+    """
+    Inverted index over KB passages with BM25 scoring.
+    - postings: term -> [(passage id, term frequency)]
+    - the doc title is indexed with every passage of that doc
+    """
+
+    def __init__(self, docs: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages: List[Dict] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+
+        for doc in docs:
+            title_terms = tokenize(doc["title"].replace("_", " "))
+            for passage in chunk_passages(doc["content"]):
+                pid = len(self.passages)
+                terms = title_terms + tokenize(passage)
+                for term, tf in Counter(terms).items():
+                    self.postings[term].append((pid, tf))
+                lengths.append(len(terms))
+                self.passages.append({"title": doc["title"], "text": passage})
+
+        self.lengths = lengths
+        self.avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+        n = len(self.passages)
+        self.idf = {
+            term: math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for term, plist in self.postings.items()
+        }
+
+    def search(self, question: str, top_k: int = 3) -> List[Dict]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(question)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf[term]
+            for pid, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[pid] / self.avg_len)
+                scores[pid] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        # best passage per document, so one long doc can't fill every slot
+        best: Dict[str, Tuple[float, int]] = {}
+        for pid, score in scores.items():
+            title = self.passages[pid]["title"]
+            if title not in best or score > best[title][0]:
+                best[title] = (score, pid)
+
+        ranked = sorted(best.values(), reverse=True)[:top_k]
+        return [
+            {
+                "title": self.passages[pid]["title"],
+                "score": round(score, 3),
+                "snippet": self.passages[pid]["text"][:400],
+            }
+            for score, pid in ranked
+        ]
+
+
+# seconds between mtime checks, so a burst of queries doesn't stat every file
+KB_RECHECK_SECS = 1.0
+
+# kb_dir -> (file signature, last checked at, index)
+_indexes: Dict[Path, Tuple[Tuple, float, KnowledgeBaseIndex]] = {}
+_index_lock = threading.Lock()
+
+
+def _kb_signature(kb_dir: Path) -> Tuple:
+    return tuple(sorted((p.name, p.stat().st_mtime_ns) for p in kb_dir.glob("*.txt")))
+
+
+def _current(kb_dir: Path) -> Tuple[Tuple, float, KnowledgeBaseIndex]:
+    kb_dir = Path(kb_dir)
+    now = time.monotonic()
+    cached = _indexes.get(kb_dir)
+    if cached is not None and now - cached[1] < KB_RECHECK_SECS:
+        return cached
+
+    with _index_lock:
+        signature = _kb_signature(kb_dir)
+        cached = _indexes.get(kb_dir)
+        if cached is None or cached[0] != signature:
+            index = KnowledgeBaseIndex(load_kb_files(kb_dir))
+        else:
+            index = cached[2]
+        _indexes[kb_dir] = (signature, now, index)
+        return _indexes[kb_dir]
+
+
+def get_kb_index(kb_dir: Path) -> KnowledgeBaseIndex:
+    """Shared index for kb_dir; rebuilt when any .txt file's mtime changes."""
+    return _current(kb_dir)[2]
+
+
+def kb_signature(kb_dir: Path) -> Tuple:
+    """(file name, mtime) of every .txt file the current index of kb_dir was built from."""
+    return _current(kb_dir)[0]
 
 
 def retrieve_context(question: str, kb_dir: Path, top_k: int = 3) -> List[Dict]:
-    docs = load_kb_files(kb_dir)
-    scored = []
-    for d in docs:
-        s = score_doc(question, d)
-        if s > 0:
-            scored.append({"title": d["title"], "score": s, "snippet": d["content"][:400]})
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:top_k]
+    with stage("rag_index"):
+        index = get_kb_index(kb_dir)
+    with stage("rag_search"):
+        return index.search(question, top_k)
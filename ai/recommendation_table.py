@@ -0,0 +1,169 @@
+"""
+Materialized top-k recommendations per (origin, destination, priority).
+
+The best options for a city pair only change when the catalog does, so
+they are ranked once over the catalog columns instead of on every chat
+message: all rows are scored per priority in one vectorized pass
+(ai.batch_scorer.score_batch) and the k best of each pair are kept.
+
+Entries hold string slots (RouteColumns.slot), which stay attached to a
+row across patches, and scores in thousandths (score_batch rounds to 3
+decimals, so they convert back exactly). `patched` re-ranks only the
+pairs whose rows changed. Rankings are identical to scoring the pair's
+rows live with rank_by_priorities, ties included.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from ai.batch_scorer import ECO_FACTORS, PRIORITIES, RouteBatch, score_batch
+from ai.route_columns import INT_NULL, MINUTE_BITS, RouteColumns
+
+# options kept per pair and priority
+RECOMMEND_K = 3
+
+
+def _coerced(values: np.ndarray, default: float) -> np.ndarray:
+    # same coercion as RouteBatch.from_dicts: NULL / 0 -> default
+    values = values.astype(np.float64)
+    values[np.isnan(values)] = default
+    values[values == 0] = default
+    return values
+
+
+def _nullable(values: np.ndarray) -> np.ndarray:
+    return np.where(values == INT_NULL, np.nan, values.astype(np.float64))
+
+
+def column_batch(columns: RouteColumns, index=slice(None)) -> RouteBatch:
+    """RouteBatch straight from catalog columns, without materializing rows."""
+    modes = columns.mode[index]
+    texts = columns.texts.texts
+    # factor per text code, for the codes these rows use
+    codes = range(len(texts)) if isinstance(index, slice) else np.unique(modes).tolist()
+    eco = np.ones(len(texts), dtype=np.float64)
+    for c in codes:
+        eco[c] = ECO_FACTORS.get((texts[c] or "").lower(), 1.0)
+    return RouteBatch(
+        None,
+        price=_coerced(columns.price[index], 0.0),
+        duration=_coerced(_nullable(columns.duration_mins[index]), 60.0),
+        seats=_coerced(_nullable(columns.seats_available[index]), 1.0),
+        rating=_coerced(columns.rating[index], 4.0),
+        eco=eco[modes],
+    )
+
+
+def _rank(columns: RouteColumns, index, k: int):
+    """(sorted pair codes, slots[pair, priority, rank], scores * 1000) over the rows at `index`."""
+    pair = columns.key[index] >> MINUTE_BITS
+    if len(pair) == 0:
+        empty = np.full((0, len(PRIORITIES), k), -1, dtype=np.int32)
+        return pair, empty, empty.copy()
+    starts = np.flatnonzero(np.concatenate(([True], pair[1:] != pair[:-1])))
+    pairs = pair[starts]
+    counts = np.diff(np.append(starts, len(pair)))
+    group = np.repeat(np.arange(len(pairs)), counts)
+
+    slots = np.full((len(pairs), len(PRIORITIES), k), -1, dtype=np.int32)
+    scores = np.zeros(slots.shape, dtype=np.int32)
+    batch = column_batch(columns, index)
+    row_slots = columns.slot[index]
+    rank = np.arange(len(pair)) - np.repeat(starts, counts)
+    top = rank < k
+    for p, priority in enumerate(PRIORITIES):
+        score = score_batch(batch, priority)
+        # best first within each pair; lexsort is stable, so ties keep row order
+        order = np.lexsort((-score, group))[top]
+        at = (group[order], p, rank[top])
+        slots[at] = row_slots[order]
+        scores[at] = np.rint(score[order] * 1000)
+    return pairs, slots, scores
+
+
+class RecommendationTable:
+    """
+    Top-k rows per (pair code, priority), for pairs with rows. `pairs`
+    holds the sorted int64 pair codes; entry i lives in
+    blocks[i // BLOCK][i % BLOCK] as [priority, rank, (slot, score * 1000)],
+    with slot -1 where a pair has fewer than k rows. A patch copies only
+    the blocks it touches.
+    """
+
+    # pairs per block
+    BLOCK = 4096
+
+    def __init__(self, pairs: np.ndarray, blocks: List[np.ndarray], k: int = RECOMMEND_K):
+        self.pairs = pairs
+        self.blocks = blocks
+        self.k = k
+
+    @classmethod
+    def _split(cls, pairs: np.ndarray, slots: np.ndarray, scores: np.ndarray,
+               k: int) -> "RecommendationTable":
+        entries = np.stack((slots, scores), axis=-1)
+        return cls(pairs, [entries[i:i + cls.BLOCK].copy()
+                           for i in range(0, len(pairs), cls.BLOCK)], k)
+
+    @classmethod
+    def build(cls, columns: RouteColumns, k: int = RECOMMEND_K) -> "RecommendationTable":
+        return cls._split(*_rank(columns, slice(None), k), k)
+
+    def patched(self, columns: RouteColumns, pairs: Iterable[int]) -> "RecommendationTable":
+        """
+        Table for the patched `columns` with `pairs` (whose rows changed)
+        ranked again; every other pair keeps its entries.
+        """
+        touched = np.unique(np.fromiter(pairs, dtype=np.int64))
+        ranges = [columns.key_range(int(p)) for p in touched.tolist()]
+        index = np.concatenate([np.arange(lo, hi) for lo, hi in ranges if hi > lo]
+                               or [np.zeros(0, np.int64)])
+        new_pairs, new_slots, new_scores = _rank(columns, index, self.k)
+        new_entries = np.stack((new_slots, new_scores), axis=-1)
+
+        at = np.searchsorted(self.pairs, new_pairs)
+        if len(new_pairs) == len(touched) and np.array_equal(
+                self.pairs[np.minimum(at, len(self.pairs) - 1)], new_pairs):
+            # the same pairs, re-ranked (e.g. seats sold): only their blocks are copied
+            blocks = list(self.blocks)
+            for b in np.unique(at // self.BLOCK).tolist():
+                blocks[b] = blocks[b].copy()
+            for i, entry in zip(at.tolist(), new_entries):
+                blocks[i // self.BLOCK][i % self.BLOCK] = entry
+            return RecommendationTable(self.pairs, blocks, self.k)
+
+        # pairs appeared or vanished: positions shift, so re-split
+        entries = np.concatenate(self.blocks) if self.blocks else new_entries[:0]
+        keep = ~np.isin(self.pairs, touched)
+        kept = self.pairs[keep]
+        at = np.searchsorted(kept, new_pairs)
+        entries = np.insert(entries[keep], at, new_entries, axis=0)
+        return RecommendationTable._split(np.insert(kept, at, new_pairs), entries[..., 0],
+                                          entries[..., 1], self.k)
+
+    def lookup(self, columns: RouteColumns, pair: Optional[int], priorities: Sequence[str],
+               k: int = 1) -> Dict[str, List[Dict]]:
+        """
+        {priority: best k row dicts with "score"}, as rank_by_priorities
+        returns them; empty lists when the pair has no rows.
+        """
+        i = int(np.searchsorted(self.pairs, pair)) if pair is not None else len(self.pairs)
+        if i == len(self.pairs) or self.pairs[i] != pair:
+            return {priority: [] for priority in priorities}
+
+        wanted = [PRIORITIES.index(priority) for priority in priorities]
+        entries = self.blocks[i // self.BLOCK][i % self.BLOCK, wanted, :k].tolist()
+        # each row read out once, then copied per priority it ranks in
+        unique = sorted({slot for ranked in entries for slot, _ in ranked if slot >= 0})
+        rows = dict(zip(unique, columns.rows(columns.slot_row[unique])))
+        return {
+            priority: [dict(rows[slot], score=milli / 1000) for slot, milli in ranked if slot >= 0]
+            for priority, ranked in zip(priorities, entries)
+        }
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    @property
+    def nbytes(self) -> int:
+        return self.pairs.nbytes + sum(block.nbytes for block in self.blocks)
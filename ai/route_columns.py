@@ -0,0 +1,416 @@
+"""
+Columnar, memory-compact storage behind RouteCatalog.
+
+One entry per transport in numpy columns, sorted by a packed
+(origin, destination, departure minute) key, so a city pair is one slice
+and its departures are already in time order:
+
+- repeated text (cities, modes, "06:30", "ASAP") is interned once and
+  stored as int32 codes
+- numbers are arrays; NULL is NaN for floats and INT_NULL for ints
+- ids and names live in one UTF-8 buffer each (StringStore), addressed by
+  a per-row slot; ids are found through a sorted crc32 index
+- a per-mode index (built on first use) lists each mode's rows in row
+  order, so a mode filter on a pair slice is two binary searches
+- extra_json is not kept: callers fetch it for the rows they return
+
+About 130 bytes per route instead of a dict (plus its extra_json copy) of
+over 1.5 kilobytes. Columns are never modified in place: `patched` returns new
+columns, so readers of the old ones are unaffected, and every array
+pickles out of band for the memory-mapped catalog snapshot. Rows become
+plain dicts only in `rows` / `row`.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from zlib import crc32
+
+import numpy as np
+
+from storage.queries import DEFAULT_FIELDS
+from storage.schema import DAY_MINS, minutes_of_day
+
+# the catalog holds every column but extra_json
+CATALOG_FIELDS = DEFAULT_FIELDS
+SELECT_CATALOG = "SELECT " + ", ".join(CATALOG_FIELDS) + " FROM transports"
+
+INT_NULL = np.iinfo(np.int32).min
+# departure minute of on-demand rows: sorts after every scheduled one
+ONDEMAND = DAY_MINS
+
+# sort key: origin city | destination city | departure minute
+MINUTE_BITS = 11
+CITY_BITS = 20
+MAX_CITIES = 1 << CITY_BITS
+_PAIR_SHIFT = MINUTE_BITS
+
+_NULL = b"\x00"     # stored for a NULL id / name; never a real value
+_BUILD_CHUNK = 100_000
+
+_F = {name: i for i, name in enumerate(CATALOG_FIELDS)}
+
+
+class StringStore:
+    """Append-only UTF-8 strings in one buffer: slot i is data[offsets[i]:offsets[i + 1]]."""
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @staticmethod
+    def encode(values: Iterable[Optional[str]]) -> List[bytes]:
+        return [_NULL if v is None else str(v).encode() for v in values]
+
+    @classmethod
+    def build(cls, encoded: Sequence[bytes]) -> "StringStore":
+        return cls(np.zeros(0, np.uint8), np.zeros(1, np.int64)).appended(encoded)
+
+    def appended(self, encoded: Sequence[bytes]) -> "StringStore":
+        """New store with `encoded` in the next slots; this one is left as is."""
+        lengths = np.fromiter(map(len, encoded), np.int64, len(encoded))
+        data = np.concatenate((self.data, np.frombuffer(b"".join(encoded), np.uint8)))
+        offsets = np.concatenate((self.offsets, self.offsets[-1] + np.cumsum(lengths)))
+        return StringStore(data, offsets)
+
+    @classmethod
+    def concat(cls, stores: Sequence["StringStore"]) -> "StringStore":
+        if not stores:
+            return cls.build([])
+        starts = np.cumsum([0] + [len(st.data) for st in stores[:-1]])
+        offsets = [stores[0].offsets[:1]] + [st.offsets[1:] + at for st, at in zip(stores, starts)]
+        return cls(np.concatenate([st.data for st in stores]), np.concatenate(offsets))
+
+    def raw(self, slot: int) -> bytes:
+        return self.data[self.offsets[slot]:self.offsets[slot + 1]].tobytes()
+
+    def __getitem__(self, slot: int) -> Optional[str]:
+        raw = self.raw(slot)
+        return None if raw == _NULL else raw.decode()
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.offsets.nbytes
+
+
+class TextTable:
+    """Interned values (None included) <-> int32 codes."""
+
+    def __init__(self, texts: Iterable[Optional[str]] = ()):
+        self.texts: List[Optional[str]] = list(texts)
+        self.codes: Dict[Optional[str], int] = {t: i for i, t in enumerate(self.texts)}
+
+    def code(self, text: Optional[str]) -> int:
+        code = self.codes.get(text)
+        if code is None:
+            code = self.codes[text] = len(self.texts)
+            self.texts.append(text)
+        return code
+
+    def encode(self, values: Sequence[Optional[str]]) -> np.ndarray:
+        get = self.codes.get
+        codes = [get(v) for v in values]
+        if None in codes:
+            codes = [self.code(v) if c is None else c for v, c in zip(values, codes)]
+        return np.array(codes, dtype=np.int32)
+
+    def copy(self) -> "TextTable":
+        return TextTable(self.texts)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+
+def _floats(values) -> np.ndarray:
+    return np.array(values, dtype=np.float64)     # None -> NaN
+
+
+def _ints(values) -> np.ndarray:
+    arr = np.array(values, dtype=np.float64)
+    out = np.full(len(arr), INT_NULL, dtype=np.int32)
+    ok = ~np.isnan(arr)
+    out[ok] = arr[ok].astype(np.int32)
+    return out
+
+
+class RouteColumns:
+    """The arrays behind one RouteCatalog; see the module docstring."""
+
+    ARRAYS = ("key", "slot", "mode", "origin", "destination", "departure", "arrival",
+              "duration_mins", "price", "seats_available", "rating")
+
+    def __init__(self):
+        self.texts = TextTable()        # mode, departure, arrival
+        self.places = TextTable()       # origin / destination as written
+        self.city_keys = TextTable()    # lowercased cities
+        self.place_city: List[int] = []     # place code -> city code
+        self.city_names: List[str] = []     # city code -> first spelling seen
+        self.text_minute: List[int] = []    # text code -> departure minute
+        self.ids = StringStore.build([])
+        self.names = StringStore.build([])
+        # row arrays, sorted by key
+        self.key = np.zeros(0, np.int64)
+        self.slot = np.zeros(0, np.int32)
+        for name in ("mode", "origin", "destination", "departure", "arrival",
+                     "duration_mins", "seats_available"):
+            setattr(self, name, np.zeros(0, np.int32))
+        self.price = np.zeros(0, np.float64)
+        self.rating = np.zeros(0, np.float64)
+        # string slot -> row (-1 once deleted); crc32 of id -> slot, sorted
+        self.slot_row = np.zeros(0, np.int32)
+        self.id_hash = np.zeros(0, np.uint32)
+        self.id_slot = np.zeros(0, np.int32)
+        # rows referencing each city code
+        self.city_refs = np.zeros(0, np.int64)
+        # (row indices grouped by lowercased mode, ascending within a mode,
+        #  mode -> (start, end) of its group); see mode_index
+        self._mode_index: Optional[Tuple[np.ndarray, Dict[str, Tuple[int, int]]]] = None
+
+    # ------- Building -------
+    @classmethod
+    def build(cls, rows: Iterable[Sequence]) -> "RouteColumns":
+        """
+        Columns from tuples in CATALOG_FIELDS order, read chunk by chunk;
+        only numpy arrays outlive a chunk, so the build leaves no trail of
+        small Python objects behind.
+        """
+        cols = cls()
+        parts: List[Dict[str, np.ndarray]] = []
+        rows = iter(rows)
+        while True:
+            chunk = [tuple(r) for _, r in zip(range(_BUILD_CHUNK), rows)]
+            if not chunk:
+                break
+            part, ids, names = cols._encode(chunk)
+            part["hash"] = np.fromiter(map(crc32, ids), np.uint32, len(ids))
+            part["ids"] = StringStore.build(ids)
+            part["names"] = StringStore.build(names)
+            parts.append(part)
+            del chunk, ids, names
+
+        n = sum(len(p["key"]) for p in parts)
+        cols.ids = StringStore.concat([p.pop("ids") for p in parts])
+        cols.names = StringStore.concat([p.pop("names") for p in parts])
+        if parts:
+            merged = {k: np.concatenate([p.pop(k) for p in parts]) for k in list(parts[0])}
+            merged["slot"] = np.arange(n, dtype=np.int32)
+            order = np.argsort(merged["key"], kind="stable")
+            for name in cls.ARRAYS:
+                setattr(cols, name, merged[name][order])
+            hashes = merged["hash"]
+        else:
+            hashes = np.zeros(0, np.uint32)
+        cols.slot_row = np.empty(n, np.int32)
+        cols.slot_row[cols.slot] = np.arange(n, dtype=np.int32)
+        hash_order = np.argsort(hashes, kind="stable")
+        cols.id_hash = hashes[hash_order]
+        cols.id_slot = hash_order.astype(np.int32)
+        cols.city_refs = cols._refs(cols.key, len(cols.city_keys))
+        return cols
+
+    def _encode(self, chunk: List[tuple]):
+        """Arrays (minus slot) for a chunk of new rows, interning as it goes."""
+        values = list(zip(*chunk))
+        origin = self.places.encode(values[_F["origin"]])
+        destination = self.places.encode(values[_F["destination"]])
+        for code in range(len(self.place_city), len(self.places)):
+            place = self.places.texts[code]
+            city = self.city_keys.code((place or "").lower())
+            if city == len(self.city_names):
+                self.city_names.append(place or "")
+            self.place_city.append(city)
+        if len(self.city_keys) > MAX_CITIES:
+            raise ValueError(f"catalog supports at most {MAX_CITIES} cities")
+        departure = self.texts.encode(values[_F["departure"]])
+        arrival = self.texts.encode(values[_F["arrival"]])
+        mode = self.texts.encode(values[_F["mode"]])
+        for code in range(len(self.text_minute), len(self.texts)):
+            minute = minutes_of_day(self.texts.texts[code])
+            self.text_minute.append(ONDEMAND if minute is None else minute)
+
+        place_city = np.asarray(self.place_city, dtype=np.int64)
+        text_minute = np.asarray(self.text_minute, dtype=np.int64)
+        key = ((place_city[origin] << (CITY_BITS + MINUTE_BITS))
+               | (place_city[destination] << MINUTE_BITS)
+               | text_minute[departure])
+        part = {
+            "key": key, "mode": mode, "origin": origin, "destination": destination,
+            "departure": departure, "arrival": arrival,
+            "duration_mins": _ints(values[_F["duration_mins"]]),
+            "price": _floats(values[_F["price"]]),
+            "seats_available": _ints(values[_F["seats_available"]]),
+            "rating": _floats(values[_F["rating"]]),
+        }
+        return part, StringStore.encode(values[_F["id"]]), StringStore.encode(values[_F["name"]])
+
+    @property
+    def mode_index(self) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+        """
+        (rows, spans): row indices grouped by lowercased mode and ascending
+        within a mode, and mode -> (start, end) of its group. Built on first
+        use by one stable counting sort, so patches do not pay for it.
+        """
+        if self._mode_index is None:
+            return self.build_mode_index()
+        return self._mode_index
+
+    def build_mode_index(self) -> Tuple[np.ndarray, Dict[str, Tuple[int, int]]]:
+        """Build the mode index now unless it is already built."""
+        if self._mode_index is None:
+            self._mode_index = self._index_modes()
+        return self._mode_index
+
+    def _index_modes(self):
+        used = np.flatnonzero(np.bincount(self.mode, minlength=len(self.texts))).tolist()
+        names = sorted({(self.texts.texts[c] or "").lower() for c in used})
+        group_of = {name: g for g, name in enumerate(names)}
+        lut = np.zeros(len(self.texts), dtype=np.min_scalar_type(max(len(names) - 1, 0)))
+        for c in used:
+            lut[c] = group_of[(self.texts.texts[c] or "").lower()]
+        group = lut[self.mode]
+        # stable, so each mode's rows stay in row (key) order; small ints sort by radix
+        rows = np.argsort(group, kind="stable").astype(np.int32)
+        counts = np.bincount(group, minlength=len(names))
+        ends = np.cumsum(counts)
+        return rows, dict(zip(names, zip((ends - counts).tolist(), ends.tolist())))
+
+    @staticmethod
+    def _refs(key: np.ndarray, n_cities: int) -> np.ndarray:
+        cities = np.concatenate((key >> (CITY_BITS + MINUTE_BITS),
+                                 (key >> MINUTE_BITS) & (MAX_CITIES - 1)))
+        return np.bincount(cities, minlength=n_cities).astype(np.int64)
+
+    # ------- Lookups -------
+    def __len__(self) -> int:
+        return len(self.key)
+
+    def pair_code(self, origin: str, destination: str) -> Optional[int]:
+        o = self.city_keys.codes.get((origin or "").lower())
+        d = self.city_keys.codes.get((destination or "").lower())
+        if o is None or d is None:
+            return None
+        return (o << CITY_BITS) | d
+
+    def key_range(self, pair: int, start: int = 0, end: int = ONDEMAND) -> Tuple[int, int]:
+        """Row slice of one pair with departure minute in [start, end]."""
+        base = pair << _PAIR_SHIFT
+        return (int(np.searchsorted(self.key, base + start, "left")),
+                int(np.searchsorted(self.key, base + end, "right")))
+
+    def minutes(self, lo: int, hi: int) -> np.ndarray:
+        return self.key[lo:hi] & ((1 << MINUTE_BITS) - 1)
+
+    def find(self, rid: str) -> Optional[int]:
+        """Row index of id `rid`, or None."""
+        raw = _NULL if rid is None else str(rid).encode()
+        h = np.uint32(crc32(raw))    # a Python int would cast the whole index to int64
+        lo = int(np.searchsorted(self.id_hash, h, "left"))
+        hi = int(np.searchsorted(self.id_hash, h, "right"))
+        for slot in self.id_slot[lo:hi].tolist():
+            row = int(self.slot_row[slot])
+            if row >= 0 and self.ids.raw(slot) == raw:
+                return row
+        return None
+
+    def of_mode(self, mode: str) -> np.ndarray:
+        """Ascending row indices of `mode` (any case)."""
+        rows, spans = self.mode_index
+        start, end = spans.get(mode.lower(), (0, 0))
+        return rows[start:end]
+
+    def mode_range(self, mode: str, lo: int, hi: int) -> np.ndarray:
+        """Rows of `mode` among rows [lo, hi), ascending: two binary searches."""
+        rows = self.of_mode(mode)
+        return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+    def rows(self, index) -> List[Dict]:
+        """Plain dicts for the given row indices (array, list or slice)."""
+        slots = self.slot[index].tolist()
+        texts, places = self.texts.texts, self.places.texts
+        ids, names = self.ids, self.names
+
+        def ints(arr):
+            return [None if v == INT_NULL else v for v in arr[index].tolist()]
+
+        def floats(arr):
+            return [None if v != v else v for v in arr[index].tolist()]
+
+        columns = (
+            [ids[s] for s in slots],
+            [texts[c] for c in self.mode[index].tolist()],
+            [names[s] for s in slots],
+            [places[c] for c in self.origin[index].tolist()],
+            [places[c] for c in self.destination[index].tolist()],
+            [texts[c] for c in self.departure[index].tolist()],
+            [texts[c] for c in self.arrival[index].tolist()],
+            ints(self.duration_mins), floats(self.price),
+            ints(self.seats_available), floats(self.rating),
+        )
+        return [dict(zip(CATALOG_FIELDS, values)) for values in zip(*columns)]
+
+    def row(self, i: int) -> Dict:
+        return self.rows([i])[0]
+
+    def iter_rows(self, chunk: int = 10_000) -> Iterator[Dict]:
+        for start in range(0, len(self), chunk):
+            yield from self.rows(slice(start, start + chunk))
+
+    # ------- Patching -------
+    def patched(self, changed: Sequence[Sequence], deleted_rows: Sequence[int]) -> "RouteColumns":
+        """
+        New columns without the rows at `deleted_rows` and with `changed`
+        tuples (CATALOG_FIELDS order) merged in at their sorted positions.
+        O(rows) array copies, no re-sort; strings of dropped rows stay in
+        the stores until the next full build.
+        """
+        new = RouteColumns.__new__(RouteColumns)
+        new.texts, new.places, new.city_keys = (
+            self.texts.copy(), self.places.copy(), self.city_keys.copy())
+        new.place_city, new.city_names = list(self.place_city), list(self.city_names)
+        new.text_minute = list(self.text_minute)
+
+        keep = np.ones(len(self), dtype=bool)
+        keep[np.asarray(deleted_rows, dtype=np.int64)] = False
+        if changed:
+            part, ids, names = new._encode([tuple(r) for r in changed])
+        else:
+            part, ids, names = {k: np.zeros(0, getattr(self, k).dtype)
+                                for k in self.ARRAYS if k != "slot"}, [], []
+        first_slot = len(self.ids)
+        part["slot"] = np.arange(first_slot, first_slot + len(ids), dtype=np.int32)
+        order = np.argsort(part["key"], kind="stable")
+        kept_key = self.key[keep]
+        at = np.searchsorted(kept_key, part["key"][order], "right")
+        for name in self.ARRAYS:
+            setattr(new, name, np.insert(getattr(self, name)[keep], at, part[name][order]))
+
+        new.ids, new.names = self.ids.appended(ids), self.names.appended(names)
+        new.slot_row = np.full(len(new.ids), -1, dtype=np.int32)
+        new.slot_row[new.slot] = np.arange(len(new), dtype=np.int32)
+        hashes = np.fromiter(map(crc32, ids), np.uint32, len(ids))
+        hash_order = np.argsort(hashes, kind="stable")
+        at = np.searchsorted(self.id_hash, hashes[hash_order], "right")
+        new.id_hash = np.insert(self.id_hash, at, hashes[hash_order])
+        new.id_slot = np.insert(self.id_slot, at, part["slot"][hash_order])
+
+        refs = np.zeros(len(new.city_keys), dtype=np.int64)
+        refs[:len(self.city_refs)] = self.city_refs
+        refs -= self._refs(self.key[~keep], len(refs))
+        refs += self._refs(part["key"], len(refs))
+        new.city_refs = refs
+        new._mode_index = None
+        return new
+
+    @property
+    def garbage(self) -> int:
+        """String slots held by rows that were patched away."""
+        return len(self.ids) - len(self)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = sum(getattr(self, name).nbytes for name in self.ARRAYS)
+        index = self.slot_row.nbytes + self.id_hash.nbytes + self.id_slot.nbytes
+        if self._mode_index is not None:
+            index += self._mode_index[0].nbytes
+        return arrays + index + self.ids.nbytes + self.names.nbytes
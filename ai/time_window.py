@@ -0,0 +1,123 @@
+"""
+Departure-time phrases in chat messages.
+
+    "delhi to agra between 6 and 10am"   -> window 06:00-10:00
+    "train to jaipur after 18:30"        -> window 18:30-23:59
+    "agra to delhi tonight"              -> window 21:00-03:59
+    "next bus from delhi to agra"        -> the next departures after now
+
+Times of day ("morning", "tonight") arrive as router slots; explicit clock
+times are read with the regexes below. The result drives the catalog's
+per-pair departure index (RouteCatalog.departures_between / next_departures).
+"""
+from typing import NamedTuple, Optional
+import re
+import time
+
+from ai.intent_router import RoutedMessage
+from storage.queries import TimeWindow
+from storage.schema import DAY_MINS
+
+# router slot -> (start, end) in minutes since midnight, reply label; night wraps
+TIME_OF_DAY = {
+    "time:early_morning": (4 * 60, 8 * 60 - 1, "early in the morning"),
+    "time:morning": (6 * 60, 12 * 60 - 1, "in the morning"),
+    "time:afternoon": (12 * 60, 17 * 60 - 1, "in the afternoon"),
+    "time:evening": (17 * 60, 21 * 60 - 1, "in the evening"),
+    "time:night": (21 * 60, 4 * 60 - 1, "at night"),
+}
+# most specific first: "early morning" also hits "morning"
+_SLOT_ORDER = ("time:early_morning", "time:morning", "time:afternoon",
+               "time:evening", "time:night")
+
+# "at 9am" means roughly then
+AROUND_MINS = 60
+
+_CLOCK = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?"
+# a lone time needs minutes or am/pm, so "2 people" or "3 days" never match
+_EXPLICIT = r"(\d{1,2}(?::\d{2}\s*(?:am|pm)?|\s*(?:am|pm)))\b"
+_RANGE_RE = re.compile(rf"\b{_CLOCK}\s*(?:-|–|to|and|until|till)\s*{_CLOCK}\b")
+_BOUND_RE = re.compile(rf"\b(after|from|since|before|until|till|at|around)\s+{_EXPLICIT}")
+_CLOCK_RE = re.compile(_CLOCK)
+
+
+class TimeQuery(NamedTuple):
+    """Either departures inside `window`, or the next ones from minute `after`."""
+    window: Optional[TimeWindow]
+    after: Optional[int]
+    label: str      # how a reply names the request: "between 06:00 and 10:00"
+
+
+def format_minute(minute: int) -> str:
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def now_minute() -> int:
+    """Current server-local time of day in minutes."""
+    t = time.localtime()
+    return t.tm_hour * 60 + t.tm_min
+
+
+def _clock(hour: str, minute: Optional[str], meridiem: Optional[str]) -> Optional[int]:
+    h, m = int(hour), int(minute or 0)
+    if m > 59 or (meridiem and not 1 <= h <= 12) or h > 24:
+        return None
+    if meridiem:
+        h = h % 12 + (12 if meridiem == "pm" else 0)
+    return (h * 60 + m) % DAY_MINS
+
+
+def _window(start: int, end: int, label: str) -> TimeQuery:
+    return TimeQuery(TimeWindow(start, end), None, label)
+
+
+def _explicit_range(msg: str) -> Optional[TimeQuery]:
+    for m in _RANGE_RE.finditer(msg):
+        h1, m1, ap1, h2, m2, ap2 = m.groups()
+        if not (m1 or ap1 or m2 or ap2):
+            continue    # "2 to 3" is not a time
+        end = _clock(h2, m2, ap2)
+        start = _clock(h1, m1, ap1)
+        if ap2 and not ap1 and start is not None:
+            # "6-10am": the first time borrows the second's am/pm when it fits
+            borrowed = _clock(h1, m1, ap2)
+            if borrowed is not None and end is not None and borrowed <= end:
+                start = borrowed
+        if start is not None and end is not None:
+            return _window(start, end,
+                           f"between {format_minute(start)} and {format_minute(end)}")
+    return None
+
+
+def _explicit_bound(msg: str) -> Optional[TimeQuery]:
+    for m in _BOUND_RE.finditer(msg):
+        word = m.group(1)
+        clock = _CLOCK_RE.match(m.group(2))
+        minute = _clock(*clock.groups()) if clock else None
+        if minute is None:
+            continue
+        if word in ("after", "from", "since"):
+            return _window(minute, DAY_MINS - 1, f"after {format_minute(minute)}")
+        if word in ("before", "until", "till"):
+            return _window(0, minute, f"before {format_minute(minute)}")
+        start, end = (minute - AROUND_MINS) % DAY_MINS, (minute + AROUND_MINS) % DAY_MINS
+        return _window(start, end, f"around {format_minute(minute)}")
+    return None
+
+
+def parse_time_query(msg: str, routed: RoutedMessage,
+                     now: Optional[int] = None) -> Optional[TimeQuery]:
+    """
+    Time constraint of a lowercased chat message, or None. Explicit clock
+    times win over times of day; "next" / "now" ask for the next
+    departures after `now` (minutes, defaults to the server's clock).
+    """
+    query = _explicit_range(msg) or _explicit_bound(msg)
+    if query is not None:
+        return query
+    for slot in _SLOT_ORDER:
+        if slot in routed.slots:
+            return _window(*TIME_OF_DAY[slot])
+    if "time:next" in routed.slots:
+        return TimeQuery(None, now_minute() if now is None else now, "next")
+    return None
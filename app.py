@@ -1,10 +1,16 @@
 from flask import Flask, render_template, send_from_directory
 from routes.transport import bp as transport_bp
+from routes.analytics import bp as analytics_bp
+from routes.admin import bp as admin_bp
+from routes.metrics import bp as metrics_bp
+import gc
 import os
 from pathlib import Path
 import sqlite3
-import json
-from flask_mail import Mail, Message
+from storage import pool as storage_pool
+from storage.schema import ensure_schema
+from storage.analytics import ensure_analytics_schema
+from storage.ingest import load_feeds
 
 app = Flask(__name__, static_folder="static")
 
@@ -16,86 +22,57 @@ def serve_data(filename):
 BASE_DIR = Path(__file__).resolve().parent
 DB_PATH = BASE_DIR / "database.db"
 DATA_DIR = BASE_DIR / "data"
+KB_DIR = BASE_DIR / "knowledge_base"
+# precompiled route catalog + indexes, rewritten whenever it goes stale
+CATALOG_SNAPSHOT = BASE_DIR / "catalog.snapshot"
 
 
 def init_db():
-    if DB_PATH.exists():
-        return
     conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    c.execute("""
-        CREATE TABLE transports(
-            id TEXT PRIMARY KEY,
-            mode TEXT,
-            name TEXT,
-            origin TEXT,
-            destination TEXT,
-            departure TEXT,
-            arrival TEXT,
-            duration_mins INTEGER,
-            price REAL,
-            seats_available INTEGER,
-            rating REAL,
-            extra_json TEXT
-        )
-    """)
-
-    c.execute("""
-        CREATE TABLE user_history(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            origin TEXT,
-            destination TEXT,
-            mode TEXT,
-            priority TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    conn.commit()
-
-    def load_and_insert(filename, mode):
-        path = DATA_DIR / filename
-        if not path.exists():
-            return
-        with open(path, "r", encoding="utf-8") as f:
-            rows = json.load(f)
-        for row in rows:
-            rid = row.get("id") or f"{mode}_{row.get('code', row.get('name','unk'))}"
-            extra = json.dumps(row)
-            c.execute("""
-                INSERT INTO transports(id, mode, name, origin, destination,
-                    departure, arrival, duration_mins, price,
-                    seats_available, rating, extra_json)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                rid, mode, row.get("name"), row.get("origin"), row.get("destination"),
-                row.get("departure"), row.get("arrival"), row.get("duration_mins", 0),
-                row.get("price", 0), row.get("seats_available", 0), row.get("rating", 4.0), extra
-            ))
-        conn.commit()
-
-    load_and_insert("trains.json", "train")
-    load_and_insert("flights.json", "flight")
-    load_and_insert("buses.json", "bus")
-    load_and_insert("taxis.json", "taxi")
-    load_and_insert("bikes.json", "bike")
-
+    ensure_schema(conn)
+    # rollup tables + triggers; backfilled from existing history on first run
+    ensure_analytics_schema(conn)
+    # streams data/*.json in batches; feeds unchanged since the last load are skipped
+    for report in load_feeds(conn, DATA_DIR):
+        if not report["skipped"]:
+            print(f"Loaded {report['feed']}: {report['rows']} rows "
+                  f"({report['rows_per_sec']} rows/sec)")
     conn.close()
 
 
-def create_app():
+def warm_up():
+    """
+    Import the chat stack (numpy, rapidfuzz) and build the route catalog,
+    city resolver, journey timetable and knowledge-base index before the
+    worker takes traffic. The catalog comes from the memory-mapped snapshot
+    when it is current. Run it in the parent of forking servers
+    (gunicorn --preload) so the workers share the result.
+    """
+    import ai.agent_engine  # noqa: F401
+    from ai.catalog import warm_catalog
+    from ai.rag_engine import get_kb_index
+
+    snapshot = app.config.get("CATALOG_SNAPSHOT")
+    with storage_pool.get_pool(DB_PATH).connection() as conn:
+        warm_catalog(conn, Path(snapshot) if snapshot else None)
+    get_kb_index(KB_DIR)
+    # long-lived objects stay out of GC passes, which would otherwise touch
+    # (and un-share) their pages in every forked worker
+    gc.freeze()
+
+
+def create_app(warm: bool = False):
     global app  # <<< IMPORTANT FIX
     app.register_blueprint(transport_bp)
-    app.config.update(
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_PORT=587,
-    MAIL_USE_TLS=True,
-    MAIL_USERNAME="your_email@gmail.com",
-    MAIL_PASSWORD="your_app_password"
-)
+    app.register_blueprint(analytics_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(metrics_bp)
+    app.config.setdefault("CATALOG_SNAPSHOT", str(CATALOG_SNAPSHOT))
+    # per-request sampling profiles (?profile=1); off unless asked for
+    app.config.setdefault("PROFILING_ENABLED", os.environ.get("PROFILING_ENABLED") == "1")
 
-    mail = Mail(app)
+    if warm:
+        warm_up()
 
     @app.route("/")
     def home():
@@ -107,5 +84,5 @@ def create_app():
 if __name__ == "__main__":
     os.makedirs(DATA_DIR, exist_ok=True)
     init_db()
-    app = create_app()
+    app = create_app(warm=True)
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,97 @@
+"""
+Admin catalog batches: per-batch apply latency for mixed add / update /
+delete batches, and what bringing the in-memory catalog up to date costs
+when it is patched from catalog_changes vs reloaded from scratch.
+
+    python -m benchmarks.bench_admin_batches --rows 200000 --sizes 100 1000 5000
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from ai.catalog import load_catalog, patch_catalog
+from benchmarks.common import generate_routes, seed_transports, summarize
+from storage.analytics import ensure_analytics_schema
+from storage.catalog_admin import apply_batch
+from storage.pool import get_pool
+from storage.schema import catalog_version, ensure_schema
+
+
+def make_batch(rng, ids, size, serial):
+    """A third each of new rows, field updates and deletes of existing rows."""
+    n_add = size // 3
+    n_del = size // 3
+    add = [{"id": f"adm_{serial}_{i}", "mode": "bus", "name": f"Admin {i}",
+            "origin": f"Newtown {serial}", "destination": "Delhi",
+            "departure": "08:00", "arrival": "10:30", "duration_mins": 150,
+            "price": float(rng.randint(100, 900)), "seats_available": 30}
+           for i in range(n_add)]
+    picked = rng.sample(ids, size - n_add)
+    update = [{"id": rid, "price": float(rng.randint(100, 900)), "seats_available": rng.randint(0, 50)}
+              for rid in picked[n_del:]]
+    delete = picked[:n_del]
+    for rid in delete:
+        ids.remove(rid)
+    ids.extend(r["id"] for r in add)
+    return add, update, delete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--batches", type=int, default=10, help="batches per size")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        conn = sqlite3.connect(db_path)
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows))
+        ensure_analytics_schema(conn)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        pool = get_pool(db_path)
+        with pool.connection() as db:
+            ids = [r[0] for r in db.execute("SELECT id FROM transports")]
+            catalog = load_catalog(db, catalog_version(db))
+
+            for size in args.sizes:
+                apply_ms, patch_ms, reload_ms = [], [], []
+                for serial in range(args.batches):
+                    add, update, delete = make_batch(rng, ids, size, f"{size}_{serial}")
+                    apply_ms.append(apply_batch(pool, add, update, delete)["apply_ms"])
+                    version = catalog_version(db)
+
+                    t0 = time.perf_counter()
+                    patched = patch_catalog(db, catalog, version)
+                    patch_ms.append((time.perf_counter() - t0) * 1000.0)
+                    t0 = time.perf_counter()
+                    reloaded = load_catalog(db, version)
+                    reload_ms.append((time.perf_counter() - t0) * 1000.0)
+
+                    if patched is None or len(patched) != len(reloaded):
+                        raise SystemExit(f"patch fell back or diverged at batch size {size}")
+                    catalog = patched
+
+                results.append({
+                    "batch_rows": size,
+                    "apply": summarize(apply_ms),
+                    "apply_rows_per_s": round(size * len(apply_ms) / (sum(apply_ms) / 1000), 1),
+                    "catalog_patch": summarize(patch_ms),
+                    "catalog_reload": summarize(reload_ms),
+                })
+
+    print(json.dumps({"transports": args.rows, "batches_per_size": args.batches,
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
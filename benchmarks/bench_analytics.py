@@ -0,0 +1,98 @@
+"""
+Dashboard queries over raw tables vs the precomputed analytics rollups,
+plus what the rollups cost: the one-pass backfill and the per-booking
+trigger overhead.
+
+    python -m benchmarks.bench_analytics --rows 500000 --bookings 1000000
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports, summarize, time_calls
+from storage.analytics import (
+    BOOKING_ROLLUP_TRIGGERS, booking_summary, distributions, drop_triggers,
+    ensure_analytics_schema, mode_counts,
+)
+from storage.schema import ensure_schema
+
+BOOK_INSERT = "INSERT INTO user_history(origin, destination, mode, priority, timestamp) VALUES (?, ?, ?, 'booking', ?)"
+
+
+def scan_dashboard(db):
+    """What the dashboard would run without rollups."""
+    db.execute("SELECT mode, COUNT(*) FROM transports GROUP BY mode").fetchall()
+    db.execute("SELECT mode, AVG(price), AVG(duration_mins) FROM transports GROUP BY mode").fetchall()
+    db.execute("SELECT mode, COUNT(*) FROM user_history WHERE priority='booking' GROUP BY mode").fetchall()
+    db.execute(
+        "SELECT origin, destination, mode, COUNT(*) AS c FROM user_history"
+        " WHERE priority='booking' GROUP BY 1, 2, 3 ORDER BY c DESC LIMIT 10"
+    ).fetchall()
+
+
+def rollup_dashboard(db):
+    mode_counts(db)
+    distributions(db)
+    booking_summary(db)
+
+
+def bookings(routes, n, seed=5):
+    rng = random.Random(seed)
+    for _ in range(n):
+        r = rng.choice(routes)
+        yield (r[0], r[1], r[2], f"2026-01-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:00:00")
+
+
+def insert_rate(conn, rows):
+    t0 = time.perf_counter()
+    conn.executemany(BOOK_INSERT, rows)
+    conn.commit()
+    return round(len(rows) / (time.perf_counter() - t0), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--bookings", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "bench.db")
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows))
+        routes = conn.execute("SELECT origin, destination, mode FROM transports").fetchall()
+        conn.executemany(BOOK_INSERT, bookings(routes, args.bookings))
+        conn.commit()
+
+        t0 = time.perf_counter()
+        ensure_analytics_schema(conn)   # first run backfills
+        backfill_s = time.perf_counter() - t0
+
+        sample = list(bookings(routes, 20_000, seed=9))
+        with_triggers = insert_rate(conn, sample)
+        drop_triggers(conn, BOOKING_ROLLUP_TRIGGERS)
+        without_triggers = insert_rate(conn, sample)
+
+        calls = [()] * args.repeat
+        scan = summarize(time_calls(lambda: scan_dashboard(conn), calls))
+        rollup = summarize(time_calls(lambda: rollup_dashboard(conn), calls))
+        conn.close()
+
+    print(json.dumps({
+        "transports": args.rows,
+        "bookings": args.bookings,
+        "backfill_s": round(backfill_s, 2),
+        "booking_inserts_per_s": {"with_rollup_triggers": with_triggers,
+                                  "without": without_triggers},
+        "dashboard_scan_ms": scan,
+        "dashboard_rollup_ms": rollup,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
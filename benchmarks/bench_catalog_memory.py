@@ -0,0 +1,151 @@
+"""
+Route catalog memory and build time: the columnar RouteCatalog against the
+previous list-of-dicts catalog (every row a dict with its extra_json, plus
+by_id and by_pair indexes over them).
+
+Each (approach, size) is built from SQLite in a fresh interpreter, which
+reports RSS growth over its post-import baseline (also after glibc
+malloc_trim, which returns freed build temporaries to the OS), peak RSS
+and build time, plus the latency of routes_between lookups. A build whose
+extrapolated RSS does not fit in the available memory is skipped.
+
+    python -m benchmarks.bench_catalog_memory --rows 1000000 10000000
+"""
+import argparse
+import ctypes
+import gc
+import json
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# imported up front so both approaches start from the same post-import baseline
+from ai.catalog import load_catalog
+from benchmarks.common import generate_routes, seed_transports, summarize, time_calls
+from storage.schema import TRANSPORTS_DDL
+
+APPROACHES = ("dicts", "columnar")
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def available_mb() -> float:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) / 1024
+    return float("inf")
+
+
+def build_dicts(db):
+    """The catalog as it was: dict rows, by_id and lowercased by_pair."""
+    from storage.queries import SELECT_TRANSPORTS
+
+    routes = [dict(r) for r in db.execute(SELECT_TRANSPORTS)]
+    by_id = {r["id"]: r for r in routes}
+    by_pair = defaultdict(list)
+    for r in routes:
+        by_pair[((r["origin"] or "").lower(), (r["destination"] or "").lower())].append(r)
+    return (routes, by_id, by_pair), lambda o, d: by_pair.get((o.lower(), d.lower()), [])
+
+
+def build_columnar(db):
+    catalog = load_catalog(db)
+    return catalog, catalog.routes_between
+
+
+def child(db_path: str, approach: str) -> None:
+    db = sqlite3.connect(db_path)
+    db.row_factory = sqlite3.Row
+    pairs = db.execute("SELECT origin, destination FROM transports"
+                       " WHERE rowid % 997 = 0 LIMIT 2000").fetchall()
+    gc.collect()
+    base = rss_mb()
+
+    t0 = time.perf_counter()
+    catalog, between = (build_dicts if approach == "dicts" else build_columnar)(db)
+    build_s = time.perf_counter() - t0
+    gc.collect()
+    grown = rss_mb() - base
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+        trimmed = rss_mb() - base
+    except (OSError, AttributeError):
+        trimmed = grown
+
+    rng = random.Random(3)
+    lookups = [tuple(rng.choice(pairs)) for _ in range(2000)]
+    n = db.execute("SELECT count(*) FROM transports").fetchone()[0]
+    print(json.dumps({
+        "rows": n,
+        "build_s": round(build_s, 2),
+        "rss_mb": round(grown, 1),
+        "bytes_per_route": round(grown * 2**20 / max(n, 1), 1),
+        "rss_trimmed_mb": round(trimmed, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "routes_between": summarize(time_calls(between, lookups)),
+    }))
+
+
+def run_child(db_path: Path, approach: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_catalog_memory", "--child", str(db_path), approach],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--cities", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    per_route = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sorted(args.rows):
+            db_path = Path(tmp) / f"catalog_{n}.db"
+            conn = sqlite3.connect(db_path)
+            conn.execute(TRANSPORTS_DDL)
+            t0 = time.perf_counter()
+            seed_transports(conn, generate_routes(n, n_cities=args.cities))
+            conn.close()
+            seed_s = time.perf_counter() - t0
+
+            results[n] = {"seed_s": round(seed_s, 1),
+                          "db_mb": round(db_path.stat().st_size / 2**20, 1)}
+            for approach in APPROACHES:
+                need = per_route.get(approach, 0) * n / 2**20
+                if need > 0.8 * available_mb():
+                    results[n][approach] = {"skipped": "would not fit in available memory",
+                                            "estimated_rss_mb": round(need, 1)}
+                    continue
+                results[n][approach] = run_child(db_path, approach)
+                per_route[approach] = results[n][approach]["bytes_per_route"]
+            dicts, cols = results[n]["dicts"], results[n]["columnar"]
+            if "rss_mb" in dicts:
+                results[n]["memory_ratio"] = round(dicts["rss_mb"] / max(cols["rss_mb"], 1e-9), 1)
+            db_path.unlink()
+
+    print(json.dumps({"cities": args.cities, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
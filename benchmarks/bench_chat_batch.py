@@ -0,0 +1,126 @@
+"""
+Replay throughput: N sequential POST /chat calls vs one POST /chat/batch
+(threads), and the Python respond_batch API with threads vs forked
+processes. The app is served over real HTTP by werkzeug on a free port;
+the response cache is cleared before every mode.
+
+    python -m benchmarks.bench_chat_batch --rows 50000 --messages 2000
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+from benchmarks.common import generate_routes, seed_transports
+from storage.response_cache import response_cache
+from storage.schema import ensure_schema
+
+TEMPLATES = (
+    "cheapest {a} to {b}", "fastest way from {a} to {b}", "best bus from {a} to {b}",
+    "comfortable train {a} to {b}", "{a} to {b} tomorrow",
+)
+FAQ = (
+    "baggage rules for flights", "is it safe to travel at night", "holiday rush tips",
+    "which websites to book on", "what should i pack", "who are you", "hello",
+)
+
+
+def make_messages(cities, n, seed=13):
+    """Replay-like mix: route questions over popular pairs, plus FAQ repeats."""
+    rng = random.Random(seed)
+    popular = [rng.sample(cities, 2) for _ in range(max(10, n // 8))]
+    out = []
+    for _ in range(n):
+        if rng.random() < 0.25:
+            out.append(rng.choice(FAQ))
+        else:
+            a, b = rng.choice(popular)
+            out.append(rng.choice(TEMPLATES).format(a=a, b=b))
+    return out
+
+
+def post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def timed(fn):
+    response_cache.clear()
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        conn = sqlite3.connect(db_path)
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows))
+        conn.execute("PRAGMA journal_mode=WAL")
+        cities = [r[0] for r in conn.execute("SELECT DISTINCT origin FROM transports")]
+        conn.close()
+
+        import app as appmod
+        import routes.transport as transport
+        from ai.agent_engine import respond_batch
+        from ai.catalog import get_catalog
+        from storage.pool import get_pool
+
+        appmod.DB_PATH = transport.DB_PATH = db_path
+        app = appmod.create_app()
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+
+        messages = make_messages(cities, args.messages)
+        post(base + "/chat", {"message": "cheapest delhi to agra"})   # load catalog, imports
+        n = len(messages)
+        modes = {}
+
+        secs, _ = timed(lambda: [post(base + "/chat", {"message": m}) for m in messages])
+        modes["http_sequential_chat"] = secs
+        for w in args.workers:
+            secs, body = timed(lambda: post(base + "/chat/batch", {"messages": messages, "workers": w}))
+            assert body["count"] == n and not any("error" in r for r in body["results"])
+            modes[f"http_batch_workers_{w}"] = secs
+
+        with get_pool(db_path).connection() as db:
+            catalog = get_catalog(db)
+        for w in args.workers:
+            secs, _ = timed(lambda: respond_batch(messages, catalog, transport.KB_DIR,
+                                                  cache=response_cache, workers=w))
+            modes[f"api_threads_{w}"] = secs
+        for w in args.workers[1:]:
+            secs, _ = timed(lambda: respond_batch(messages, catalog, transport.KB_DIR,
+                                                  cache=response_cache, workers=w, processes=True))
+            modes[f"api_processes_{w}"] = secs
+        server.shutdown()
+
+    base_secs = modes["http_sequential_chat"]
+    print(json.dumps({
+        "transports": args.rows,
+        "messages": n,
+        "modes": {name: {"seconds": round(s, 3), "msgs_per_s": round(n / s, 1),
+                         "speedup": round(base_secs / s, 2)}
+                  for name, s in modes.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+CityResolver build time and throughput at 10k and 100k cities, compared
+with the old process.extract(msg, cities, scorer=fuzz.partial_ratio) scan.
+
+    python -m benchmarks.bench_city_resolver
+"""
+import argparse
+import json
+import time
+
+from rapidfuzz import fuzz, process
+
+from ai.city_resolver import CityResolver
+from benchmarks.common import chat_messages, make_cities
+
+
+def legacy_extract(msg, cities):
+    extracted = process.extract(msg, cities, limit=5, scorer=fuzz.partial_ratio)
+    return [c[0] for c in extracted if c[1] > 60][:2]
+
+
+def throughput(fn, messages):
+    t0 = time.perf_counter()
+    for m in messages:
+        fn(m)
+    elapsed = time.perf_counter() - t0
+    return round(len(messages) / elapsed, 1) if elapsed else float("inf")
+
+
+def run(n_cities, n_messages, legacy_messages):
+    cities = make_cities(n_cities)
+    messages = chat_messages(n_messages, cities)
+
+    t0 = time.perf_counter()
+    resolver = CityResolver(cities)
+    build_s = time.perf_counter() - t0
+
+    cold = throughput(resolver.resolve, messages)
+    warm = throughput(resolver.resolve, messages)
+    legacy = throughput(lambda m: legacy_extract(m, cities), messages[:legacy_messages])
+
+    return {
+        "cities": n_cities,
+        "build_s": round(build_s, 3),
+        "resolver_cold_msgs_per_s": cold,
+        "resolver_warm_msgs_per_s": warm,
+        "legacy_extract_msgs_per_s": legacy,
+        "cache": resolver.resolve_phrase.cache_info()._asdict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--legacy-messages", type=int, default=200,
+                        help="the legacy scan is slow; time it on a subset")
+    args = parser.parse_args()
+
+    print(json.dumps([run(n, args.messages, args.legacy_messages) for n in args.sizes], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Mixed reader/booker load against SQLite: per-request connections with the
+default rollback journal (the old get_db) vs the shared WAL ConnectionPool.
+
+    python -m benchmarks.bench_db_concurrency --readers 8 --bookers 4 --seconds 5
+
+Reports reads/sec, bookings/sec, lock waits (busy errors / retries) and
+failed bookings for each setup.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports
+from storage.pool import ConnectionPool, is_busy_error
+from storage.queries import search_transports
+from storage.schema import ensure_schema
+
+BOOK_SELECT = "SELECT origin, destination, mode FROM transports WHERE id=?"
+BOOK_INSERT = "INSERT INTO user_history(origin, destination, mode, priority) VALUES (?, ?, ?, ?)"
+
+
+def make_db(path: Path, rows: int):
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    seed_transports(conn, generate_routes(rows, n_cities=300))
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+
+
+def _book(db, transport_id):
+    row = db.execute(BOOK_SELECT, (transport_id,)).fetchone()
+    db.execute(BOOK_INSERT, (row[0], row[1], row[2], "booking"))
+
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = self.books = self.lock_waits = self.failed = 0
+
+    def add(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                setattr(self, k, getattr(self, k) + v)
+
+
+def legacy_reader(path, queries, stop, counters):
+    rng = random.Random()
+    while not stop.is_set():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            search_transports(conn, *rng.choice(queries))
+            counters.add(reads=1)
+        except sqlite3.OperationalError as exc:
+            counters.add(lock_waits=int(is_busy_error(exc)), failed=1)
+        finally:
+            conn.close()
+
+
+def legacy_booker(path, ids, stop, counters):
+    rng = random.Random()
+    while not stop.is_set():
+        conn = sqlite3.connect(path)
+        try:
+            _book(conn, rng.choice(ids))
+            conn.commit()
+            counters.add(books=1)
+        except sqlite3.OperationalError as exc:
+            counters.add(lock_waits=int(is_busy_error(exc)), failed=1)
+        finally:
+            conn.close()
+
+
+def pool_reader(pool, queries, stop, counters):
+    rng = random.Random()
+    while not stop.is_set():
+        with pool.connection() as conn:
+            search_transports(conn, *rng.choice(queries))
+        counters.add(reads=1)
+
+
+def pool_booker(pool, ids, stop, counters):
+    rng = random.Random()
+    while not stop.is_set():
+        with pool.connection() as conn:
+            try:
+                pool.run_write(conn, _book, rng.choice(ids))
+                counters.add(books=1)
+            except sqlite3.OperationalError:
+                counters.add(failed=1)
+
+
+def run(label, reader, booker, target, args, queries, ids):
+    stop = threading.Event()
+    counters = Counters()
+    threads = [threading.Thread(target=reader, args=(target, queries, stop, counters))
+               for _ in range(args.readers)]
+    threads += [threading.Thread(target=booker, args=(target, ids, stop, counters))
+                for _ in range(args.bookers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    return {
+        "setup": label,
+        "reads_per_sec": round(counters.reads / elapsed, 1),
+        "bookings_per_sec": round(counters.books / elapsed, 1),
+        "lock_waits": counters.lock_waits,
+        "failed": counters.failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--bookers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    routes = list(generate_routes(args.rows, n_cities=300))
+    rng = random.Random(1)
+    queries = [(r["origin"], r["destination"], "") for r in rng.sample(routes, 200)]
+    ids = [r["id"] for r in rng.sample(routes, 1000)]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.db"
+        make_db(legacy_path, args.rows)
+        results.append(run("per-request connection, rollback journal",
+                           legacy_reader, legacy_booker, legacy_path, args, queries, ids))
+
+        pool_path = Path(tmp) / "pool.db"
+        make_db(pool_path, args.rows)
+        pool = ConnectionPool(pool_path, size=args.readers + args.bookers)
+        res = run("ConnectionPool, WAL", pool_reader, pool_booker, pool, args, queries, ids)
+        res["lock_waits"] = pool.stats.lock_waits
+        res["pool"] = pool.stats.as_dict()
+        pool.close()
+        results.append(res)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Departure-time queries between two cities: time windows ("06:00-10:00",
+some wrapping past midnight) and "next N departures after T".
+
+- sql_filter:     /search rows for the pair, window filtered in Python (before)
+- sql_window:     search_page with a TimeWindow (idx_transports_route_departure)
+- catalog_linear: catalog rows for the pair, parsed and filtered per query
+- catalog_bisect: RouteCatalog.departures_between / next_departures
+
+    python -m benchmarks.bench_departures --rows 200000 --cities 40
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from ai.catalog import load_catalog
+from benchmarks.common import generate_routes, seed_transports, summarize, time_calls
+from storage.queries import MAX_PAGE_SIZE, TimeWindow, build_search_query, search_page
+from storage.schema import DAY_MINS, ensure_schema, minutes_of_day
+
+
+def make_windows(pairs, n, seed=5):
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        origin, destination = rng.choice(pairs)
+        start = rng.randrange(0, DAY_MINS, 15)
+        width = rng.choice((60, 120, 240))
+        out.append((origin, destination, TimeWindow(start, (start + width) % DAY_MINS, False)))
+    return out
+
+
+def sql_filter(db, origin, destination, window):
+    rows, cursor = search_page(db, origin, destination, "", limit=MAX_PAGE_SIZE)
+    assert cursor is None
+    return sorted(r["id"] for r in rows if minutes_of_day(r["departure"]) in window)
+
+
+def sql_window(db, origin, destination, window):
+    rows, cursor = search_page(db, origin, destination, "", limit=MAX_PAGE_SIZE, window=window)
+    assert cursor is None
+    return sorted(r["id"] for r in rows)
+
+
+def linear_window(catalog, origin, destination, window):
+    return sorted(r["id"] for r in catalog.routes_between(origin, destination)
+                  if minutes_of_day(r["departure"]) in window)
+
+
+def bisect_window(catalog, origin, destination, window):
+    return sorted(r["id"] for r in catalog.departures_between(origin, destination, window))
+
+
+def linear_next(catalog, origin, destination, after, n):
+    timed = [(minutes_of_day(r["departure"]), r) for r in catalog.routes_between(origin, destination)]
+    timed.sort(key=lambda t: ((t[0] - after) % DAY_MINS))
+    return [r["id"] for _, r in timed[:n]]
+
+
+def bisect_next(catalog, origin, destination, after, n):
+    return [r["id"] for r in catalog.next_departures(origin, destination, after, n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--cities", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--next", type=int, default=5, dest="n_next")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(Path(tmp) / "bench.db")
+        db.row_factory = sqlite3.Row
+        ensure_schema(db)
+        seed_transports(db, generate_routes(args.rows, n_cities=args.cities))
+        db.execute("ANALYZE")
+        pairs = [(r[0], r[1]) for r in db.execute(
+            "SELECT DISTINCT origin_norm, destination_norm FROM transports")]
+        queries = make_windows(pairs, args.queries)
+
+        query, params = build_search_query(*queries[0][:2], "", "exact", ("id",), queries[0][2])
+        plan = [r[3] for r in db.execute("EXPLAIN QUERY PLAN " + query + " ORDER BY id", params)]
+
+        catalog = load_catalog(db)
+        for origin, destination, window in queries:
+            expected = sql_filter(db, origin, destination, window)
+            assert sql_window(db, origin, destination, window) == expected
+            assert linear_window(catalog, origin, destination, window) == expected
+            assert bisect_window(catalog, origin, destination, window) == expected
+
+        results = {
+            "sql_filter": summarize(time_calls(lambda *q: sql_filter(db, *q), queries)),
+            "sql_window": summarize(time_calls(lambda *q: sql_window(db, *q), queries)),
+            "catalog_linear": summarize(time_calls(lambda *q: linear_window(catalog, *q), queries)),
+            "catalog_bisect": summarize(time_calls(lambda *q: bisect_window(catalog, *q), queries)),
+        }
+
+        nexts = [(o, d, w.start, args.n_next) for o, d, w in queries]
+        for q in nexts:
+            assert [minutes_of_day(catalog.by_id[i]["departure"]) for i in linear_next(catalog, *q)] == \
+                   [minutes_of_day(catalog.by_id[i]["departure"]) for i in bisect_next(catalog, *q)]
+        results["next_linear"] = summarize(time_calls(lambda *q: linear_next(catalog, *q), nexts))
+        results["next_bisect"] = summarize(time_calls(lambda *q: bisect_next(catalog, *q), nexts))
+        db.close()
+
+    print(json.dumps({
+        "transports": args.rows,
+        "pairs": len(pairs),
+        "rows_per_pair": round(args.rows / max(len(pairs), 1), 1),
+        "sql_window_plan": plan,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cost of leaving instrumentation on: a bare stage() timer, a timed vs plain
+SQLite execute, and end-to-end /chat and /compare_websites latency with
+metrics enabled vs disabled.
+
+    python -m benchmarks.bench_instrumentation --rows 50000 --requests 300
+"""
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports, summarize
+from storage import metrics
+from storage.schema import ensure_schema
+
+REQUESTS = (
+    ("/chat", {"message": "cheapest delhi to agra"}),
+    ("/chat", {"message": "baggage rules for flights"}),
+    ("/compare_websites", {"origin": "delhi", "destination": "", "mode": "flight", "limit": 50}),
+)
+
+
+def per_call_ns(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return round((time.perf_counter() - t0) / n * 1e9, 1)
+
+
+def micro(db_path: Path, n: int) -> dict:
+    def timer():
+        with metrics.stage("bench"):
+            pass
+
+    plain = sqlite3.connect(db_path)
+    timed = sqlite3.connect(db_path, factory=metrics.TimedConnection)
+    sql = "SELECT price FROM transports WHERE id = ?"
+    out = {
+        "stage_ns": per_call_ns(timer, n),
+        "execute_plain_ns": per_call_ns(lambda: plain.execute(sql, ("train_1",)).fetchone(), n),
+        "execute_timed_ns": per_call_ns(lambda: timed.execute(sql, ("train_1",)).fetchone(), n),
+    }
+    metrics.set_enabled(False)
+    out["stage_disabled_ns"] = per_call_ns(timer, n)
+    metrics.set_enabled(True)
+    plain.close()
+    timed.close()
+    return out
+
+
+def requests(client, n: int) -> dict:
+    out = {}
+    for path, body in REQUESTS:
+        client.post(path, json=body)
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            client.post(path, json=body)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        out[f"{path} {body.get('message') or body.get('origin')}"] = summarize(samples)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--calls", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        conn = sqlite3.connect(db_path)
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        import app as appmod
+        import routes.transport as transport
+        appmod.DB_PATH = transport.DB_PATH = db_path
+        client = appmod.create_app().test_client()
+
+        result = {"transports": args.rows, "micro": micro(db_path, args.calls)}
+        result["enabled"] = requests(client, args.requests)
+        metrics.set_enabled(False)
+        result["disabled"] = requests(client, args.requests)
+        metrics.set_enabled(True)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
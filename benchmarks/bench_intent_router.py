@@ -0,0 +1,91 @@
+"""
+Intent classification micro-benchmark: the old sequential `any(k in msg)`
+keyword scans vs the compiled IntentRouter, on a chat corpus, and as the
+keyword table grows.
+
+    python -m benchmarks.bench_intent_router --messages 20000
+"""
+import argparse
+import json
+import random
+import time
+
+from ai.intent_router import INTENT_PATTERNS, SLOT_PATTERNS, IntentRouter
+from benchmarks.common import chat_messages, make_cities
+
+# the keyword lists the old respond_intelligently tested, in order
+LEGACY_KEYWORDS = [
+    ("greeting", ["hi", "hello", "hey", "namaste", "good morning", "good evening"]),
+    ("remember_name", ["my name is"]),
+    ("identity", ["your name"]),
+    ("rush", ["holiday", "crowd", "festival", "rush", "peak", "long weekend"]),
+    ("websites", ["where to book", "website", "app", "online booking"]),
+    ("packing", ["prepare", "packing", "checklist", "travel tips"]),
+    ("knowledge", ["safety", "baggage", "rules", "luggage"]),
+]
+
+
+def legacy_classify(msg, table):
+    for intent, words in table:
+        if any(w in msg for w in words):
+            return intent
+    return None
+
+
+def throughput(fn, messages):
+    t0 = time.perf_counter()
+    for m in messages:
+        fn(m)
+    elapsed = time.perf_counter() - t0
+    return round(len(messages) / elapsed, 1) if elapsed else float("inf")
+
+
+def extra_intents(n, seed=3):
+    """n synthetic intents of 5 made-up keywords each."""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return {
+        f"extra_{i}": ["".join(rng.choice(letters) for _ in range(rng.randint(5, 9))) for _ in range(5)]
+        for i in range(n)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--extra", type=int, nargs="+", default=[0, 50, 500])
+    args = parser.parse_args()
+
+    messages = [m.lower() for m in chat_messages(args.messages, make_cities(2000))]
+    router = IntentRouter()
+
+    # how often the substring scan misfires where the router does not
+    disagree = sum(
+        1 for m in messages
+        if legacy_classify(m, LEGACY_KEYWORDS) == "greeting" and "greeting" not in router.scan(m).intents
+    )
+
+    scaling = []
+    for n in args.extra:
+        extra = extra_intents(n)
+        table = LEGACY_KEYWORDS + list(extra.items())
+        t0 = time.perf_counter()
+        grown = IntentRouter(dict(INTENT_PATTERNS, **extra), SLOT_PATTERNS)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+        scaling.append({
+            "extra_intents": n,
+            "keywords": sum(len(w) for _, w in table),
+            "router_build_ms": round(build_ms, 2),
+            "legacy_msgs_per_s": throughput(lambda m: legacy_classify(m, table), messages),
+            "router_msgs_per_s": throughput(grown.scan, messages),
+        })
+
+    print(json.dumps({
+        "messages": len(messages),
+        "legacy_false_greetings": disagree,
+        "scaling": scaling,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Seat inventory stress test: thousands of concurrent bookers hold, confirm,
+release or abandon seats on a small set of scarce transports, while the
+reconciler runs. Checks that no transport is ever oversold and reports
+throughput with one lock (shards=1) vs sharded locks.
+
+    python -m benchmarks.bench_inventory --bookers 2000 --ops 5
+
+Exits non-zero if any invariant fails.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports
+from storage.booking_queue import BookingWriter
+from storage.inventory import SeatInventory
+from storage.pool import get_pool
+from storage.schema import ensure_schema
+
+
+def make_db(path: Path, transports: int, max_seats: int, seed: int = 3) -> dict:
+    rng = random.Random(seed)
+    routes = []
+    for r in generate_routes(transports, n_cities=50):
+        r["seats_available"] = rng.randint(0, max_seats)
+        routes.append(r)
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    seed_transports(conn, routes)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+    return {r["id"]: r["seats_available"] for r in routes}
+
+
+def run(db_path: Path, initial: dict, shards: int, bookers: int, ops: int, seed: int) -> dict:
+    writer = BookingWriter(get_pool(db_path))
+    inventory = SeatInventory(db_path, writer=writer, shards=shards, hold_ttl=30.0)
+    inventory.start(interval=0.05)
+    ids = list(initial)
+    sold = Counter()
+    outcomes = Counter()
+    lock = threading.Lock()
+    start = threading.Barrier(bookers + 1)
+
+    def booker(i):
+        rng = random.Random(seed * 100_003 + i)
+        local_sold, local = Counter(), Counter()
+        start.wait()
+        for _ in range(ops):
+            tid = rng.choice(ids)
+            seats = rng.choice((1, 1, 1, 2, 3))
+            action = rng.random()
+            held = inventory.hold(tid, seats, ttl=0.01 if action > 0.9 else None)
+            if held["code"] != 200:
+                local["rejected"] += 1
+                continue
+            if action < 0.8:
+                result = inventory.confirm(held["hold_id"])
+                local["confirmed" if result["code"] == 200 else "confirm_failed"] += 1
+                if result["code"] == 200:
+                    local_sold[tid] += seats
+            elif action < 0.9:
+                inventory.release(held["hold_id"])
+                local["released"] += 1
+            else:
+                local["abandoned"] += 1     # left to expire
+        with lock:
+            sold.update(local_sold)
+            outcomes.update(local)
+
+    threads = [threading.Thread(target=booker, args=(i,)) for i in range(bookers)]
+    for t in threads:
+        t.start()
+    start.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    inventory.stop()
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    final = dict(conn.execute("SELECT id, seats_available FROM transports"))
+    booked_rows = conn.execute("SELECT COUNT(*) FROM user_history WHERE priority='booking'").fetchone()[0]
+    # reset for the next run
+    conn.executemany("UPDATE transports SET seats_available=? WHERE id=?",
+                     [(s, tid) for tid, s in initial.items()])
+    conn.execute("DELETE FROM user_history")
+    conn.commit()
+    conn.close()
+
+    violations = [tid for tid in initial
+                  if final[tid] < 0 or initial[tid] - final[tid] != sold[tid] or sold[tid] > initial[tid]]
+    attempts = bookers * ops
+    return {
+        "shards": shards,
+        "seconds": round(elapsed, 2),
+        "attempts_per_s": round(attempts / elapsed, 1),
+        "confirms_per_s": round(outcomes["confirmed"] / elapsed, 1),
+        "outcomes": dict(outcomes),
+        "seats_sold": sum(sold.values()),
+        "booking_rows": booked_rows,
+        "sold_out_transports": sum(1 for tid in initial if final[tid] == 0),
+        "oversold": len(violations),
+        "ok": not violations and booked_rows == outcomes["confirmed"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--bookers", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=5, help="booking attempts per booker")
+    parser.add_argument("--transports", type=int, default=300)
+    parser.add_argument("--max-seats", type=int, default=40)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 64])
+    args = parser.parse_args()
+
+    threading.stack_size(256 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        initial = make_db(db_path, args.transports, args.max_seats)
+        runs = [run(db_path, initial, s, args.bookers, args.ops, seed=7) for s in args.shards]
+
+    print(json.dumps({
+        "bookers": args.bookers,
+        "attempts": args.bookers * args.ops,
+        "transports": args.transports,
+        "seats_total": sum(initial.values()),
+        "runs": runs,
+    }, indent=2))
+    if not all(r["ok"] for r in runs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
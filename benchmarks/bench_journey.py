@@ -0,0 +1,64 @@
+"""
+Journey planner build time and query latency on a synthetic network
+(default: 10k cities, 1M legs), per objective.
+
+    python -m benchmarks.bench_journey --cities 10000 --legs 1000000 --queries 50
+"""
+import argparse
+import json
+import random
+import time
+
+from ai.journey_planner import OBJECTIVES, Timetable
+from benchmarks.common import generate_routes, summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=10_000)
+    parser.add_argument("--legs", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-legs", type=int, default=4)
+    parser.add_argument("--ondemand", type=float, default=0.1,
+                        help="share of taxi/bike legs turned into on-demand ('ASAP') legs")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    routes = list(generate_routes(args.legs, n_cities=args.cities))
+    for r in routes:
+        if r["mode"] in ("taxi", "bike") and rng.random() < args.ondemand:
+            r["departure"], r["arrival"] = "ASAP", f"{r['duration_mins']} mins"
+
+    t0 = time.perf_counter()
+    timetable = Timetable(routes)
+    build_s = time.perf_counter() - t0
+
+    cities = timetable.cities
+    queries = [
+        (rng.choice(cities), rng.choice(cities), f"{rng.randrange(5, 20):02d}:00")
+        for _ in range(args.queries)
+    ]
+
+    results = {
+        "cities": len(cities),
+        "legs": len(routes),
+        "connections": timetable.n_connections,
+        "build_s": round(build_s, 2),
+    }
+    for objective in OBJECTIVES:
+        found = []
+
+        def plan(o, d, t):
+            found.append(len(timetable.plan(o, d, t, objective, k=args.k, max_legs=args.max_legs)))
+
+        stats = summarize(time_calls(plan, queries))
+        stats["answered"] = sum(1 for n in found if n)
+        stats["avg_itineraries"] = round(sum(found) / len(found), 2)
+        results[objective] = stats
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Chat route answers: live ranking of a pair's rows on every message
+(routes_between + rank_by_priorities, as before) vs one lookup in the
+materialized RecommendationTable (RouteCatalog.recommend). Also reports
+the table's build time and size, and re-ranking only the touched pairs
+after a batch of changed rows (table_patch_s, part of catalog_patch_s)
+against rebuilding the whole table.
+
+    python -m benchmarks.bench_recommendations --sizes 200000 1000000 --cities 200
+"""
+import argparse
+import json
+import random
+import time
+
+from ai.catalog import RouteCatalog
+from ai.recommendation_table import RecommendationTable
+from ai.recommender import rank_by_priorities
+from benchmarks.common import generate_routes, popular, summarize, time_calls
+
+PRIORITY_SETS = (("price", "price", "time"), ("time", "price", "time"),
+                 ("comfort", "price", "time"), ("eco", "price", "time"))
+
+
+def live(catalog, origin, destination, priorities):
+    return rank_by_priorities(catalog.routes_between(origin, destination), priorities, k=1)
+
+
+def materialized(catalog, origin, destination, priorities):
+    return catalog.recommend(origin, destination, priorities, k=1)
+
+
+def changed_rows(catalog, n, rng):
+    rows = [catalog.routes[i] for i in rng.sample(range(len(catalog)), n)]
+    for r in rows:
+        r["price"] = float(rng.randint(50, 9000))
+        r["seats_available"] = rng.randint(0, 60)
+    return rows
+
+
+def run(n, cities, lookups, batches):
+    catalog = RouteCatalog(generate_routes(n, n_cities=cities, ondemand=True), version=1)
+    rng = random.Random(9)
+
+    t0 = time.perf_counter()
+    table = catalog.recommendations
+    build_s = time.perf_counter() - t0
+
+    pairs = sorted({(r["origin"], r["destination"]) for r in catalog.routes[:20000]})
+    rng.shuffle(pairs)
+    pick = popular(pairs, rng)
+    queries = [(*pick(), rng.choice(PRIORITY_SETS)) for _ in range(lookups)]
+    for q in queries[:500]:
+        assert materialized(catalog, *q) == live(catalog, *q)
+
+    result = {
+        "routes": n,
+        "pairs": len(table),
+        "rows_per_pair": round(n / max(len(table), 1), 1),
+        "table_build_s": round(build_s, 3),
+        "table_mb": round(table.nbytes / 2**20, 1),
+        "live": summarize(time_calls(lambda *q: live(catalog, *q), queries)),
+        "materialized": summarize(time_calls(lambda *q: materialized(catalog, *q), queries)),
+    }
+
+    for size in batches:
+        changed = changed_rows(catalog, size, rng)
+        t0 = time.perf_counter()
+        patched = catalog.patched(changed, [], version=2)
+        patch_s = time.perf_counter() - t0
+        pairs = [patched.columns.pair_code(r["origin"], r["destination"]) for r in changed]
+        t0 = time.perf_counter()
+        table.patched(patched.columns, pairs)
+        table_patch_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        RecommendationTable.build(patched.columns)
+        rebuild_s = time.perf_counter() - t0
+        for origin, destination in {(r["origin"], r["destination"]) for r in changed[:200]}:
+            assert (patched.recommend(origin, destination, ("price", "time", "comfort", "eco"), 3)
+                    == rank_by_priorities(patched.routes_between(origin, destination),
+                                          ("price", "time", "comfort", "eco"), k=3))
+        result[f"changed_{size}"] = {"catalog_patch_s": round(patch_s, 3),
+                                     "table_patch_s": round(table_patch_s, 4),
+                                     "table_rebuild_s": round(rebuild_s, 3)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200_000, 1_000_000])
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--batches", type=int, nargs="+", default=[10, 1000])
+    args = parser.parse_args()
+
+    print(json.dumps([run(n, args.cities, args.lookups, args.batches) for n in args.sizes],
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Dict-at-a-time scorer vs the columnar batch scorer at 1k, 100k and 1M options.
+
+    python -m benchmarks.bench_recommender
+"""
+import argparse
+import json
+import time
+
+from ai.batch_scorer import RouteBatch, rank_batch
+from ai.recommender import recommend_transport_options
+from benchmarks.common import generate_routes
+
+
+def legacy_recommend(options, priority="price", max_budget=None):
+    """The pre-batch implementation, kept here as the baseline."""
+    scored = []
+    for opt in options:
+        price = float(opt.get("price", 0) or 0)
+        duration = float(opt.get("duration_mins", 60) or 60)
+        seats = float(opt.get("seats_available", 1) or 1)
+        rating = float(opt.get("rating", 4.0) or 4.0)
+        if max_budget is not None and price > max_budget:
+            continue
+        if priority == "price":
+            score = 1000 / (price + 1) + rating * 5 + seats * 0.5
+        elif priority == "time":
+            score = 2000 / (duration + 1) + rating * 5
+        elif priority == "comfort":
+            score = rating * 20 + seats * 0.2
+        elif priority == "eco":
+            mode = opt.get("mode", "").lower()
+            eco_factor = 1.0
+            if mode in ["train", "bus"]:
+                eco_factor = 1.5
+            elif mode in ["flight"]:
+                eco_factor = 0.7
+            score = eco_factor * 1000 / (price + 1) + rating * 3
+        else:
+            score = rating * 10
+        new_opt = dict(opt)
+        new_opt["score"] = round(score, 3)
+        scored.append(new_opt)
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    return scored
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, round((time.perf_counter() - t0) * 1000.0, 2)
+
+
+def run(n, priority, k):
+    options = list(generate_routes(n, n_cities=500))
+
+    legacy, legacy_ms = timed(legacy_recommend, options, priority)
+    wrapped, wrapper_ms = timed(recommend_transport_options, options, priority)
+    batch, build_ms = timed(RouteBatch.from_dicts, options)
+    (order, _), score_all_ms = timed(rank_batch, batch, priority)
+    (top, _), score_topk_ms = timed(rank_batch, batch, priority, k)
+
+    assert [o["id"] for o in wrapped[:k]] == [o["id"] for o in legacy[:k]]
+    assert [batch.rows[i]["id"] for i in top] == [o["id"] for o in legacy[:k]]
+
+    return {
+        "options": n,
+        "priority": priority,
+        "legacy_ms": legacy_ms,
+        "wrapper_ms": wrapper_ms,
+        "column_build_ms": build_ms,
+        "batch_rank_all_ms": score_all_ms,
+        f"batch_top{k}_ms": score_topk_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--priorities", nargs="+", default=["price", "time", "comfort", "eco"])
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run(n, p, args.k) for n in args.sizes for p in args.priorities]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
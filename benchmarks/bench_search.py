@@ -0,0 +1,92 @@
+"""
+/search query latency before and after the normalized, indexed lookup path.
+
+    python -m benchmarks.bench_search --rows 1000000
+
+"before" runs the old `lower(origin) LIKE '%x%'` query on the plain schema;
+"after" migrates the same table with ensure_schema() and uses search_transports().
+"""
+import argparse
+import json
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports, summarize, time_calls
+from storage.queries import search_transports
+from storage.schema import TRANSPORTS_DDL, ensure_schema
+
+
+def legacy_search(db, origin, destination, mode):
+    query = "SELECT * FROM transports WHERE 1=1"
+    params = []
+    if origin:
+        query += " AND lower(origin) LIKE ?"
+        params.append(f"%{origin}%")
+    if destination:
+        query += " AND lower(destination) LIKE ?"
+        params.append(f"%{destination}%")
+    if mode:
+        query += " AND lower(mode)=?"
+        params.append(mode)
+    return db.execute(query, params).fetchall()
+
+
+def make_queries(routes, n, seed=11):
+    rng = random.Random(seed)
+    sample = rng.sample(routes, min(n, len(routes)))
+    queries = []
+    for i, r in enumerate(sample):
+        origin, destination = r["origin"].lower(), r["destination"].lower()
+        kind = i % 3
+        if kind == 0:      # full route + mode
+            queries.append((origin, destination, r["mode"]))
+        elif kind == 1:    # full route
+            queries.append((origin, destination, ""))
+        else:              # partially typed origin only
+            queries.append((origin[:-1], "", r["mode"]))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cities", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "bench.db")
+        conn.row_factory = sqlite3.Row
+        conn.execute(TRANSPORTS_DDL)
+
+        t0 = time.perf_counter()
+        routes = list(generate_routes(args.rows, args.cities))
+        seed_transports(conn, routes)
+        seed_s = time.perf_counter() - t0
+
+        queries = make_queries(routes, args.queries)
+        del routes
+
+        before = summarize(time_calls(lambda *q: legacy_search(conn, *q), queries))
+
+        t0 = time.perf_counter()
+        ensure_schema(conn)
+        migrate_s = time.perf_counter() - t0
+
+        after = summarize(time_calls(lambda *q: search_transports(conn, *q), queries))
+        conn.close()
+
+    print(json.dumps({
+        "rows": args.rows,
+        "seed_s": round(seed_s, 2),
+        "migrate_s": round(migrate_s, 2),
+        "before_like_scan": before,
+        "after_indexed": after,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
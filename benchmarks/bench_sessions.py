@@ -0,0 +1,131 @@
+"""
+Memory footprint of conversation state at N concurrent sessions: the old
+dict-per-user layout (USER_MEMORY + USER_CONTEXT with an unbounded list of
+history dicts) vs SessionState (__slots__, interned strings, bounded deque),
+plus load/save throughput of the shared SQLite backend.
+
+    python -m benchmarks.bench_sessions --sessions 100000 --turns 40
+
+Memory is the tracemalloc delta after building all sessions, so it counts
+only what the session layer allocates.
+"""
+import argparse
+import gc
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from benchmarks.common import make_cities
+from storage.session_store import HISTORY_LIMIT, MemorySessionBackend, SQLiteSessionBackend
+
+MODES = ["train", "bus", "flight", "taxi", "bike"]
+PRIORITIES = ["price", "time", "comfort"]
+
+
+def turns(rng, cities, n):
+    for _ in range(n):
+        # copies, as each request decodes its own strings from JSON
+        yield ("%s" % rng.choice(cities), "%s" % rng.choice(cities),
+               "%s" % rng.choice(MODES), "%s" % rng.choice(PRIORITIES))
+
+
+def legacy_session():
+    return {
+        "memory": {"last_query": None, "last_best_option": None, "name": None},
+        "context": {"budget": None, "last_origin": None, "last_destination": None,
+                    "preferred_mode": None, "history": []},
+    }
+
+
+def build_legacy(ids, cities, n_turns, seed=1):
+    rng = random.Random(seed)
+    sessions = {}
+    for sid in ids:
+        s = sessions[sid] = legacy_session()
+        ctx = s["context"]
+        for origin, destination, mode, priority in turns(rng, cities, n_turns):
+            ctx.update(last_origin=origin, last_destination=destination, preferred_mode=mode)
+            ctx["history"].append({"origin": origin, "destination": destination,
+                                   "mode": mode, "priority": priority})
+        s["memory"]["last_query"] = f"{origin} to {destination}"
+    return sessions
+
+
+def build_slots(ids, cities, n_turns, seed=1):
+    rng = random.Random(seed)
+    store = MemorySessionBackend(max_sessions=len(ids))
+    for sid in ids:
+        s = store.load(sid)
+        for origin, destination, mode, priority in turns(rng, cities, n_turns):
+            s.add_history(origin, destination, mode, priority)
+        s.last_query = f"{origin} to {destination}"
+    return store
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build(*args)
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = len(args[0])
+    result = {
+        "build_s": round(elapsed, 2),
+        "mb": round(current / 2**20, 1),
+        "peak_mb": round(peak / 2**20, 1),
+        "bytes_per_session": round(current / n),
+    }
+    del obj
+    gc.collect()
+    return result
+
+
+def sqlite_throughput(n_sessions, cities, ops=5000, seed=2):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SQLiteSessionBackend(Path(tmp) / "sessions.db")
+        ids = [uuid.uuid4().hex for _ in range(n_sessions)]
+        t0 = time.perf_counter()
+        for i in range(ops):
+            s = backend.load(ids[i % n_sessions])
+            origin, destination, mode, priority = next(turns(rng, cities, 1))
+            s.add_history(origin, destination, mode, priority)
+            backend.save(s)
+        elapsed = time.perf_counter() - t0
+        return {"sessions": n_sessions, "ops": ops,
+                "load_save_per_s": round(ops / elapsed, 1),
+                "rows": len(backend)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=40,
+                        help="history entries written per session")
+    parser.add_argument("--sqlite-ops", type=int, default=5000)
+    args = parser.parse_args()
+
+    cities = make_cities(2000)
+    ids = [uuid.uuid4().hex for _ in range(args.sessions)]
+    legacy = measure(build_legacy, ids, cities, args.turns)
+    slots = measure(build_slots, ids, cities, args.turns)
+
+    print(json.dumps({
+        "sessions": args.sessions,
+        "turns_per_session": args.turns,
+        "history_limit": HISTORY_LIMIT,
+        "legacy_dicts": legacy,
+        "slots_store": slots,
+        "memory_ratio": round(legacy["mb"] / slots["mb"], 2) if slots["mb"] else None,
+        "sqlite_backend": sqlite_throughput(min(args.sessions, 10_000), cities, args.sqlite_ops),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Worker boot time, each case in a fresh interpreter against a generated
+catalog:
+- lazy:  create_app() only; the first /chat pays imports and catalog build
+- cold:  create_app(warm=True) with no snapshot (built from SQLite, then saved)
+- warm:  create_app(warm=True) from the snapshot written by the cold run
+
+    python -m benchmarks.bench_startup --rows 200000
+"""
+import argparse
+import json
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports
+from storage.analytics import ensure_analytics_schema
+from storage.schema import ensure_schema
+
+CHAT = {"message": "cheapest delhi to agra"}
+
+
+def child(db_path: str, snapshot: str, warm: bool) -> None:
+    t0 = time.perf_counter()
+    import app as appmod
+    import routes.transport as transport
+    imported = time.perf_counter()
+
+    appmod.DB_PATH = transport.DB_PATH = Path(db_path)
+    appmod.app.config["CATALOG_SNAPSHOT"] = snapshot
+    app = appmod.create_app(warm=warm)
+    booted = time.perf_counter()
+
+    client = app.test_client()
+    client.post("/chat", json=CHAT)
+    first = time.perf_counter()
+    client.post("/chat", json=dict(CHAT, message="cheapest mumbai to delhi"))
+    second = time.perf_counter()
+
+    print(json.dumps({
+        "import_ms": round((imported - t0) * 1000, 1),
+        "create_app_ms": round((booted - imported) * 1000, 1),
+        "ready_ms": round((booted - t0) * 1000, 1),
+        "first_chat_ms": round((first - booted) * 1000, 1),
+        "second_chat_ms": round((second - first) * 1000, 1),
+        "boot_to_first_reply_ms": round((first - t0) * 1000, 1),
+    }))
+
+
+def run_case(db_path: Path, snapshot: Path, warm: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child",
+         str(db_path), str(snapshot), "1" if warm else "0"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3], sys.argv[4] == "1")
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        snapshot = Path(tmp) / "catalog.snapshot"
+        conn = sqlite3.connect(db_path)
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows))
+        ensure_analytics_schema(conn)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+
+        results = {
+            "lazy": run_case(db_path, snapshot, warm=False),
+            "cold": run_case(db_path, snapshot, warm=True),
+        }
+        snapshot_mb = round(snapshot.stat().st_size / 1e6, 1)
+        results["warm"] = run_case(db_path, snapshot, warm=True)
+
+    print(json.dumps({"transports": args.rows, "snapshot_mb": snapshot_mb,
+                      "cases": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
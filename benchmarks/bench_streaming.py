@@ -0,0 +1,88 @@
+"""
+Broad /search-style queries: the old fetchall + dict(row) (with extra_json)
++ one json.dumps of the whole list, vs one keyset page without extra_json,
+vs NDJSON lines streamed from the cursor.
+
+    python -m benchmarks.bench_streaming --rows 500000
+
+For each query reports time to first byte, total time and the tracemalloc
+peak while producing the response body.
+"""
+import argparse
+import json
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.common import generate_routes, seed_transports
+from storage.queries import DEFAULT_FIELDS, iter_search, search_page, search_transports
+from storage.schema import ensure_schema
+
+
+def legacy_body(conn, origin, destination, mode):
+    results = [dict(row) for row in search_transports(conn, origin, destination, mode)]
+    yield json.dumps({"count": len(results), "results": results})
+
+
+def page_body(conn, origin, destination, mode):
+    rows, next_cursor = search_page(conn, origin, destination, mode, DEFAULT_FIELDS)
+    results = [dict(row) for row in rows]
+    yield json.dumps({"count": len(results), "results": results, "next_cursor": next_cursor})
+
+
+def ndjson_body(conn, origin, destination, mode):
+    for row in iter_search(conn, origin, destination, mode, DEFAULT_FIELDS):
+        yield json.dumps(dict(row)) + "\n"
+
+
+def measure(body):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first = None
+    n_bytes = 0
+    for chunk in body:
+        if first is None:
+            first = time.perf_counter() - t0
+        n_bytes += len(chunk)
+    total = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "ttfb_ms": round((first or total) * 1000.0, 2),
+        "total_ms": round(total * 1000.0, 2),
+        "peak_mb": round(peak / 2**20, 2),
+        "body_mb": round(n_bytes / 2**20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--cities", type=int, default=2000)
+    args = parser.parse_args()
+
+    # from narrow to "everything by mode"
+    queries = {"origin_substring": ("city", "", ""), "mode_train": ("", "", "train")}
+    report = {"rows": args.rows}
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(Path(tmp) / "bench.db")
+        conn.row_factory = sqlite3.Row
+        ensure_schema(conn)
+        seed_transports(conn, generate_routes(args.rows, args.cities))
+
+        for name, (origin, destination, mode) in queries.items():
+            report[name] = {
+                "matches": len(search_transports(conn, origin, destination, mode)),
+                "legacy_full_json": measure(legacy_body(conn, origin, destination, mode)),
+                "keyset_page": measure(page_body(conn, origin, destination, mode)),
+                "ndjson_stream": measure(ndjson_body(conn, origin, destination, mode)),
+            }
+        conn.close()
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Shared helpers for the benchmark scripts: synthetic catalog generation,
+SQLite seeding and latency percentiles.
+
+Run benchmarks from the repo root, e.g. `python -m benchmarks.bench_search`.
+"""
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+import json
+import random
+import sqlite3
+import time
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+
+MODES = ["train", "flight", "bus", "taxi", "bike"]
+
+# name templates per mode, mirroring data/*.json
+_NAMES = {
+    "train": ["Shatabdi Express", "Rajdhani Express", "Duronto Express", "Intercity"],
+    "flight": ["IndiGo 6E", "Air India AI", "Vistara UK", "SpiceJet SG"],
+    "bus": ["KSRTC Airavat", "VRL Travels", "Orange Travels", "SRS Travels"],
+    "taxi": ["UberGo", "Ola Mini", "Meru Cab", "Uber Premier"],
+    "bike": ["Rapido Bike", "Uber Moto", "Ola Bike", "QuickRide Bike"],
+}
+
+# (min, max) price and duration per mode
+_RANGES = {
+    "train": ((150, 3000), (60, 1800)),
+    "flight": ((2500, 12000), (50, 240)),
+    "bus": ((300, 2500), (120, 900)),
+    "taxi": ((150, 1500), (15, 120)),
+    "bike": ((50, 400), (10, 60)),
+}
+
+
+def seed_cities() -> List[str]:
+    """City names already present in data/*.json."""
+    cities = set()
+    for path in DATA_DIR.glob("*.json"):
+        for row in json.loads(path.read_text(encoding="utf-8")):
+            cities.add(row["origin"])
+            cities.add(row["destination"])
+    return sorted(cities)
+
+
+_SYLLABLES = [
+    "ra", "ma", "na", "ka", "va", "pa", "sa", "ta", "la", "ga", "ha", "ja",
+    "ri", "mi", "ni", "ki", "vi", "pi", "si", "ti", "li", "gu", "ru", "du",
+    "ko", "lo", "mo", "no", "so", "to", "bha", "cha", "dha", "sha", "tha", "ya",
+]
+_SUFFIXES = ["pur", "nagar", "abad", "garh", "pet", "kota", "palli", "ganj", "halli", "wadi"]
+
+
+def make_cities(n: int, seed: int = 3) -> List[str]:
+    """The real city names, padded with unique Indian-sounding synthetic ones."""
+    rng = random.Random(seed)
+    cities = seed_cities()
+    seen = {c.lower() for c in cities}
+    while len(cities) < n:
+        stem = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3)))
+        name = (stem + rng.choice(_SUFFIXES)).title()
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            cities.append(name)
+    return cities[:n]
+
+
+def _hhmm(minutes: int) -> str:
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def generate_routes(n: int, n_cities: int = 2000, seed: int = 7,
+                    ondemand: bool = False) -> Iterator[Dict]:
+    """
+    Yield `n` route dicts in the same shape as data/*.json (plus `mode`).
+    With `ondemand`, taxis and bikes leave "ASAP" and arrive in "N mins",
+    as in data/taxis.json and data/bikes.json.
+    """
+    rng = random.Random(seed)
+    cities = make_cities(n_cities)
+    for i in range(n):
+        mode = MODES[i % len(MODES)]
+        origin, destination = rng.sample(cities, 2)
+        (pmin, pmax), (dmin, dmax) = _RANGES[mode]
+        duration = rng.randint(dmin, dmax)
+        dep = rng.randrange(0, 24 * 60, 5)
+        if ondemand and mode in ("taxi", "bike"):
+            departure, arrival = "ASAP", f"{duration} mins"
+        else:
+            departure, arrival = _hhmm(dep), _hhmm(dep + duration)
+        yield {
+            "id": f"{mode}_syn_{i}",
+            "mode": mode,
+            "name": f"{rng.choice(_NAMES[mode])} {rng.randint(100, 99999)}",
+            "origin": origin,
+            "destination": destination,
+            "departure": departure,
+            "arrival": arrival,
+            "duration_mins": duration,
+            "price": float(rng.randint(pmin, pmax)),
+            "seats_available": rng.randint(0, 60),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+        }
+
+
+def seed_transports(conn: sqlite3.Connection, routes, batch: int = 50_000) -> int:
+    """Bulk insert route dicts into an existing transports table."""
+    sql = """
+        INSERT INTO transports(id, mode, name, origin, destination,
+            departure, arrival, duration_mins, price,
+            seats_available, rating, extra_json)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    total = 0
+    buf = []
+    for r in routes:
+        buf.append((
+            r["id"], r["mode"], r["name"], r["origin"], r["destination"],
+            r["departure"], r["arrival"], r["duration_mins"], r["price"],
+            r["seats_available"], r["rating"], json.dumps(r),
+        ))
+        if len(buf) >= batch:
+            conn.executemany(sql, buf)
+            total += len(buf)
+            buf = []
+    if buf:
+        conn.executemany(sql, buf)
+        total += len(buf)
+    conn.commit()
+    return total
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def summarize(samples_ms: Sequence[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 3),
+        "p99_ms": round(percentile(samples_ms, 99), 3),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+def time_calls(fn, args_list) -> List[float]:
+    """Call fn(*args) for each args tuple; return latencies in ms."""
+    out = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+_CHAT_TEMPLATES = [
+    "cheapest {a} to {b}",
+    "fastest train from {a} to {b}",
+    "best flight {a} to {b}",
+    "comfortable bus {a} to {b} tomorrow",
+    "how do I get from {a} to {b}",
+    "{a} to {b}",
+]
+
+_CHAT_OTHER = [
+    "hi",
+    "hello there",
+    "what are the baggage rules for flights",
+    "safety tips for night travel",
+    "where to book bus tickets online",
+    "holiday rush advice",
+    "packing checklist",
+    "my name is asha",
+    "what is your name",
+]
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 6:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:]
+
+
+def chat_messages(n: int, cities: Sequence[str], seed: int = 5,
+                  typo_rate: float = 0.2) -> List[str]:
+    """Realistic chat corpus: mostly route questions, some with typos, plus FAQ/small talk."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        if rng.random() < 0.25:
+            out.append(rng.choice(_CHAT_OTHER))
+            continue
+        a, b = rng.sample(list(cities), 2)
+        if rng.random() < typo_rate:
+            a = _typo(a, rng)
+        out.append(rng.choice(_CHAT_TEMPLATES).format(a=a.lower(), b=b.lower()))
+    return out
+
+
+_CHAT_TIMED = [
+    "{a} to {b} after 18:00",
+    "next bus from {a} to {b}",
+    "cheapest {a} to {b} in the morning",
+    "train {a} to {b} between 6 and 10am",
+    "{a} to {b} tonight",
+]
+
+
+def popular(items: Sequence, rng: random.Random, skew: float = 1.1):
+    """Pick from `items` with Zipf-like weights: the first few take most of the traffic."""
+    weights = [1.0 / (i + 1) ** skew for i in range(len(items))]
+    return lambda: rng.choices(items, weights)[0]
+
+
+def chat_corpus(n: int, pairs: Sequence[Sequence[str]], seed: int = 5,
+                typo_rate: float = 0.1, timed_rate: float = 0.15) -> List[str]:
+    """
+    Chat traffic over city pairs that have routes: a few popular pairs get
+    most route questions, some ask for departure times or carry typos, and
+    a quarter are FAQ / small talk.
+    """
+    rng = random.Random(seed)
+    pick = popular(list(pairs), rng)
+    out = []
+    for _ in range(n):
+        if rng.random() < 0.25:
+            out.append(rng.choice(_CHAT_OTHER))
+            continue
+        a, b = pick()
+        if rng.random() < typo_rate:
+            a = _typo(a, rng)
+        templates = _CHAT_TIMED if rng.random() < timed_rate else _CHAT_TEMPLATES
+        out.append(rng.choice(templates).format(a=a.lower(), b=b.lower()))
+    return out
@@ -0,0 +1,390 @@
+"""
+Load test and regression gate for the HTTP endpoints: /search, /chat,
+/compare_websites, /book and /booking_history.
+
+A synthetic catalog in the data/*.json shapes (taxis and bikes "ASAP") is
+seeded into SQLite with a booking history, and a deterministic workload is
+drawn from it: search / compare bodies over city pairs that have routes,
+Zipf-skewed so popular pairs dominate, and a chat corpus of route, timed,
+misspelt and FAQ messages (benchmarks.common.chat_corpus).
+
+Two phases, each on its own copy of the database:
+- client: the Flask test client, in-process, one request at a time
+- server: a werkzeug WSGI server in a separate process, driven by
+          `--concurrency` client threads, per endpoint and as a weighted mix
+          (best of `--mixed-runs`)
+
+Latency percentiles, throughput and status counts are printed as JSON and
+compared with the stored baseline; a slower p50 / p99, lower throughput or
+any unexpected status is reported on stderr and exits with status 1.
+
+    python -m benchmarks.loadtest                        # run and compare
+    python -m benchmarks.loadtest --save-baseline        # record a new baseline
+    python -m benchmarks.loadtest --rows 2000000 --no-baseline
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from urllib.parse import urlencode
+
+from benchmarks.common import (
+    chat_corpus, generate_routes, percentile, popular, seed_transports, summarize,
+)
+from storage.analytics import ensure_analytics_schema
+from storage.schema import ensure_schema
+
+BASELINE = Path(__file__).resolve().parent / "baselines" / "loadtest.json"
+ENDPOINTS = ("search", "chat", "compare_websites", "book", "booking_history")
+# share of the mixed server workload per endpoint
+MIX = {"search": 0.35, "chat": 0.35, "compare_websites": 0.15, "book": 0.1,
+       "booking_history": 0.05}
+# statuses a healthy server answers with; sold-out bookings are a 409
+EXPECTED = {"book": (200, 202, 409)}
+# run settings that must match for numbers to be comparable
+CONFIG_KEYS = ("rows", "cities", "requests", "concurrency", "seed")
+
+
+class Call(NamedTuple):
+    endpoint: str
+    method: str
+    path: str
+    body: Optional[dict]
+
+
+# ------- Data and workload -------
+def build_database(path: Path, rows: int, cities: int, bookings: int, seed: int) -> None:
+    conn = sqlite3.connect(path)
+    ensure_schema(conn)
+    ensure_analytics_schema(conn)
+    seed_transports(conn, generate_routes(rows, n_cities=cities, seed=seed, ondemand=True))
+    rng = random.Random(seed)
+    sample = conn.execute("SELECT origin, destination, mode FROM transports"
+                          " WHERE rowid % 101 = 0 LIMIT 5000").fetchall()
+    conn.executemany(
+        "INSERT INTO user_history(origin, destination, mode, priority) VALUES (?, ?, ?, 'booking')",
+        (rng.choice(sample) for _ in range(bookings)),
+    )
+    conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def make_workload(db_path: Path, n: int, seed: int) -> Dict[str, List[Call]]:
+    """`n` calls per endpoint, the same for every run with the same seed."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT max(rowid) FROM transports").fetchone()[0]
+    rowids = rng.sample(range(1, total + 1), min(total, 2000))
+    sample = conn.execute(
+        f"SELECT id, origin, destination, mode, seats_available FROM transports"
+        f" WHERE rowid IN ({','.join('?' * len(rowids))})", rowids).fetchall()
+    conn.close()
+    sample.sort()
+
+    pairs = sorted({(r[1], r[2]) for r in sample})
+    rng.shuffle(pairs)
+    pick_pair = popular(pairs, rng)
+    bookable = [r[0] for r in sample if r[4] > 10]
+
+    def route_body():
+        origin, destination = pick_pair()
+        body = {"origin": origin, "destination": destination}
+        roll = rng.random()
+        if roll < 0.2:
+            body["mode"] = rng.choice(("train", "flight", "bus", "taxi", "bike"))
+        elif roll < 0.3:
+            start = rng.randrange(0, 20) * 60
+            body.update(depart_from=f"{start // 60:02d}:00", depart_to=f"{start // 60 + 4:02d}:00")
+        return body
+
+    def history_path():
+        return "/booking_history?" + urlencode({"limit": rng.choice((10, 20, 50))})
+
+    return {
+        "search": [Call("search", "POST", "/search", route_body()) for _ in range(n)],
+        "chat": [Call("chat", "POST", "/chat", {"message": m})
+                 for m in chat_corpus(n, pairs, seed=seed)],
+        "compare_websites": [Call("compare_websites", "POST", "/compare_websites", route_body())
+                             for _ in range(n)],
+        "book": [Call("book", "POST", "/book", {"id": rng.choice(bookable), "seats": 1})
+                 for _ in range(n)],
+        "booking_history": [Call("booking_history", "GET", history_path(), None)
+                            for _ in range(n)],
+    }
+
+
+def mixed(workload: Dict[str, List[Call]], n: int, seed: int) -> List[Call]:
+    rng = random.Random(seed)
+    names = list(MIX)
+    picks = rng.choices(names, [MIX[name] for name in names], k=n)
+    cursors = dict.fromkeys(names, 0)
+    out = []
+    for name in picks:
+        calls = workload[name]
+        out.append(calls[cursors[name] % len(calls)])
+        cursors[name] += 1
+    return out
+
+
+# ------- Measurement -------
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+
+    def add(self, call: Call, ms: float, status: int) -> None:
+        with self.lock:
+            self.latencies.append(ms)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.errors += status not in EXPECTED.get(call.endpoint, (200,))
+
+    def result(self, seconds: float) -> Dict:
+        stats = summarize(self.latencies)
+        stats.update(
+            p90_ms=round(percentile(self.latencies, 90), 3),
+            max_ms=round(max(self.latencies, default=0.0), 3),
+            rps=round(len(self.latencies) / seconds, 1) if seconds else 0.0,
+            statuses={str(k): v for k, v in sorted(self.statuses.items())},
+            errors=self.errors,
+        )
+        return stats
+
+
+def run_client(app, workload: Dict[str, List[Call]], warmup: int) -> Dict[str, Dict]:
+    """Each endpoint's calls one after another through the Flask test client."""
+    from storage.response_cache import response_cache
+
+    client = app.test_client()
+    results = {}
+    for endpoint in ENDPOINTS:
+        calls = workload[endpoint]
+        for call in calls[:warmup]:
+            client.open(call.path, method=call.method, json=call.body)
+        recorder = Recorder()
+        t0 = time.perf_counter()
+        for call in calls:
+            start = time.perf_counter()
+            resp = client.open(call.path, method=call.method, json=call.body)
+            resp.get_data()
+            recorder.add(call, (time.perf_counter() - start) * 1000.0, resp.status_code)
+        results[endpoint] = recorder.result(time.perf_counter() - t0)
+    results["cache"] = response_cache.stats()
+    return results
+
+
+def _request(port: int, call: Call):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        body = json.dumps(call.body) if call.body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(call.method, call.path, body=body, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        return resp.status, data
+    finally:
+        conn.close()
+
+
+def drive(port: int, calls: Sequence[Call], concurrency: int) -> Dict:
+    """Send `calls` from `concurrency` threads as fast as the server answers."""
+    recorder = Recorder()
+    queue = iter(calls)
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                call = next(queue, None)
+            if call is None:
+                return
+            start = time.perf_counter()
+            try:
+                status, _ = _request(port, call)
+            except OSError:
+                status = 599
+            recorder.add(call, (time.perf_counter() - start) * 1000.0, status)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.result(time.perf_counter() - t0)
+
+
+def serve(db_path: str, snapshot: str, ready) -> None:
+    """Server process: the app, warmed up as in production, on a free port."""
+    import logging
+
+    from werkzeug.serving import make_server
+
+    import app as appmod
+    import routes.transport as transport
+
+    appmod.DB_PATH = transport.DB_PATH = Path(db_path)
+    appmod.app.config["CATALOG_SNAPSHOT"] = snapshot
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # no line per request
+    server = make_server("127.0.0.1", 0, appmod.create_app(warm=True), threaded=True)
+    ready.send(server.server_port)
+    server.serve_forever()
+
+
+def run_server(db_path: Path, workload: Dict[str, List[Call]], args) -> Dict[str, Dict]:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=serve, args=(str(db_path), str(db_path) + ".snapshot", child),
+                       daemon=True)
+    proc.start()
+    try:
+        if not parent.poll(600):
+            raise RuntimeError("load test server did not start")
+        port = parent.recv()
+        results = {}
+        for endpoint in ENDPOINTS:
+            calls = workload[endpoint]
+            drive(port, calls[:args.warmup], args.concurrency)
+            results[endpoint] = drive(port, calls, args.concurrency)
+        # how the slow full-scan searches overlap decides a mixed run's
+        # throughput, so the fastest of several runs is kept
+        calls = mixed(workload, args.requests * 2, args.seed)
+        results["mixed"] = max((drive(port, calls, args.concurrency)
+                                for _ in range(args.mixed_runs)), key=lambda r: r["rps"])
+        results["cache"] = json.loads(_request(port, Call("", "GET", "/cache_stats", None))[1])
+        return results
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+# ------- Baseline -------
+def compare(report: Dict, baseline: Dict, args) -> List[str]:
+    """Human-readable regressions of `report` against `baseline`; empty when it holds."""
+    problems = []
+    for key in CONFIG_KEYS:
+        if report["config"][key] != baseline["config"].get(key):
+            problems.append(f"config {key}={report['config'][key]} but the baseline used "
+                            f"{baseline['config'].get(key)}; rerun with the same settings "
+                            f"or record a new baseline")
+    if problems:
+        return problems
+
+    for phase, results in report["results"].items():
+        for endpoint, now in results.items():
+            if endpoint == "cache":
+                continue
+            name = f"{phase}/{endpoint}"
+            if now["errors"]:
+                problems.append(f"{name}: {now['errors']} unexpected responses {now['statuses']}")
+            then = baseline["results"].get(phase, {}).get(endpoint)
+            if then is None:
+                continue
+            for metric, tolerance in (("p50_ms", args.tolerance), ("p99_ms", args.tail_tolerance)):
+                limit = max(then[metric] * (1 + tolerance), then[metric] + args.min_ms)
+                if now[metric] > limit:
+                    problems.append(f"{name}: {metric} {now[metric]} > {round(limit, 3)} "
+                                    f"(baseline {then[metric]})")
+            floor = then["rps"] / (1 + args.tolerance)
+            if now["rps"] < floor:
+                problems.append(f"{name}: rps {now['rps']} < {round(floor, 1)} "
+                                f"(baseline {then['rps']})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--bookings", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=300, help="measured calls per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--mixed-runs", type=int, default=3,
+                        help="server mixed workload runs; the fastest is reported")
+    parser.add_argument("--phases", nargs="+", choices=("client", "server"),
+                        default=["client", "server"])
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--no-baseline", action="store_true")
+    # run-to-run noise of the threaded server phase on a small box is ~40%
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed p50 slowdown and throughput drop (0.5 = 50%%)")
+    parser.add_argument("--tail-tolerance", type=float, default=1.0, help="allowed p99 slowdown")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="latency growth always tolerated, for sub-millisecond endpoints")
+    parser.add_argument("--output", type=Path, help="also write the report to this file")
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in CONFIG_KEYS}
+    config.update(bookings=args.bookings, warmup=args.warmup, phases=args.phases,
+                  mixed_runs=args.mixed_runs)
+    report = {
+        "config": config,
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": multiprocessing.cpu_count(), "sqlite": sqlite3.sqlite_version},
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = Path(tmp) / "seed.db"
+        t0 = time.perf_counter()
+        build_database(seeded, args.rows, args.cities, args.bookings, args.seed)
+        report["seed_s"] = round(time.perf_counter() - t0, 1)
+        workload = make_workload(seeded, args.requests, args.seed)
+
+        if "client" in args.phases:
+            import app as appmod
+            import routes.transport as transport
+
+            db_path = Path(tmp) / "client.db"
+            shutil.copy(seeded, db_path)
+            appmod.DB_PATH = transport.DB_PATH = db_path
+            appmod.app.config["CATALOG_SNAPSHOT"] = str(db_path) + ".snapshot"
+            app = appmod.create_app(warm=True)
+            report["results"]["client"] = run_client(app, workload, args.warmup)
+        if "server" in args.phases:
+            db_path = Path(tmp) / "server.db"
+            shutil.copy(seeded, db_path)
+            report["results"]["server"] = run_server(db_path, workload, args)
+
+    problems = []
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+    elif not args.no_baseline:
+        if args.baseline.exists():
+            problems = compare(report, json.loads(args.baseline.read_text()), args)
+        else:
+            problems = [f"no baseline at {args.baseline}; record one with --save-baseline"]
+    report["regressions"] = problems
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        args.output.write_text(text + "\n")
+    if problems:
+        print(f"\nLOAD TEST REGRESSION ({len(problems)}):", file=sys.stderr)
+        for problem in problems:
+            print("  " + problem, file=sys.stderr)
+        sys.exit(1)
+    if not args.save_baseline and not args.no_baseline:
+        print(f"load test within baseline {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
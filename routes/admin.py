@@ -0,0 +1,86 @@
+from flask import Blueprint, request, jsonify
+import sqlite3
+import time
+
+from routes.transport import DB_PATH, get_db, get_pool
+from storage.catalog_admin import MAX_BATCH, BatchError, apply_batch, batch_size, batch_stats, parse_batch
+from storage.inventory import get_inventory
+
+bp = Blueprint("admin", __name__, url_prefix="")
+
+
+def _apply(batch):
+    """
+    Write one batch, then bring this worker's derived state up to date:
+    the shared catalog is patched from the change log (city vocabulary,
+    route indexes, planner) and inventory counters of touched ids reread.
+    """
+    from ai.catalog import get_catalog
+
+    report = apply_batch(get_pool(), batch["add"], batch["update"], batch["delete"])
+    t0 = time.perf_counter()
+    get_catalog(get_db())
+    touched = [r["id"] for r in batch["update"]] + batch["delete"]
+    if touched:
+        get_inventory(DB_PATH).refresh(touched)
+    report["index_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return report
+
+
+def _write_failed(exc):
+    """The batch was rolled back; report it the way the other endpoints do."""
+    return jsonify({"status": "error", "error": f"Catalog write failed: {exc}"}), 503
+
+
+# ------- CATALOG EDITS -------
+@bp.route("/admin/add_route", methods=["POST"])
+def add_route():
+    """Add one route. Body: a transport object; a blank id is generated."""
+    data = request.get_json(force=True, silent=True)
+    try:
+        batch = parse_batch({"add": [data]})
+    except BatchError as exc:
+        return jsonify({"status": "error", "error": str(exc).split(": ", 1)[-1]}), 400
+
+    try:
+        report = _apply(batch)
+    except sqlite3.Error as exc:
+        return _write_failed(exc)
+    if report["conflicts"]:
+        return jsonify({"status": "error",
+                        "error": f"Route id already exists: {report['conflicts'][0]}"}), 409
+    return jsonify({"status": "ok", "id": report["added_ids"][0],
+                    "apply_ms": report["apply_ms"], "index_ms": report["index_ms"]})
+
+
+@bp.route("/admin/routes/batch", methods=["POST"])
+def routes_batch():
+    """
+    Bulk catalog edit in one transaction.
+    Body: {"add": [transport, ...], "update": [{"id": ..., field: value}, ...],
+           "delete": [id, ...]}; at most MAX_BATCH rows in total.
+    Added ids that already exist are skipped and listed in "conflicts".
+    Returns counts, ids not found, apply_ms (write) and index_ms (in-memory update).
+    """
+    data = request.get_json(force=True, silent=True)
+    try:
+        batch = parse_batch(data)
+    except BatchError as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+    if batch_size(batch) > MAX_BATCH:
+        return jsonify({"status": "error",
+                        "error": f"Batch too large: max {MAX_BATCH} rows per request"}), 413
+
+    try:
+        report = _apply(batch)
+    except sqlite3.Error as exc:
+        return _write_failed(exc)
+    report.pop("code", None)
+    report.pop("added_ids", None)
+    return jsonify(report)
+
+
+@bp.route("/admin/routes/stats", methods=["GET"])
+def routes_stats():
+    """Apply latency of the recent admin batches."""
+    return jsonify(batch_stats())
@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify
+
+from routes.transport import get_db
+from storage.analytics import booking_summary, distributions, mode_counts
+from storage.queries import decode_cursor, encode_cursor, page_size
+
+bp = Blueprint("analytics", __name__, url_prefix="")
+
+
+# ------- DASHBOARD ROLLUPS -------
+@bp.route("/analytics/transports", methods=["GET"])
+def analytics_transports():
+    """
+    Routes per mode plus price / duration distributions, read from the
+    precomputed rollups (storage/analytics.py).
+    """
+    db = get_db()
+    return jsonify({"counts": mode_counts(db), **distributions(db)})
+
+
+@bp.route("/analytics/bookings", methods=["GET"])
+def analytics_bookings():
+    """Bookings per mode, most booked routes and popular routes by hour (UTC)."""
+    try:
+        limit = page_size(request.args.get("limit"), default=10)
+        per_hour = page_size(request.args.get("per_hour"), default=3)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+    return jsonify(booking_summary(get_db(), limit, per_hour))
+
+
+# ------- ADMIN HISTORY -------
+@bp.route("/admin/history", methods=["GET"])
+def admin_history():
+    """
+    Every user_history row (searches and bookings), newest first.
+    Query args: limit (default 50), cursor (from next_cursor).
+    """
+    try:
+        limit = page_size(request.args.get("limit"), default=50)
+        cursor = request.args.get("cursor")
+        before = decode_cursor(cursor, 1)[0] if cursor else 2**63 - 1
+        if not isinstance(before, int):
+            raise ValueError("invalid cursor")
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    rows = get_db().execute(
+        """
+        SELECT id, origin, destination, mode, priority, timestamp
+        FROM user_history
+        WHERE id < ?
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (before, limit + 1),
+    ).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    history = [dict(r) for r in rows[:limit]]
+
+    return jsonify({"count": len(history), "history": history, "next_cursor": next_cursor})
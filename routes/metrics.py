@@ -0,0 +1,94 @@
+from flask import Blueprint, Response, current_app, g, jsonify, request
+import time
+
+from storage import metrics
+from storage.profiler import SamplingProfiler, get_profile, profiles, store_profile
+
+bp = Blueprint("metrics", __name__, url_prefix="")
+
+
+# ------- REQUEST HOOKS -------
+def _wants_profile() -> bool:
+    return bool(current_app.config.get("PROFILING_ENABLED")) and (
+        request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1")
+
+
+@bp.before_app_request
+def start_request():
+    g._request_t0 = time.perf_counter()
+    metrics.begin_trace()
+    if _wants_profile():
+        interval = float(current_app.config.get("PROFILE_INTERVAL", 0.001))
+        g._profiler = SamplingProfiler(interval=interval).start()
+
+
+@bp.after_app_request
+def finish_request(response):
+    """
+    Records the request latency and adds a Server-Timing header with the
+    stage breakdown. Streamed bodies are timed up to the first byte.
+    """
+    t0 = g.pop("_request_t0", None)
+    trace = metrics.end_trace()
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers["X-Profile-Id"] = store_profile(profiler)
+    if t0 is None or not metrics.is_enabled():
+        return response
+
+    elapsed = time.perf_counter() - t0
+    metrics.REQUEST_SECONDS.labels(
+        request.endpoint or "unmatched", request.method, str(response.status_code)
+    ).observe(elapsed)
+    response.headers["Server-Timing"] = metrics.server_timing(trace, elapsed)
+    return response
+
+
+@bp.teardown_app_request
+def close_request(exception=None):
+    """
+    Runs even when the view raised and finish_request was skipped: a
+    profiler still sampling is stopped (its profile is kept, listed in
+    /debug/profiles) and the stage trace is closed.
+    """
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        profiler.stop()
+        store_profile(profiler)
+    metrics.end_trace()
+
+
+def _profiling_disabled():
+    if current_app.config.get("PROFILING_ENABLED"):
+        return None
+    return jsonify({"status": "error", "error": "Profiling is disabled"}), 404
+
+
+# ------- EXPORT -------
+@bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request, stage and SQLite latency histograms in Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/debug/profiles", methods=["GET"])
+def list_profiles():
+    """Ids of the stored request profiles with their sample counts."""
+    return _profiling_disabled() or jsonify(profiles())
+
+
+@bp.route("/debug/profile/<profile_id>", methods=["GET"])
+def request_profile(profile_id):
+    """
+    Collapsed stacks of one profiled request (flamegraph.pl / speedscope).
+    Profile a request by sending it with ?profile=1 or `X-Profile: 1` while
+    PROFILING_ENABLED is set; its id comes back in X-Profile-Id.
+    """
+    disabled = _profiling_disabled()
+    if disabled:
+        return disabled
+    text = get_profile(profile_id)
+    if text is None:
+        return jsonify({"status": "error", "error": "Profile not found"}), 404
+    return Response(text, mimetype="text/plain")
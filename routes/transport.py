@@ -1,7 +1,20 @@
-from flask import Blueprint, request, jsonify, g
-import sqlite3
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
 from pathlib import Path
 import json
+import time
+import uuid
+
+from storage import pool as storage_pool
+from storage.booking_queue import BookingQueueFull, get_booking_writer
+from storage.inventory import get_inventory
+from storage.metrics import stage
+from storage.queries import (
+    DEFAULT_FIELDS, decode_cursor, encode_cursor, fetch_extra, iter_search, normalize,
+    page_size, parse_minutes, project_fields, search_page, time_window,
+)
+from storage.response_cache import response_cache
+from storage.schema import catalog_version, minutes_of_day
+from storage.session_store import get_session_store
 
 bp = Blueprint("transport", __name__, url_prefix="")
 
@@ -11,10 +24,13 @@ KB_DIR = BASE_DIR / "knowledge_base"
 
 
 # ------- DB Helpers -------
+def get_pool():
+    return storage_pool.get_pool(DB_PATH)
+
+
 def get_db():
     if "_database" not in g:
-        g._database = sqlite3.connect(DB_PATH)
-        g._database.row_factory = sqlite3.Row
+        g._database = get_pool().acquire()
     return g._database
 
 
@@ -22,105 +38,353 @@ def get_db():
 def close_connection(exception):
     db = g.pop("_database", None)
     if db is not None:
-        db.close()
+        get_pool().release(db)
+
+
+# ------- Paging / streaming helpers -------
+def wants_ndjson(params) -> bool:
+    return (params.get("format") == "ndjson"
+            or "application/x-ndjson" in request.headers.get("Accept", ""))
+
+
+def ndjson_response(items):
+    """One JSON object per line, written as the rows come off the cursor."""
+    lines = (json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+    return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def request_window(data):
+    """TimeWindow from depart_from / depart_to ("HH:MM") in a request body, or None."""
+    return time_window(data.get("depart_from"), data.get("depart_to"),
+                       data.get("include_ondemand", True))
 
 
 # ------- SEARCH ROUTE -------
 @bp.route("/search", methods=["POST"])
 def search():
+    """
+    Body: {"origin", "destination", "mode", "limit", "cursor", "fields",
+    "include_extra", "format": "json" | "ndjson",
+    "depart_from", "depart_to": "HH:MM", "include_ondemand": true}.
+    JSON responses are pages ordered by id with a `next_cursor`; NDJSON
+    streams every match after `cursor` (or `limit` of them). A departure
+    window past midnight (22:00 to 02:00) wraps; on-demand taxis and bikes
+    match any window unless include_ondemand is false.
+    """
     data = request.get_json(force=True)
-    origin = data.get("origin", "").strip().lower()
-    destination = data.get("destination", "").strip().lower()
-    mode = data.get("mode", "").strip().lower()
+    origin = data.get("origin", "")
+    destination = data.get("destination", "")
+    mode = data.get("mode", "")
 
     db = get_db()
-    query = "SELECT * FROM transports WHERE 1=1"
-    params = []
+    try:
+        columns = project_fields(data.get("fields"), bool(data.get("include_extra")))
+        limit = page_size(data.get("limit"))
+        cursor = data.get("cursor") or None
+        window = request_window(data)
+        if wants_ndjson(data):
+            rows = iter_search(db, origin, destination, mode, columns, cursor,
+                               limit if data.get("limit") else None, window)
+            return ndjson_response(dict(row) for row in rows)
+
+        # identical normalized pages are served from the cache until the catalog changes
+        key = ("search", normalize(origin), normalize(destination), normalize(mode),
+               columns, cursor, limit, window)
+        version = catalog_version(db)
+        page = response_cache.get(key, version)
+        if page is None:
+            rows, next_cursor = search_page(db, origin, destination, mode, columns, cursor, limit,
+                                            window)
+            page = {"results": [dict(row) for row in rows], "next_cursor": next_cursor}
+            response_cache.put(key, version, page, size=max(len(rows), 1))
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    return jsonify({"count": len(page["results"]), **page})
 
-    if origin:
-        query += " AND lower(origin) LIKE ?"
-        params.append(f"%{origin}%")
 
-    if destination:
-        query += " AND lower(destination) LIKE ?"
-        params.append(f"%{destination}%")
-
-    if mode:
-        query += " AND lower(mode)=?"
-        params.append(mode)
+# ------- CHATBOT ROUTE -------
+SESSION_COOKIE = "session_id"
 
-    result = db.execute(query, params).fetchall()
-    results = [dict(row) for row in result]
 
-    return jsonify({"count": len(results), "results": results})
+def get_sessions():
+    # "memory" keeps sessions per process; "sqlite" shares them across workers
+    return get_session_store(DB_PATH, current_app.config.get("SESSION_BACKEND", "memory"))
 
 
-# ------- CHATBOT ROUTE -------
 @bp.route("/chat", methods=["POST"])
 def chat():
     from ai.agent_engine import respond_intelligently
-    from ai.recommender import recommend_transport_options
+    from ai.catalog import get_catalog
 
-    message = request.json.get("message", "")
+    data = request.get_json(force=True)
+    message = data.get("message", "")
+    session_id = (data.get("session_id") or request.headers.get("X-Session-Id")
+                  or request.cookies.get(SESSION_COOKIE))
+    new_session = not session_id
+    if new_session:
+        session_id = uuid.uuid4().hex
+
+    sessions = get_sessions()
+    with stage("session_load"):
+        session = sessions.load(str(session_id))
+    with stage("catalog"):
+        catalog = get_catalog(get_db())
+    with stage("respond"):
+        reply = respond_intelligently(message, catalog, KB_DIR, cache=response_cache, session=session)
+    with stage("session_save"):
+        sessions.save(session)
+
+    with stage("serialize"):
+        resp = jsonify({"reply": reply, "session_id": session.session_id})
+    if new_session:
+        resp.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return resp
+
+
+# ------- BATCH CHAT -------
+MAX_CHAT_BATCH = 5000
+
+
+@bp.route("/chat/batch", methods=["POST"])
+def chat_batch():
+    """
+    Replay many chat messages (FAQ regressions, offline evaluation) against
+    one catalog snapshot, fanned out over the batch thread pool.
+    Body: {"messages": [str, ...], "workers": n}
+    Items are answered independently (no session state) and returned in
+    order as {"reply", "ms"} or {"error", "ms"}.
+    """
+    from ai.agent_engine import BATCH_MAX_WORKERS, respond_batch
+    from ai.catalog import get_catalog
 
-    db = get_db()
-    rows = db.execute("SELECT * FROM transports").fetchall()
-    all_transports = [dict(r) for r in rows]
+    data = request.get_json(force=True)
+    messages = data.get("messages")
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({"status": "error", "error": "messages must be a list of strings"}), 400
+    if len(messages) > MAX_CHAT_BATCH:
+        return jsonify({"status": "error",
+                        "error": f"Batch too large: max {MAX_CHAT_BATCH} messages per request"}), 413
+    try:
+        workers = min(max(int(data.get("workers") or BATCH_MAX_WORKERS), 1), BATCH_MAX_WORKERS)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    t0 = time.perf_counter()
+    with stage("catalog"):
+        catalog = get_catalog(get_db())
+    with stage("respond_batch"):
+        results = respond_batch(messages, catalog, KB_DIR, cache=response_cache, workers=workers)
+
+    with stage("serialize"):
+        return jsonify({
+            "count": len(results),
+            "results": results,
+            "workers": workers,
+            "total_ms": round((time.perf_counter() - t0) * 1000, 3),
+        })
 
-    reply = respond_intelligently(message, all_transports, KB_DIR)
 
-    return jsonify({"reply": reply})
+@bp.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """Hit/miss/eviction counters of the /search and /chat response cache."""
+    return jsonify(response_cache.stats())
 
 
 # ------- WEBSITE PRICE COMPARISON ROUTE -------
+# columns the highlight / Pareto ranking reads
+RANKING_FIELDS = ("id", "mode", "price", "duration_mins", "seats_available", "rating")
+OFFER_CHUNK = 256
+
+
+def _with_offers(routes, mode):
+    from ai.offer_engine import simulate_offers_batch
+
+    for r in routes:
+        r["mode"] = r.get("mode", mode)
+    # one vectorized pass for every route; offers come back sorted
+    with stage("offers"):
+        return [
+            {"transport": r, "offers": offers, "best_offer": offers[0] if offers else {}}
+            for r, offers in zip(routes, simulate_offers_batch(routes))
+        ]
+
+
+def _highlights(db, origin, destination, mode, window):
+    """
+    (best id per priority, Pareto ids) over every match, from one ranking
+    pass over the slim columns. Computed once per query and catalog
+    version, so paging through a broad query does not rescan it per page.
+    """
+    from ai.recommender import rank_by_priorities, price_duration_frontier
+
+    key = ("compare_highlights", normalize(origin), normalize(destination), normalize(mode),
+           window)
+    version = catalog_version(db)
+    cached = response_cache.get(key, version)
+    if cached is not None:
+        return cached
+
+    with stage("ranking_fetch"):
+        ranking = [dict(r) for r in iter_search(db, origin, destination, mode, RANKING_FIELDS,
+                                                window=window)]
+    highlights = {}
+    if ranking:
+        ranked = rank_by_priorities(ranking, ("price", "time", "comfort"), k=1)
+        highlights = {p: recs[0]["id"] for p, recs in ranked.items()}
+    pareto_ids = [r["id"] for r in price_duration_frontier(ranking)]
+    response_cache.put(key, version, (highlights, pareto_ids), size=max(len(pareto_ids), 1))
+    return highlights, pareto_ids
+
+
 @bp.route("/compare_websites", methods=["POST"])
 def compare_websites():
-    from ai.recommender import WEBSITE_PROVIDERS, simulate_website_offers, best_website_offer
-
+    """
+    Same paging, projection and NDJSON options as /search. Highlights and
+    the Pareto ids cover every match (JSON mode only) and are ranked once
+    per query, not per page; offers are simulated for the returned page,
+    or chunk by chunk while streaming.
+    """
     data = request.get_json(force=True)
     origin = data.get("origin", "").lower()
     destination = data.get("destination", "").lower()
     mode = data.get("mode", "").lower()
 
     db = get_db()
-    q = "SELECT * FROM transports WHERE 1=1"
-    params = []
+    try:
+        columns = project_fields(data.get("fields"), bool(data.get("include_extra")))
+        limit = page_size(data.get("limit"))
+        cursor = data.get("cursor") or None
+        window = request_window(data)
+        if wants_ndjson(data):
+            rows = iter_search(db, origin, destination, mode, columns, cursor,
+                               limit if data.get("limit") else None, window)
+            return ndjson_response(
+                match for chunk in _chunks(rows, OFFER_CHUNK)
+                for match in _with_offers([dict(r) for r in chunk], mode)
+            )
+        with stage("db_fetch"):
+            rows, next_cursor = search_page(db, origin, destination, mode, columns, cursor, limit,
+                                            window)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    with stage("dict_convert"):
+        page = [dict(r) for r in rows]
+    results = _with_offers(page, mode)
+    highlights, pareto_ids = _highlights(db, origin, destination, mode, window)
+
+    with stage("serialize"):
+        return jsonify({
+            "count": len(results),
+            "matches": results,
+            "next_cursor": next_cursor,
+            "highlights": highlights,
+            "pareto_ids": pareto_ids,
+        })
 
-    if origin:
-        q += " AND lower(origin) LIKE ?"
-        params.append(f"%{origin}%")
 
-    if destination:
-        q += " AND lower(destination) LIKE ?"
-        params.append(f"%{destination}%")
+# ------- MULTI-LEG JOURNEY PLANNER -------
+@bp.route("/journey", methods=["POST"])
+def journey():
+    """
+    Connecting itineraries between two cities.
+    Body: {"origin", "destination", "depart_after": "HH:MM",
+           "objective": "earliest" | "cheapest" | "fewest_transfers", "k": 3, "max_legs": 4}
+    """
+    from ai.catalog import get_catalog
 
-    if mode:
-        q += " AND lower(mode)=?"
-        params.append(mode)
+    data = request.get_json(force=True)
+    catalog = get_catalog(get_db())
+    try:
+        journeys = catalog.timetable.plan(
+            data.get("origin", ""),
+            data.get("destination", ""),
+            depart_after=data.get("depart_after", "00:00"),
+            objective=data.get("objective", "earliest"),
+            k=int(data.get("k", 3)),
+            max_legs=int(data.get("max_legs", 4)),
+        )
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
 
-    cur = db.execute(q, params).fetchall()
-    routes = [dict(r) for r in cur]
+    return jsonify({"count": len(journeys), "journeys": journeys})
 
-    results = []
-    for r in routes:
-        r["mode"] = r.get("mode", mode)
-        offers = simulate_website_offers(r)
-        best = best_website_offer(offers)
 
-        results.append({
-            "transport": r,
-            "offers": offers,
-            "best_offer": best
-        })
+# ------- DEPARTURES BY TIME -------
+DEFAULT_NEXT_DEPARTURES = 5
+
+
+@bp.route("/departures", methods=["POST"])
+def departures():
+    """
+    Departures between two cities in departure order, from the catalog's
+    per-pair sorted time index (two bisects, no table scan).
+    Body: {"origin", "destination", "mode", and either
+           "depart_from", "depart_to": "HH:MM", "include_ondemand": true   (a window)
+        or "after": "HH:MM" | "now", "n": 5, "include_ondemand": true     (the next n),
+           "include_extra": false}
+    Without a window the next departures after now (server time) are returned;
+    on-demand taxis and bikes leave right away, so they come first. The
+    catalog holds no extra_json; it is read from SQLite for the returned rows.
+    """
+    from ai.catalog import get_catalog
+    from ai.time_window import now_minute
 
-    return jsonify({"count": len(results), "matches": results})
+    data = request.get_json(force=True)
+    origin = data.get("origin", "")
+    destination = data.get("destination", "")
+    mode = data.get("mode") or None
+    catalog = get_catalog(get_db())
+    try:
+        window = request_window(data)
+        if window is not None:
+            rows = catalog.departures_between(origin, destination, window, mode)
+            body = {"depart_from": window.start, "depart_to": window.end}
+        else:
+            after = data.get("after", "now")
+            after = now_minute() if after == "now" else parse_minutes(after, "after")
+            n = page_size(data.get("n"), default=DEFAULT_NEXT_DEPARTURES)
+            rows = catalog.next_departures(origin, destination, after, n, mode,
+                                           bool(data.get("include_ondemand", True)))
+            body = {"after": after}
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    results = [dict({f: r.get(f) for f in DEFAULT_FIELDS},
+                    departure_min=minutes_of_day(r.get("departure"))) for r in rows]
+    if data.get("include_extra"):
+        extra = fetch_extra(get_db(), [r["id"] for r in results])
+        for r in results:
+            r["extra_json"] = extra.get(r["id"])
+    return jsonify({"count": len(results), **body, "departures": results})
 
 # ------- BOOKING: LOG A BOOKING -------
 
+def _result_response(result):
+    result = dict(result)
+    code = result.pop("code", 200)
+    return jsonify(result), code
+
+
 @bp.route("/book", methods=["POST"])
 def book():
     """
-    Log a booking into user_history based on a chosen transport id.
+    Book seats on a transport and log it into user_history.
+    Body: {"id": ..., "seats": 1, "durability": "commit" | "async"}
+    Seats are held in the inventory (storage/inventory.py), then written
+    through the group-commit booking queue (storage/booking_queue.py).
     """
     data = request.get_json(force=True)
     transport_id = data.get("id")
@@ -128,52 +392,117 @@ def book():
     if not transport_id:
         return jsonify({"status": "error", "error": "Missing id"}), 400
 
-    db = get_db()
-    row = db.execute(
-        "SELECT origin, destination, mode FROM transports WHERE id=?",
-        (transport_id,),
-    ).fetchone()
+    durability = data.get("durability") or current_app.config.get("BOOKING_DURABILITY", "commit")
+    try:
+        seats = int(data.get("seats", 1) or 1)
+        result = get_inventory(DB_PATH).book(transport_id, seats, durability)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+    except BookingQueueFull:
+        return jsonify({"status": "error", "error": "Too many bookings, retry shortly"}), 503
+
+    return _result_response(result)
+
+
+@bp.route("/hold", methods=["POST"])
+def hold_seats():
+    """
+    Hold seats while the user checks out.
+    Body: {"id": ..., "seats": 1, "ttl": seconds}; confirm or release the returned hold_id.
+    """
+    data = request.get_json(force=True)
+    transport_id = data.get("id")
+
+    if not transport_id:
+        return jsonify({"status": "error", "error": "Missing id"}), 400
+
+    try:
+        seats = int(data.get("seats", 1) or 1)
+        ttl = float(data["ttl"]) if data.get("ttl") else None
+        result = get_inventory(DB_PATH).hold(transport_id, seats, ttl)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    return _result_response(result)
+
 
-    if not row:
+@bp.route("/hold/<hold_id>/confirm", methods=["POST"])
+def confirm_hold(hold_id):
+    """Book the held seats. Body (optional): {"durability": "commit" | "async"}"""
+    data = request.get_json(force=True, silent=True) or {}
+    durability = data.get("durability") or current_app.config.get("BOOKING_DURABILITY", "commit")
+    try:
+        result = get_inventory(DB_PATH).confirm(hold_id, durability)
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+    except BookingQueueFull:
+        return jsonify({"status": "error", "error": "Too many bookings, retry shortly"}), 503
+
+    return _result_response(result)
+
+
+@bp.route("/hold/<hold_id>", methods=["DELETE"])
+def release_hold(hold_id):
+    return _result_response(get_inventory(DB_PATH).release(hold_id))
+
+
+@bp.route("/inventory/<transport_id>", methods=["GET"])
+def inventory(transport_id):
+    """Unsold, held and free seats of one transport."""
+    seats = get_inventory(DB_PATH).availability(transport_id)
+    if seats is None:
         return jsonify({"status": "error", "error": "Transport not found"}), 404
+    return jsonify(seats)
 
-    # priority='booking' to differentiate from search history if you ever log that
-    db.execute(
-        "INSERT INTO user_history(origin, destination, mode, priority) VALUES (?, ?, ?, ?)",
-        (row["origin"], row["destination"], row["mode"], "booking"),
-    )
-    db.commit()
 
-    return jsonify({"status": "ok"})
+@bp.route("/booking_stats", methods=["GET"])
+def booking_stats():
+    """Queue depth and group-commit latency of the booking writer, plus inventory counters."""
+    return jsonify({**get_booking_writer(DB_PATH).metrics(),
+                    "inventory": get_inventory(DB_PATH).metrics()})
 
 
 # ------- BOOKING HISTORY -------
+BOOKING_HISTORY_SQL = """
+    SELECT id, origin, destination, mode, timestamp
+    FROM user_history
+    WHERE priority='booking' AND id < ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+
+def _history_entry(r):
+    return {
+        "origin": r["origin"],
+        "destination": r["destination"],
+        "mode": r["mode"],
+        "timestamp": r["timestamp"],
+    }
+
 
 @bp.route("/booking_history", methods=["GET"])
 def booking_history():
     """
-    Return last few bookings from user_history.
+    Return bookings from user_history, newest first.
+    Query args: limit (default 20), cursor (from next_cursor), format=ndjson.
     """
     db = get_db()
-    rows = db.execute(
-        """
-        SELECT origin, destination, mode, timestamp
-        FROM user_history
-        WHERE priority='booking'
-        ORDER BY timestamp DESC
-        LIMIT 20
-        """
-    ).fetchall()
-
-    history = [
-        {
-            "origin": r["origin"],
-            "destination": r["destination"],
-            "mode": r["mode"],
-            "timestamp": r["timestamp"],
-        }
-        for r in rows
-    ]
-
-    return jsonify({"count": len(history), "history": history})
-
+    try:
+        limit = page_size(request.args.get("limit"), default=20)
+        cursor = request.args.get("cursor")
+        before = decode_cursor(cursor, 1)[0] if cursor else 2**63 - 1
+        if not isinstance(before, int):
+            raise ValueError("invalid cursor")
+    except (TypeError, ValueError) as exc:
+        return jsonify({"status": "error", "error": str(exc)}), 400
+
+    if wants_ndjson(request.args):
+        rows = db.execute(BOOKING_HISTORY_SQL, (before, -1 if "limit" not in request.args else limit))
+        return ndjson_response(_history_entry(r) for r in rows)
+
+    rows = db.execute(BOOKING_HISTORY_SQL, (before, limit + 1)).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    history = [_history_entry(r) for r in rows[:limit]]
+
+    return jsonify({"count": len(history), "history": history, "next_cursor": next_cursor})
@@ -0,0 +1,407 @@
+"""
+Precomputed analytics rollups for the dashboard endpoints.
+
+Triggers keep the rollup tables in step with every write:
+- transports: routes, price/duration sums and histograms per mode
+  (seat-only updates, i.e. bookings, do not touch them)
+- user_history bookings: counts per mode, per route and per (hour, route)
+
+Dashboards read these small tables instead of scanning transports or
+user_history. Bulk feed loads drop the catalog triggers and call
+rebuild_catalog_rollups once at the end, like the catalog version bump.
+`backfill` builds every rollup from scratch in one streaming pass:
+
+    python -m storage.analytics --backfill
+"""
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import sqlite3
+import time
+
+# histogram bucket widths: ₹ for price, minutes for duration
+PRICE_BUCKET = 250
+DURATION_BUCKET = 30
+METRIC_BUCKETS = {"price": PRICE_BUCKET, "duration": DURATION_BUCKET}
+
+ANALYTICS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS analytics_catalog_mode(
+        mode TEXT PRIMARY KEY,
+        routes INTEGER NOT NULL,
+        price_sum REAL NOT NULL,
+        duration_sum REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_catalog_hist(
+        mode TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        cnt INTEGER NOT NULL,
+        PRIMARY KEY(mode, metric, bucket)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_bookings_mode(
+        mode TEXT PRIMARY KEY,
+        cnt INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_bookings_route(
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        mode TEXT NOT NULL,
+        cnt INTEGER NOT NULL,
+        PRIMARY KEY(origin, destination, mode)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_bookings_hour(
+        hour INTEGER NOT NULL,
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        cnt INTEGER NOT NULL,
+        PRIMARY KEY(hour, origin, destination)
+    ) WITHOUT ROWID
+    """,
+    # top-k reads walk these instead of sorting every route
+    "CREATE INDEX IF NOT EXISTS idx_analytics_bookings_route_cnt ON analytics_bookings_route(cnt)",
+    "CREATE INDEX IF NOT EXISTS idx_analytics_bookings_hour_cnt ON analytics_bookings_hour(hour, cnt)",
+    """
+    CREATE TABLE IF NOT EXISTS analytics_meta(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        backfilled_at DATETIME,
+        history_rows INTEGER,
+        catalog_rows INTEGER
+    )
+    """,
+]
+
+ROLLUP_TABLES = ("analytics_catalog_mode", "analytics_catalog_hist", "analytics_bookings_mode",
+                 "analytics_bookings_route", "analytics_bookings_hour")
+
+
+# Row expressions shared by the triggers ({r} = NEW / OLD) and the backfill
+# scans ({r} = table name), so both bucket and normalize identically.
+def _mode(r: str) -> str:
+    return f"lower(trim(coalesce({r}.mode, '')))"
+
+
+def _bucket(r: str, column: str, width: int) -> str:
+    return f"CAST(coalesce({r}.{column}, 0) / {float(width)} AS INTEGER)"
+
+
+def _city(r: str, column: str) -> str:
+    return f"trim(coalesce({r}.{column}, ''))"
+
+
+def _hour(r: str) -> str:
+    return f"CAST(strftime('%H', coalesce({r}.timestamp, CURRENT_TIMESTAMP)) AS INTEGER)"
+
+
+def _catalog_delta(r: str, sign: int) -> str:
+    mode = _mode(r)
+    hists = [("price", _bucket(r, "price", PRICE_BUCKET)),
+             ("duration", _bucket(r, "duration_mins", DURATION_BUCKET))]
+    price, duration = f"coalesce({r}.price, 0)", f"coalesce({r}.duration_mins, 0)"
+    if sign > 0:
+        stmts = [
+            f"INSERT INTO analytics_catalog_mode(mode, routes, price_sum, duration_sum)"
+            f" VALUES ({mode}, 1, {price}, {duration})"
+            f" ON CONFLICT(mode) DO UPDATE SET routes = routes + 1,"
+            f" price_sum = price_sum + excluded.price_sum,"
+            f" duration_sum = duration_sum + excluded.duration_sum;"
+        ]
+        stmts += [
+            f"INSERT INTO analytics_catalog_hist(mode, metric, bucket, cnt)"
+            f" VALUES ({mode}, '{metric}', {bucket}, 1)"
+            f" ON CONFLICT(mode, metric, bucket) DO UPDATE SET cnt = cnt + 1;"
+            for metric, bucket in hists
+        ]
+        return "\n".join(stmts)
+    stmts = [
+        f"UPDATE analytics_catalog_mode SET routes = routes - 1,"
+        f" price_sum = price_sum - {price}, duration_sum = duration_sum - {duration}"
+        f" WHERE mode = {mode};",
+        f"DELETE FROM analytics_catalog_mode WHERE mode = {mode} AND routes <= 0;",
+    ]
+    for metric, bucket in hists:
+        where = f"mode = {mode} AND metric = '{metric}' AND bucket = {bucket}"
+        stmts.append(f"UPDATE analytics_catalog_hist SET cnt = cnt - 1 WHERE {where};")
+        stmts.append(f"DELETE FROM analytics_catalog_hist WHERE {where} AND cnt <= 0;")
+    return "\n".join(stmts)
+
+
+def _bookings_delta(r: str, sign: int) -> str:
+    keys = {
+        "analytics_bookings_mode": {"mode": _mode(r)},
+        "analytics_bookings_route": {"origin": _city(r, "origin"),
+                                     "destination": _city(r, "destination"), "mode": _mode(r)},
+        "analytics_bookings_hour": {"hour": _hour(r), "origin": _city(r, "origin"),
+                                    "destination": _city(r, "destination")},
+    }
+    stmts = []
+    for table, cols in keys.items():
+        if sign > 0:
+            stmts.append(
+                f"INSERT INTO {table}({', '.join(cols)}, cnt) VALUES ({', '.join(cols.values())}, 1)"
+                f" ON CONFLICT({', '.join(cols)}) DO UPDATE SET cnt = cnt + 1;"
+            )
+        else:
+            where = " AND ".join(f"{c} = {e}" for c, e in cols.items())
+            stmts.append(f"UPDATE {table} SET cnt = cnt - 1 WHERE {where};")
+            stmts.append(f"DELETE FROM {table} WHERE {where} AND cnt <= 0;")
+    return "\n".join(stmts)
+
+
+# only columns the rollups read; seat updates from bookings skip the trigger
+_CATALOG_UPDATE_OF = "mode, price, duration_mins"
+
+CATALOG_ROLLUP_TRIGGERS = {
+    "analytics_transports_insert":
+        f"AFTER INSERT ON transports BEGIN\n{_catalog_delta('NEW', 1)}\nEND",
+    "analytics_transports_delete":
+        f"AFTER DELETE ON transports BEGIN\n{_catalog_delta('OLD', -1)}\nEND",
+    "analytics_transports_update":
+        f"AFTER UPDATE OF {_CATALOG_UPDATE_OF} ON transports BEGIN\n"
+        f"{_catalog_delta('OLD', -1)}\n{_catalog_delta('NEW', 1)}\nEND",
+}
+
+BOOKING_ROLLUP_TRIGGERS = {
+    "analytics_history_insert":
+        f"AFTER INSERT ON user_history WHEN NEW.priority = 'booking' BEGIN\n"
+        f"{_bookings_delta('NEW', 1)}\nEND",
+    "analytics_history_delete":
+        f"AFTER DELETE ON user_history WHEN OLD.priority = 'booking' BEGIN\n"
+        f"{_bookings_delta('OLD', -1)}\nEND",
+}
+
+
+def create_triggers(conn: sqlite3.Connection, triggers: Dict[str, str]) -> None:
+    for name, body in triggers.items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def drop_triggers(conn: sqlite3.Connection, triggers: Dict[str, str]) -> None:
+    for name in triggers:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def analytics_installed(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='analytics_meta'"
+    ).fetchone() is not None
+
+
+def ensure_analytics_schema(conn: sqlite3.Connection) -> bool:
+    """
+    Create the rollup tables and triggers; the first time, backfill them
+    from the existing tables. Returns True if a backfill ran.
+    Expects ensure_schema to have run.
+    """
+    for ddl in ANALYTICS_DDL:
+        conn.execute(ddl)
+    create_triggers(conn, CATALOG_ROLLUP_TRIGGERS)
+    create_triggers(conn, BOOKING_ROLLUP_TRIGGERS)
+    conn.commit()
+    if conn.execute("SELECT 1 FROM analytics_meta WHERE id = 1").fetchone() is None:
+        backfill(conn)
+        return True
+    return False
+
+
+# ------- Backfill -------
+
+def _catalog_counters(conn: sqlite3.Connection):
+    modes: Dict[str, List[float]] = {}
+    hist: Counter = Counter()
+    rows = conn.execute(
+        f"SELECT {_mode('transports')}, coalesce(price, 0), coalesce(duration_mins, 0),"
+        f" {_bucket('transports', 'price', PRICE_BUCKET)},"
+        f" {_bucket('transports', 'duration_mins', DURATION_BUCKET)} FROM transports"
+    )
+    n = 0
+    for mode, price, duration, price_bucket, duration_bucket in rows:
+        agg = modes.get(mode)
+        if agg is None:
+            agg = modes[mode] = [0, 0.0, 0.0]
+        agg[0] += 1
+        agg[1] += price
+        agg[2] += duration
+        hist[(mode, "price", price_bucket)] += 1
+        hist[(mode, "duration", duration_bucket)] += 1
+        n += 1
+    return n, modes, hist
+
+
+def _write_catalog(conn: sqlite3.Connection, modes, hist) -> None:
+    conn.execute("DELETE FROM analytics_catalog_mode")
+    conn.execute("DELETE FROM analytics_catalog_hist")
+    conn.executemany(
+        "INSERT INTO analytics_catalog_mode(mode, routes, price_sum, duration_sum) VALUES (?, ?, ?, ?)",
+        [(m, *agg) for m, agg in modes.items()],
+    )
+    conn.executemany(
+        "INSERT INTO analytics_catalog_hist(mode, metric, bucket, cnt) VALUES (?, ?, ?, ?)",
+        [(*key, cnt) for key, cnt in hist.items()],
+    )
+
+
+def rebuild_catalog_rollups(conn: sqlite3.Connection) -> int:
+    """Recompute the catalog rollups inside the caller's transaction (after bulk loads)."""
+    n, modes, hist = _catalog_counters(conn)
+    _write_catalog(conn, modes, hist)
+    conn.execute("UPDATE analytics_meta SET catalog_rows = ? WHERE id = 1", (n,))
+    return n
+
+
+def backfill(conn: sqlite3.Connection) -> Dict:
+    """
+    Rebuild every rollup from transports and user_history. Each table is
+    read once through a cursor and folded into counters keyed by the
+    rollup key, so memory grows with distinct routes, not with history.
+    Runs in one write transaction so concurrent bookings are not lost.
+    """
+    t0 = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        n_catalog, modes, hist = _catalog_counters(conn)
+        _write_catalog(conn, modes, hist)
+
+        by_mode: Counter = Counter()
+        by_route: Counter = Counter()
+        by_hour: Counter = Counter()
+        rows = conn.execute(
+            f"SELECT {_mode('user_history')}, {_city('user_history', 'origin')},"
+            f" {_city('user_history', 'destination')}, {_hour('user_history')}"
+            f" FROM user_history WHERE priority = 'booking'"
+        )
+        n_history = 0
+        for mode, origin, destination, hour in rows:
+            by_mode[mode] += 1
+            by_route[(origin, destination, mode)] += 1
+            by_hour[(hour, origin, destination)] += 1
+            n_history += 1
+
+        for table in ROLLUP_TABLES[2:]:
+            conn.execute(f"DELETE FROM {table}")
+        conn.executemany("INSERT INTO analytics_bookings_mode(mode, cnt) VALUES (?, ?)",
+                         by_mode.items())
+        conn.executemany(
+            "INSERT INTO analytics_bookings_route(origin, destination, mode, cnt) VALUES (?, ?, ?, ?)",
+            [(*key, cnt) for key, cnt in by_route.items()],
+        )
+        conn.executemany(
+            "INSERT INTO analytics_bookings_hour(hour, origin, destination, cnt) VALUES (?, ?, ?, ?)",
+            [(*key, cnt) for key, cnt in by_hour.items()],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO analytics_meta(id, backfilled_at, history_rows, catalog_rows)"
+            " VALUES (1, CURRENT_TIMESTAMP, ?, ?)",
+            (n_history, n_catalog),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"catalog_rows": n_catalog, "history_rows": n_history,
+            "seconds": round(time.perf_counter() - t0, 3)}
+
+
+# ------- Dashboard reads -------
+
+def mode_counts(db) -> List[Dict]:
+    """Routes per mode, as the /analytics/transports chart expects."""
+    rows = db.execute("SELECT mode, routes FROM analytics_catalog_mode ORDER BY mode").fetchall()
+    return [{"mode": r[0], "cnt": r[1]} for r in rows]
+
+
+def _hist_percentile(buckets, total: int, pct: float, width: int) -> float:
+    # upper edge of the bucket holding the pct-th value
+    target = total * pct / 100.0
+    seen = 0
+    for bucket, cnt in buckets:
+        seen += cnt
+        if seen >= target:
+            return float((bucket + 1) * width)
+    return float((buckets[-1][0] + 1) * width) if buckets else 0.0
+
+
+def distributions(db) -> Dict[str, Dict]:
+    """
+    {"price": {mode: {...}}, "duration": {mode: {...}}} with count, avg,
+    approximate p50/p90 (bucket upper edges) and the histogram.
+    """
+    totals = {r[0]: (r[1], r[2], r[3]) for r in db.execute(
+        "SELECT mode, routes, price_sum, duration_sum FROM analytics_catalog_mode")}
+    grouped: Dict[tuple, List] = {}
+    for mode, metric, bucket, cnt in db.execute(
+            "SELECT mode, metric, bucket, cnt FROM analytics_catalog_hist"
+            " ORDER BY mode, metric, bucket"):
+        grouped.setdefault((metric, mode), []).append((bucket, cnt))
+
+    out: Dict[str, Dict] = {metric: {} for metric in METRIC_BUCKETS}
+    for (metric, mode), buckets in grouped.items():
+        if mode not in totals:
+            continue
+        routes, price_sum, duration_sum = totals[mode]
+        width = METRIC_BUCKETS[metric]
+        total = price_sum if metric == "price" else duration_sum
+        out[metric][mode] = {
+            "count": routes,
+            "avg": round(total / routes, 2) if routes else 0.0,
+            "p50": _hist_percentile(buckets, routes, 50, width),
+            "p90": _hist_percentile(buckets, routes, 90, width),
+            "histogram": [{"from": b * width, "to": (b + 1) * width, "cnt": c} for b, c in buckets],
+        }
+    return out
+
+
+def booking_summary(db, limit: int = 10, per_hour: int = 3) -> Dict:
+    """Bookings per mode, the `limit` most booked routes and the top routes of each hour."""
+    by_mode = [{"mode": r[0], "cnt": r[1]} for r in db.execute(
+        "SELECT mode, cnt FROM analytics_bookings_mode ORDER BY cnt DESC, mode")]
+    top_routes = [
+        {"origin": r[0], "destination": r[1], "mode": r[2], "cnt": r[3]}
+        for r in db.execute(
+            "SELECT origin, destination, mode, cnt FROM analytics_bookings_route"
+            " ORDER BY cnt DESC LIMIT ?", (limit,))
+    ]
+    by_hour = []
+    for hour in range(24):
+        routes = [
+            {"origin": r[0], "destination": r[1], "cnt": r[2]}
+            for r in db.execute(
+                "SELECT origin, destination, cnt FROM analytics_bookings_hour"
+                " WHERE hour = ? ORDER BY cnt DESC LIMIT ?", (hour, per_hour))
+        ]
+        if routes:
+            by_hour.append({"hour": hour, "routes": routes})
+    return {
+        "total": sum(m["cnt"] for m in by_mode),
+        "by_mode": by_mode,
+        "top_routes": top_routes,
+        "by_hour": by_hour,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics rollups for database.db")
+    parser.add_argument("--db", type=Path, default=Path(__file__).resolve().parent.parent / "database.db")
+    parser.add_argument("--backfill", action="store_true",
+                        help="rebuild every rollup from transports and user_history")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    ran = ensure_analytics_schema(conn)
+    report = backfill(conn) if args.backfill and not ran else {"backfilled": ran}
+    conn.close()
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
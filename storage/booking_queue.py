@@ -0,0 +1,198 @@
+"""
+Booking write pipeline: requests are queued in-process and a single writer
+thread applies them in group-committed batches (one transaction, one fsync
+per batch instead of per booking).
+
+Each booking atomically takes seats from transports.seats_available and
+logs a row in user_history. Callers choose durability per request:
+- "commit": block until the batch holding the booking has committed
+- "async":  return as soon as the booking is queued (fire-and-forget)
+"""
+from collections import deque
+from typing import Dict, List, Optional
+import atexit
+import os
+import queue
+import threading
+import time
+
+from storage.pool import ConnectionPool, get_pool
+
+DURABILITY_MODES = ("commit", "async")
+
+
+class BookingQueueFull(RuntimeError):
+    """The write queue is at capacity; the caller should retry later."""
+
+
+class BookingRequest:
+    __slots__ = ("transport_id", "seats", "enqueued_at", "done", "result")
+
+    def __init__(self, transport_id: str, seats: int = 1):
+        self.transport_id = transport_id
+        self.seats = seats
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result: Optional[Dict] = None
+
+
+def apply_booking(db, transport_id: str, seats: int = 1) -> Dict:
+    """Take `seats` seats and log the booking. Runs inside the caller's transaction."""
+    row = db.execute(
+        "SELECT origin, destination, mode FROM transports WHERE id=?", (transport_id,)
+    ).fetchone()
+    if row is None:
+        return {"status": "error", "error": "Transport not found", "code": 404}
+
+    cur = db.execute(
+        "UPDATE transports SET seats_available = seats_available - ?"
+        " WHERE id = ? AND seats_available >= ?",
+        (seats, transport_id, seats),
+    )
+    if cur.rowcount == 0:
+        return {"status": "error", "error": "Sold out", "code": 409}
+
+    # priority='booking' to differentiate from search history if you ever log that
+    db.execute(
+        "INSERT INTO user_history(origin, destination, mode, priority) VALUES (?, ?, ?, ?)",
+        (row[0], row[1], row[2], "booking"),
+    )
+    return {"status": "ok", "code": 200}
+
+
+class BookingWriter:
+    """
+    Single writer thread with group commit.
+    - max_batch: most bookings per transaction
+    - max_wait: how long to wait for more bookings after the first arrives
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 256, max_wait: float = 0.002,
+                 max_queue: int = 10_000, latency_window: int = 1024):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Optional[BookingRequest]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._commit_ms: deque = deque(maxlen=latency_window)
+        self.batches = 0
+        self.committed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="booking-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drain queued bookings and stop the writer thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def submit(self, transport_id: str, seats: int = 1, durability: str = "commit",
+               timeout: float = 10.0) -> Dict:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        if seats < 1:
+            raise ValueError("seats must be at least 1")
+        self.start()
+        req = BookingRequest(transport_id, seats)
+        try:
+            self._queue.put_nowait(req)
+        except queue.Full:
+            raise BookingQueueFull("booking queue is full") from None
+
+        if durability == "async":
+            return {"status": "queued", "code": 202}
+        if not req.done.wait(timeout):
+            return {"status": "error", "error": "Booking not confirmed in time", "code": 504}
+        return req.result
+
+    def _next_batch(self) -> List[Optional[BookingRequest]]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        conn = self.pool.acquire(timeout=None)
+        try:
+            while True:
+                batch = self._next_batch()
+                stopping = batch[-1] is None
+                requests = [r for r in batch if r is not None]
+                if requests:
+                    self._apply(conn, requests)
+                if stopping:
+                    return
+        finally:
+            self.pool.release(conn)
+
+    def _apply(self, conn, requests: List[BookingRequest]) -> None:
+        def write(db):
+            return [apply_booking(db, r.transport_id, r.seats) for r in requests]
+
+        t0 = time.perf_counter()
+        try:
+            results = self.pool.run_write(conn, write)
+        except Exception as exc:
+            results = [{"status": "error", "error": f"Booking failed: {exc}", "code": 500}
+                       for _ in requests]
+        commit_ms = (time.perf_counter() - t0) * 1000.0
+
+        with self._lock:
+            self._commit_ms.append(commit_ms)
+            self.batches += 1
+            ok = sum(1 for r in results if r["status"] == "ok")
+            self.committed += ok
+            self.failed += len(results) - ok
+        for req, result in zip(requests, results):
+            req.result = result
+            req.done.set()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            samples = sorted(self._commit_ms)
+            batches, committed, failed = self.batches, self.committed, self.failed
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "committed": committed,
+            "failed": failed,
+            "avg_batch_size": round((committed + failed) / batches, 2) if batches else 0.0,
+            "commit_ms_p50": _percentile(samples, 50),
+            "commit_ms_p99": _percentile(samples, 99),
+            "commit_ms_max": round(samples[-1], 3) if samples else 0.0,
+        }
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))], 3)
+
+
+_writers: Dict[tuple, BookingWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_booking_writer(db_path, **kwargs) -> BookingWriter:
+    """Process-wide writer per database file, drained at interpreter exit."""
+    key = (os.getpid(), str(db_path))
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = BookingWriter(get_pool(db_path), **kwargs)
+                atexit.register(writer.stop)
+    return writer
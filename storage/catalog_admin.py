@@ -0,0 +1,198 @@
+"""
+Admin writes to the transport catalog: batches of adds, updates and deletes
+applied in one transaction.
+
+Rows go through the regular per-row triggers, so every change is recorded
+in catalog_changes (readers patch their in-memory catalog from it) and in
+the analytics rollups. Nothing is rebuilt wholesale.
+"""
+from collections import defaultdict, deque
+from typing import Dict, List, Optional
+import json
+import threading
+import time
+import uuid
+
+from storage.ingest import INSERT_SQL, row_params
+
+# rows per request across add + update + delete
+MAX_BATCH = 10_000
+
+EDITABLE_FIELDS = (
+    "mode", "name", "origin", "destination", "departure", "arrival",
+    "duration_mins", "price", "seats_available", "rating",
+)
+REQUIRED_FIELDS = ("origin", "destination", "mode")
+_INT_FIELDS = ("duration_mins", "seats_available")
+_NUMBER_FIELDS = ("price", "rating")
+
+
+class BatchError(ValueError):
+    """A row in the batch is malformed; nothing was written."""
+
+
+def _check_fields(row: Dict, where: str) -> None:
+    for key in _INT_FIELDS:
+        value = row.get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise BatchError(f"{where}: {key} must be a non-negative integer")
+    for key in _NUMBER_FIELDS:
+        value = row.get(key)
+        if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0):
+            raise BatchError(f"{where}: {key} must be a non-negative number")
+    for key in ("mode", "name", "origin", "destination", "departure", "arrival"):
+        value = row.get(key)
+        if value is not None and not isinstance(value, str):
+            raise BatchError(f"{where}: {key} must be a string")
+
+
+def validate_route(row, where: str = "route") -> Dict:
+    if not isinstance(row, dict):
+        raise BatchError(f"{where}: expected an object")
+    missing = [k for k in REQUIRED_FIELDS if not row.get(k)]
+    if missing:
+        raise BatchError(f"{where}: missing {', '.join(missing)}")
+    # a blank id (the admin form's empty field) means "generate one"
+    if row.get("id") is not None and not isinstance(row["id"], str):
+        raise BatchError(f"{where}: id must be a string")
+    _check_fields(row, where)
+    return row
+
+
+def validate_update(row, where: str = "update") -> Dict:
+    if not isinstance(row, dict):
+        raise BatchError(f"{where}: expected an object")
+    if not (isinstance(row.get("id"), str) and row["id"]):
+        raise BatchError(f"{where}: id is required")
+    unknown = [k for k in row if k != "id" and k not in EDITABLE_FIELDS]
+    if unknown:
+        raise BatchError(f"{where}: unknown field(s) {', '.join(sorted(unknown))}")
+    if len(row) == 1:
+        raise BatchError(f"{where}: nothing to update")
+    for key in REQUIRED_FIELDS:
+        if key in row and not row[key]:
+            raise BatchError(f"{where}: {key} cannot be empty")
+    _check_fields(row, where)
+    return row
+
+
+def parse_batch(payload) -> Dict[str, List]:
+    """Validate a {"add": [...], "update": [...], "delete": [ids]} body."""
+    if not isinstance(payload, dict):
+        raise BatchError("expected a JSON object with add / update / delete lists")
+    batch = {}
+    for key in ("add", "update", "delete"):
+        items = payload.get(key) or []
+        if not isinstance(items, list):
+            raise BatchError(f"{key} must be a list")
+        batch[key] = items
+    batch["add"] = [validate_route(r, f"add[{i}]") for i, r in enumerate(batch["add"])]
+    batch["update"] = [validate_update(r, f"update[{i}]") for i, r in enumerate(batch["update"])]
+    for i, rid in enumerate(batch["delete"]):
+        if not (isinstance(rid, str) and rid):
+            raise BatchError(f"delete[{i}]: expected a transport id")
+    return batch
+
+
+def batch_size(batch: Dict[str, List]) -> int:
+    return sum(len(batch.get(k) or ()) for k in ("add", "update", "delete"))
+
+
+def _existing(db, ids: List[str]) -> set:
+    found = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        found.update(r[0] for r in db.execute(f"SELECT id FROM transports WHERE id IN ({marks})", chunk))
+    return found
+
+
+def new_route_id(mode: str) -> str:
+    return f"{mode}_{uuid.uuid4().hex}"
+
+
+def _apply(db, add: List[Dict], update: List[Dict], delete: List[str]) -> Dict:
+    report = {"added": 0, "updated": 0, "deleted": 0, "missing": [], "conflicts": []}
+
+    if add:
+        rows = [dict(r, id=r.get("id") or new_route_id(r["mode"])) for r in add]
+        taken = _existing(db, [r["id"] for r in rows])
+        params = []
+        for r in rows:
+            if r["id"] in taken:
+                report["conflicts"].append(r["id"])
+                continue
+            taken.add(r["id"])
+            params.append(row_params(r, None))
+        report["added"] = db.executemany(INSERT_SQL, params).rowcount
+        report["added_ids"] = [p[0] for p in params]
+
+    if update:
+        found = _existing(db, [r["id"] for r in update])
+        report["missing"].extend(r["id"] for r in update if r["id"] not in found)
+        # one prepared statement per distinct set of columns
+        groups: Dict[tuple, List[tuple]] = defaultdict(list)
+        for r in update:
+            if r["id"] in found:
+                cols = tuple(k for k in EDITABLE_FIELDS if k in r)
+                fields = {k: r[k] for k in cols}
+                groups[cols].append(tuple(fields.values()) + (json.dumps(fields), r["id"]))
+        for cols, params in groups.items():
+            sets = ", ".join(f"{c}=?" for c in cols)
+            report["updated"] += db.executemany(
+                f"UPDATE transports SET {sets},"
+                " extra_json=json_patch(COALESCE(extra_json, '{}'), ?) WHERE id=?",
+                params,
+            ).rowcount
+
+    if delete:
+        ids = list(dict.fromkeys(delete))
+        found = _existing(db, ids)
+        report["missing"].extend(rid for rid in ids if rid not in found)
+        report["deleted"] = db.executemany(
+            "DELETE FROM transports WHERE id=?", [(rid,) for rid in ids if rid in found]
+        ).rowcount
+    return report
+
+
+# recent batch latencies for /admin/routes/stats
+_recent = deque(maxlen=256)
+_recent_lock = threading.Lock()
+
+
+def apply_batch(pool, add: Optional[List[Dict]] = None, update: Optional[List[Dict]] = None,
+                delete: Optional[List[str]] = None) -> Dict:
+    """
+    Apply one validated batch in a single write transaction. Adds without
+    an id get a generated one; adds whose id already exists are skipped and
+    reported in "conflicts", updates and deletes of unknown ids in
+    "missing". apply_ms is the transaction time.
+    """
+    add, update, delete = add or [], update or [], delete or []
+    t0 = time.perf_counter()
+    with pool.connection() as conn:
+        report = pool.run_write(conn, _apply, add, update, delete)
+    report["apply_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    report["rows"] = len(add) + len(update) + len(delete)
+    report["status"] = "ok"
+    report["code"] = 200
+    with _recent_lock:
+        _recent.append((report["rows"], report["apply_ms"]))
+    return report
+
+
+def batch_stats() -> Dict:
+    with _recent_lock:
+        recent = list(_recent)
+    if not recent:
+        return {"batches": 0}
+    ms = sorted(m for _, m in recent)
+    rows = sum(n for n, _ in recent)
+    return {
+        "batches": len(recent),
+        "rows": rows,
+        "apply_ms_p50": ms[len(ms) // 2],
+        "apply_ms_p95": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "apply_ms_max": ms[-1],
+        "rows_per_s": round(rows / (sum(ms) / 1000), 1) if sum(ms) else 0.0,
+    }
@@ -0,0 +1,305 @@
+"""
+Streaming catalog loader for route feeds (JSON array, NDJSON or CSV).
+
+Rows are streamed from disk and upserted in executemany batches inside one
+transaction. Unchanged rows are not rewritten, feeds whose file has not
+changed since the last load are skipped, and `replace=True` also deletes
+rows of the feed's mode that are no longer in the feed.
+
+    python -m storage.ingest                     # reload changed data/*.json feeds
+    python -m storage.ingest routes.ndjson --mode bus --replace
+"""
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import argparse
+import csv
+import json
+import sqlite3
+import time
+
+from storage.analytics import (
+    CATALOG_ROLLUP_TRIGGERS, analytics_installed, create_triggers, drop_triggers,
+    rebuild_catalog_rollups,
+)
+from storage.schema import CATALOG_TRIGGERS, LOG_CATALOG_RESET, TRANSPORT_INDEXES, ensure_schema
+
+# feed file -> transport mode, as loaded by init_db
+DEFAULT_FEEDS = {
+    "trains.json": "train",
+    "flights.json": "flight",
+    "buses.json": "bus",
+    "taxis.json": "taxi",
+    "bikes.json": "bike",
+}
+
+FEED_STATE_DDL = """
+    CREATE TABLE IF NOT EXISTS feed_state(
+        path TEXT PRIMARY KEY,
+        mtime_ns INTEGER,
+        size INTEGER,
+        rows INTEGER,
+        loaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+_DATA_COLUMNS = (
+    "mode", "name", "origin", "destination", "departure", "arrival",
+    "duration_mins", "price", "seats_available", "rating", "extra_json",
+)
+
+INSERT_SQL = (
+    "INSERT INTO transports(id, " + ", ".join(_DATA_COLUMNS) + ")"
+    " VALUES (" + ", ".join("?" * (len(_DATA_COLUMNS) + 1)) + ")"
+)
+
+# seats_available is runtime state (bookings, holds): set on insert, never reloaded
+_FEED_COLUMNS = tuple(c for c in _DATA_COLUMNS if c != "seats_available")
+
+# only rows whose data actually changed are rewritten (and bump the catalog version)
+UPSERT_SQL = (
+    INSERT_SQL
+    + " ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c}=excluded.{c}" for c in _FEED_COLUMNS)
+    + " WHERE " + " OR ".join(f"{c} IS NOT excluded.{c}" for c in _FEED_COLUMNS)
+)
+
+# key under which readers may stash the row's source text for extra_json
+_RAW = "\0raw"
+
+_INT_FIELDS = ("duration_mins", "seats_available")
+_FLOAT_FIELDS = ("price", "rating")
+
+# bulk-load settings; WAL keeps readers unblocked while a feed loads
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-131072",
+)
+
+
+# ------- Feed readers -------
+
+def iter_json_array(path: Path, chunk_size: int = 1 << 16) -> Iterator[Dict]:
+    """Yield the objects of a top-level JSON array without loading the file."""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array")
+        pos = 1
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield obj
+
+
+def iter_ndjson(path: Path) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                row = json.loads(line)
+                # the line is already compact JSON; reuse it for extra_json
+                row[_RAW] = line
+                yield row
+
+
+def iter_csv(path: Path) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            for key in _INT_FIELDS:
+                if row.get(key) not in (None, ""):
+                    row[key] = int(float(row[key]))
+            for key in _FLOAT_FIELDS:
+                if row.get(key) not in (None, ""):
+                    row[key] = float(row[key])
+            yield row
+
+
+def iter_feed(path: Path) -> Iterator[Dict]:
+    suffix = path.suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        return iter_ndjson(path)
+    if suffix == ".csv":
+        return iter_csv(path)
+    return iter_json_array(path)
+
+
+def row_params(row: Dict, mode: Optional[str]) -> tuple:
+    extra = row.pop(_RAW, None) or json.dumps(row)
+    mode = mode or row.get("mode")
+    rid = row.get("id") or f"{mode}_{row.get('code', row.get('name', 'unk'))}"
+    return (
+        rid, mode, row.get("name"), row.get("origin"), row.get("destination"),
+        row.get("departure"), row.get("arrival"), row.get("duration_mins", 0),
+        row.get("price", 0), row.get("seats_available", 0), row.get("rating", 4.0),
+        extra,
+    )
+
+
+# ------- Loader -------
+
+def _feed_unchanged(conn: sqlite3.Connection, path: Path) -> bool:
+    st = path.stat()
+    row = conn.execute(
+        "SELECT mtime_ns, size FROM feed_state WHERE path=?", (str(path),)
+    ).fetchone()
+    return row is not None and tuple(row) == (st.st_mtime_ns, st.st_size)
+
+
+def ingest_feed(conn: sqlite3.Connection, path: Path, mode: Optional[str] = None,
+                replace: bool = False, force: bool = False,
+                batch_size: int = 5000) -> Dict:
+    """
+    Upsert one feed into transports. Returns a report with rows/sec.
+    replace=True deletes rows of `mode` missing from the feed.
+    """
+    path = Path(path)
+    ensure_schema(conn)
+    conn.execute(FEED_STATE_DDL)
+    conn.commit()
+
+    report = {"feed": str(path), "mode": mode, "rows": 0, "changed": 0,
+              "deleted": 0, "skipped": False, "seconds": 0.0, "rows_per_sec": 0.0}
+    if not force and _feed_unchanged(conn, path):
+        report["skipped"] = True
+        return report
+    if replace and not mode:
+        raise ValueError("replace=True needs the feed's mode")
+
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+    t0 = time.perf_counter()
+    c = conn.cursor()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        # per-row version triggers would fire once per row; bump once at the end instead
+        for event in ("insert", "update", "delete"):
+            c.execute(f"DROP TRIGGER IF EXISTS transports_version_{event}")
+        # same for the analytics rollups: rebuilt in one pass at the end
+        rollups = analytics_installed(conn)
+        if rollups:
+            drop_triggers(c, CATALOG_ROLLUP_TRIGGERS)
+        # into an empty table it is cheaper to build the lookup indexes afterwards
+        initial_load = c.execute("SELECT 1 FROM transports LIMIT 1").fetchone() is None
+        if initial_load:
+            for name in _index_names():
+                c.execute(f"DROP INDEX IF EXISTS {name}")
+        if replace:
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS _ingest_seen(id TEXT PRIMARY KEY)")
+            c.execute("DELETE FROM _ingest_seen")
+
+        batch: List[tuple] = []
+        for row in iter_feed(path):
+            batch.append(row_params(row, mode))
+            if len(batch) >= batch_size:
+                report["changed"] += _flush(conn, c, batch, replace)
+                report["rows"] += len(batch)
+                batch = []
+        if batch:
+            report["changed"] += _flush(conn, c, batch, replace)
+            report["rows"] += len(batch)
+
+        if replace:
+            c.execute(
+                "DELETE FROM transports WHERE mode_norm = ?"
+                " AND id NOT IN (SELECT id FROM _ingest_seen)",
+                (mode.strip().lower(),),
+            )
+            report["deleted"] = c.rowcount
+            c.execute("DELETE FROM _ingest_seen")
+
+        if initial_load:
+            for ddl in TRANSPORT_INDEXES:
+                c.execute(ddl)
+            c.execute("ANALYZE transports")
+        for ddl in CATALOG_TRIGGERS:
+            c.execute(ddl)
+        if report["changed"] or report["deleted"]:
+            c.execute("UPDATE catalog_meta SET version = version + 1 WHERE id = 1")
+            c.execute(LOG_CATALOG_RESET)
+            if rollups:
+                rebuild_catalog_rollups(c)
+        if rollups:
+            create_triggers(c, CATALOG_ROLLUP_TRIGGERS)
+
+        st = path.stat()
+        c.execute(
+            "INSERT OR REPLACE INTO feed_state(path, mtime_ns, size, rows) VALUES (?, ?, ?, ?)",
+            (str(path), st.st_mtime_ns, st.st_size, report["rows"]),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    elapsed = time.perf_counter() - t0
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["rows"] / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def _index_names() -> List[str]:
+    return [ddl.split("EXISTS", 1)[1].split()[0] for ddl in TRANSPORT_INDEXES]
+
+
+def _flush(conn: sqlite3.Connection, c: sqlite3.Cursor, batch: List[tuple],
+           replace: bool) -> int:
+    """Upsert one batch; returns how many rows were inserted or changed."""
+    before = conn.total_changes
+    c.executemany(UPSERT_SQL, batch)
+    changed = conn.total_changes - before
+    if replace:
+        c.executemany("INSERT OR IGNORE INTO _ingest_seen(id) VALUES (?)", [(p[0],) for p in batch])
+    return changed
+
+
+def load_feeds(conn: sqlite3.Connection, data_dir: Path,
+               feeds: Optional[Dict[str, str]] = None, **kwargs) -> List[Dict]:
+    """Ingest every existing feed in data_dir; unchanged feeds are skipped."""
+    reports = []
+    for filename, mode in (feeds or DEFAULT_FEEDS).items():
+        path = Path(data_dir) / filename
+        if path.exists():
+            reports.append(ingest_feed(conn, path, mode, **kwargs))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load route feeds into database.db")
+    parser.add_argument("feeds", nargs="*", type=Path,
+                        help="feed files (.json/.ndjson/.csv); default: data/*.json")
+    parser.add_argument("--db", type=Path, default=Path(__file__).resolve().parent.parent / "database.db")
+    parser.add_argument("--mode", help="transport mode for every row of the given feeds")
+    parser.add_argument("--replace", action="store_true",
+                        help="delete rows of --mode that are missing from the feed")
+    parser.add_argument("--force", action="store_true", help="reload even if the feed is unchanged")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    opts = {"replace": args.replace, "force": args.force, "batch_size": args.batch_size}
+    if args.feeds:
+        reports = [ingest_feed(conn, p, args.mode, **opts) for p in args.feeds]
+    else:
+        reports = load_feeds(conn, Path(__file__).resolve().parent.parent / "data", **opts)
+    conn.close()
+
+    for r in reports:
+        print(json.dumps(r))
+
+
+if __name__ == "__main__":
+    main()
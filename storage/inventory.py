@@ -0,0 +1,399 @@
+"""
+Seat inventory: in-memory per-transport seat counters with holds.
+
+A booking is hold -> confirm (or release / expiry). Holds only touch the
+in-memory counter, under the lock of the transport's shard, so bookings
+for different transports rarely contend. Confirms go through the
+group-commit BookingWriter, whose guarded UPDATE (seats_available >= n)
+stays the last line of defence against overselling.
+
+The reconciler runs every few seconds:
+- expires overdue holds
+- refreshes counters from transports.seats_available (feed reloads,
+  other workers)
+- writes this worker's held seats to `seat_holds`, so each gunicorn
+  worker also subtracts the seats that other workers hold
+"""
+from typing import Dict, List, Optional
+import atexit
+import heapq
+import os
+import threading
+import time
+import uuid
+
+from storage.booking_queue import DURABILITY_MODES, BookingWriter, get_booking_writer
+from storage.pool import get_pool
+
+HOLD_TTL_SECS = 300.0
+RECONCILE_SECS = 5.0
+
+SEAT_HOLDS_DDL = """
+    CREATE TABLE IF NOT EXISTS seat_holds(
+        worker TEXT NOT NULL,
+        transport_id TEXT NOT NULL,
+        seats INTEGER NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY(worker, transport_id)
+    ) WITHOUT ROWID
+"""
+
+
+class SeatCounter:
+    """
+    seats:    unsold seats (last read from SQLite, minus confirms since)
+    held:     seats under this worker's active holds
+    remote:   seats other workers hold, as of the last reconcile
+    inflight: confirms submitted but not yet acknowledged by the writer
+    done:     seats of all acknowledged confirms (lets refresh spot confirms
+              that finished while it was reading SQLite)
+    """
+    __slots__ = ("seats", "held", "remote", "inflight", "done")
+
+    def __init__(self, seats: int):
+        self.seats = seats
+        self.held = 0
+        self.remote = 0
+        self.inflight = 0
+        self.done = 0
+
+    @property
+    def free(self) -> int:
+        return self.seats - self.held - self.remote
+
+
+class Hold:
+    __slots__ = ("hold_id", "transport_id", "seats", "expires_at")
+
+    def __init__(self, hold_id: str, transport_id: str, seats: int, expires_at: float):
+        self.hold_id = hold_id
+        self.transport_id = transport_id
+        self.seats = seats
+        self.expires_at = expires_at
+
+
+class _Shard:
+    __slots__ = ("index", "lock", "counters", "holds", "expiry")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.lock = threading.Lock()
+        self.counters: Dict[str, SeatCounter] = {}
+        self.holds: Dict[str, Hold] = {}
+        self.expiry: List = []      # heap of (expires_at, hold_id)
+
+
+class SeatInventory:
+    """
+    - shards: independent locks; a transport always maps to the same shard
+    - hold_ttl: default seconds before an unconfirmed hold lapses
+    - stale_after: ignore other workers' seat_holds rows older than this
+    """
+
+    def __init__(self, db_path, writer: Optional[BookingWriter] = None, shards: int = 64,
+                 hold_ttl: float = HOLD_TTL_SECS, stale_after: float = 6 * RECONCILE_SECS):
+        self.db_path = db_path
+        self.writer = writer or get_booking_writer(db_path)
+        self.hold_ttl = hold_ttl
+        self.stale_after = stale_after
+        self.worker = f"{os.uname().nodename}:{os.getpid()}"
+        self._shards = [_Shard(i) for i in range(max(1, shards))]
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys(
+            ("holds", "rejected", "confirmed", "confirm_failed", "released", "expired",
+             "reconciles", "drift"), 0)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        with self.pool.connection() as conn:
+            self.pool.run_write(conn, lambda c: c.execute(SEAT_HOLDS_DDL))
+
+    @property
+    def pool(self):
+        return get_pool(self.db_path)
+
+    def _incr(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def _shard(self, transport_id: str) -> _Shard:
+        return self._shards[hash(transport_id) % len(self._shards)]
+
+    def _shard_of_hold(self, hold_id: str) -> Optional[_Shard]:
+        index, _, _ = hold_id.partition("-")
+        if not index.isdigit() or int(index) >= len(self._shards):
+            return None
+        return self._shards[int(index)]
+
+    def _counter(self, shard: _Shard, transport_id: str) -> Optional[SeatCounter]:
+        """The transport's counter, loaded from SQLite on first use (outside the shard lock)."""
+        with shard.lock:
+            counter = shard.counters.get(transport_id)
+        if counter is not None:
+            return counter
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT seats_available FROM transports WHERE id=?", (transport_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        with shard.lock:
+            return shard.counters.setdefault(transport_id, SeatCounter(row[0] or 0))
+
+    def _expire(self, shard: _Shard, now: float) -> int:
+        # caller holds shard.lock
+        expired = 0
+        while shard.expiry and shard.expiry[0][0] <= now:
+            _, hold_id = heapq.heappop(shard.expiry)
+            hold = shard.holds.get(hold_id)
+            if hold is not None and hold.expires_at <= now:
+                del shard.holds[hold_id]
+                shard.counters[hold.transport_id].held -= hold.seats
+                expired += 1
+        return expired
+
+    # ------- Holds -------
+
+    def hold(self, transport_id: str, seats: int = 1, ttl: Optional[float] = None) -> Dict:
+        """Reserve seats for `ttl` seconds. Returns a result dict with an HTTP-style code."""
+        if seats < 1:
+            raise ValueError("seats must be at least 1")
+        shard = self._shard(transport_id)
+        counter = self._counter(shard, transport_id)
+        if counter is None:
+            return {"status": "error", "error": "Transport not found", "code": 404}
+
+        now = time.time()
+        expires_at = now + (self.hold_ttl if ttl is None else ttl)
+        with shard.lock:
+            expired = self._expire(shard, now)
+            if counter.free < seats:
+                hold_id = None
+            else:
+                hold_id = f"{shard.index}-{uuid.uuid4().hex}"
+                counter.held += seats
+                shard.holds[hold_id] = Hold(hold_id, transport_id, seats, expires_at)
+                heapq.heappush(shard.expiry, (expires_at, hold_id))
+        if expired:
+            self._incr("expired", expired)
+        if hold_id is None:
+            self._incr("rejected")
+            return {"status": "error", "error": "Sold out", "code": 409}
+        self._incr("holds")
+        return {"status": "held", "hold_id": hold_id, "transport_id": transport_id,
+                "seats": seats, "expires_at": expires_at, "code": 200}
+
+    def _take_hold(self, hold_id: str):
+        shard = self._shard_of_hold(hold_id or "")
+        if shard is None:
+            return None, None
+        with shard.lock:
+            hold = shard.holds.pop(hold_id, None)
+            if hold is not None and hold.expires_at <= time.time():
+                shard.counters[hold.transport_id].held -= hold.seats
+                self._incr("expired")
+                hold = None
+        return shard, hold
+
+    def release(self, hold_id: str) -> Dict:
+        shard, hold = self._take_hold(hold_id)
+        if hold is None:
+            return {"status": "error", "error": "Hold not found or expired", "code": 404}
+        with shard.lock:
+            shard.counters[hold.transport_id].held -= hold.seats
+        self._incr("released")
+        return {"status": "released", "code": 200}
+
+    def confirm(self, hold_id: str, durability: str = "commit") -> Dict:
+        """
+        Turn a hold into a booking via the booking writer. The seats move
+        from `held` to sold before the write; a failed write gives them back
+        (and on 409 re-reads the counter, which was stale).
+        """
+        shard, hold = self._take_hold(hold_id)
+        if hold is None:
+            return {"status": "error", "error": "Hold not found or expired", "code": 404}
+        with shard.lock:
+            counter = shard.counters[hold.transport_id]
+            counter.held -= hold.seats
+            counter.seats -= hold.seats
+            counter.inflight += hold.seats
+        try:
+            result = self.writer.submit(hold.transport_id, hold.seats, durability)
+        except Exception:
+            # queue full / bad durability: the hold stays valid
+            with shard.lock:
+                counter.inflight -= hold.seats
+                counter.seats += hold.seats
+                counter.held += hold.seats
+                shard.holds[hold.hold_id] = hold
+            raise
+
+        ok = result.get("code") in (200, 202)
+        with shard.lock:
+            counter.inflight -= hold.seats
+            if ok:
+                counter.done += hold.seats
+            else:
+                counter.seats += hold.seats
+        if not ok:
+            self._incr("confirm_failed")
+            if result.get("code") == 409:
+                self.refresh([hold.transport_id])
+        else:
+            self._incr("confirmed")
+        return result
+
+    def book(self, transport_id: str, seats: int = 1, durability: str = "commit") -> Dict:
+        """Hold and confirm in one call (the /book path)."""
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"durability must be one of {DURABILITY_MODES}")
+        held = self.hold(transport_id, seats)
+        if held["code"] != 200:
+            return held
+        try:
+            return self.confirm(held["hold_id"], durability)
+        except Exception:
+            self.release(held["hold_id"])
+            raise
+
+    def availability(self, transport_id: str) -> Optional[Dict]:
+        shard = self._shard(transport_id)
+        counter = self._counter(shard, transport_id)
+        if counter is None:
+            return None
+        with shard.lock:
+            self._expire(shard, time.time())
+            return {"id": transport_id, "seats_available": counter.seats,
+                    "held": counter.held + counter.remote, "free": max(counter.free, 0)}
+
+    # ------- Reconciliation -------
+
+    def refresh(self, transport_ids: List[str]) -> int:
+        """Reset counters from SQLite; returns how many had drifted."""
+        ids = list(transport_ids)
+        if not ids:
+            return 0
+        done_before: Dict[str, int] = {}
+        for tid in ids:
+            shard = self._shard(tid)
+            with shard.lock:
+                counter = shard.counters.get(tid)
+                if counter is not None:
+                    done_before[tid] = counter.done
+        seats: Dict[str, int] = {}
+        with self.pool.connection() as conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                seats.update(conn.execute(
+                    f"SELECT id, seats_available FROM transports WHERE id IN ({marks})", chunk))
+            remote = dict(conn.execute(
+                "SELECT transport_id, SUM(seats) FROM seat_holds"
+                " WHERE worker != ? AND updated_at >= ? GROUP BY transport_id",
+                (self.worker, time.time() - self.stale_after),
+            ))
+        drift = 0
+        for tid in ids:
+            shard = self._shard(tid)
+            with shard.lock:
+                counter = shard.counters.get(tid)
+                if counter is None:
+                    continue
+                if tid not in seats and counter.held == 0:
+                    del shard.counters[tid]   # transport deleted
+                    continue
+                # confirms acknowledged during the read may or may not be in
+                # `seats`; count them as sold (the next refresh corrects it)
+                racing = counter.done - done_before.get(tid, counter.done)
+                fresh = (seats.get(tid) or 0) - counter.inflight - racing
+                if fresh != counter.seats:
+                    drift += 1
+                    counter.seats = fresh
+                counter.remote = remote.get(tid, 0)
+        return drift
+
+    def reconcile(self) -> Dict:
+        """Expire holds, refresh every counter and publish this worker's holds."""
+        now = time.time()
+        expired = 0
+        tracked: List[str] = []
+        held: List[tuple] = []
+        for shard in self._shards:
+            with shard.lock:
+                expired += self._expire(shard, now)
+                tracked.extend(shard.counters)
+                held.extend((self.worker, tid, c.held, now)
+                            for tid, c in shard.counters.items() if c.held > 0)
+
+        def publish(conn):
+            conn.execute("DELETE FROM seat_holds WHERE worker = ? OR updated_at < ?",
+                         (self.worker, now - self.stale_after))
+            conn.executemany(
+                "INSERT INTO seat_holds(worker, transport_id, seats, updated_at) VALUES (?, ?, ?, ?)",
+                held)
+
+        with self.pool.connection() as conn:
+            self.pool.run_write(conn, publish)
+        drift = self.refresh(tracked)
+
+        with self._stats_lock:
+            self._stats["expired"] += expired
+            self._stats["reconciles"] += 1
+            self._stats["drift"] += drift
+        return {"tracked": len(tracked), "expired": expired, "drift": drift,
+                "published_holds": len(held)}
+
+    def start(self, interval: float = RECONCILE_SECS) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.reconcile()
+                except Exception:
+                    pass    # retried on the next tick
+
+        self._thread = threading.Thread(target=loop, name="seat-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the reconciler and withdraw this worker's published holds."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+        try:
+            with self.pool.connection() as conn:
+                self.pool.run_write(
+                    conn, lambda c: c.execute("DELETE FROM seat_holds WHERE worker = ?", (self.worker,)))
+        except Exception:
+            pass
+
+    def metrics(self) -> Dict:
+        active = tracked = 0
+        for shard in self._shards:
+            with shard.lock:
+                active += len(shard.holds)
+                tracked += len(shard.counters)
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {"shards": len(self._shards), "tracked": tracked, "active_holds": active, **stats}
+
+
+_inventories: Dict[tuple, SeatInventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(db_path, **kwargs) -> SeatInventory:
+    """Process-wide inventory per database file, with its reconciler running."""
+    key = (os.getpid(), str(db_path))
+    inventory = _inventories.get(key)
+    if inventory is None:
+        with _inventories_lock:
+            inventory = _inventories.get(key)
+            if inventory is None:
+                inventory = _inventories[key] = SeatInventory(db_path, **kwargs)
+                inventory.start()
+                atexit.register(inventory.stop)
+    return inventory
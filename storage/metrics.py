@@ -0,0 +1,251 @@
+"""
+In-process instrumentation: stage timers, latency histograms exported in
+Prometheus text format, and SQLite statement timing.
+
+    with stage("db_fetch"):
+        rows = search_page(...)
+
+Each stage lands in app_stage_duration_seconds{stage=...} and, while a
+request is being traced (routes/metrics.py), in that request's
+Server-Timing header. Recording is a perf_counter pair, a bisect and a
+short lock, so it stays on in production; `set_enabled(False)` turns it
+into a no-op.
+"""
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+import sqlite3
+import threading
+import time
+
+# upper bounds in seconds (Prometheus convention); +Inf is implicit
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_enabled = True
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class HistogramFamily:
+    """One metric name, one child histogram per label-value tuple."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str],
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._children: Dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def clear(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, child in children:
+            counts, total, count = child.snapshot()
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, values))
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, HistogramFamily] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> HistogramFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = HistogramFamily(name, help_text, labels, buckets)
+            return family
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            families = list(self._families.values())
+        lines: List[str] = []
+        for family in families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Request latency by endpoint, method and status.",
+    ("endpoint", "method", "status"))
+STAGE_SECONDS = registry.histogram(
+    "app_stage_duration_seconds", "Time spent in named request stages.", ("stage",))
+SQL_SECONDS = registry.histogram(
+    "sqlite_query_duration_seconds", "SQLite execute/executemany time by statement verb.", ("op",))
+
+
+# ------- Per-request trace -------
+class _TraceLocal(threading.local):
+    # a class default keeps the lookup cheap on threads that never traced
+    trace: Optional[List[Tuple[str, float]]] = None
+
+
+_local = _TraceLocal()
+
+
+def begin_trace() -> None:
+    _local.trace = []
+
+
+def end_trace() -> List[Tuple[str, float]]:
+    trace = _local.trace
+    _local.trace = None
+    return trace or []
+
+
+def _record(name: str, seconds: float) -> None:
+    trace = _local.trace
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+def server_timing(trace: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Server-Timing header value; repeated stages are summed."""
+    totals: Dict[str, float] = {}
+    for name, seconds in trace:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in totals.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class _Stage:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if _enabled:
+            seconds = time.perf_counter() - self.t0
+            hist = _stage_hists.get(self.name)
+            if hist is None:
+                hist = _stage_hists[self.name] = STAGE_SECONDS.labels(self.name)
+            hist.observe(seconds)
+            trace = _local.trace
+            if trace is not None:
+                trace.append((self.name, seconds))
+        return False
+
+
+# stage name -> its STAGE_SECONDS child, skipping the labels() lookup
+_stage_hists: Dict[str, Histogram] = {}
+
+
+def stage(name: str) -> _Stage:
+    """Context manager timing one named stage; see the module docstring."""
+    return _Stage(name)
+
+
+# ------- SQLite -------
+# statement text -> histogram of its verb; dynamic SQL past the cap is
+# classified on every call instead of cached
+_sql_hists: Dict[str, Histogram] = {}
+_SQL_CACHE_MAX = 4096
+
+
+def sql_op(sql: str) -> str:
+    """Statement verb (SELECT, INSERT, ...) used as the op label."""
+    head = sql.lstrip().split(None, 1)
+    return head[0].upper() if head and head[0].isalpha() else "OTHER"
+
+
+def _observe_sql(sql: str, seconds: float) -> None:
+    hist = _sql_hists.get(sql)
+    if hist is None:
+        hist = SQL_SECONDS.labels(sql_op(sql))
+        if len(_sql_hists) < _SQL_CACHE_MAX:
+            _sql_hists[sql] = hist
+    hist.observe(seconds)
+    _record("sql", seconds)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection factory timing execute/executemany. For SELECTs this
+    covers planning and the first step; rows fetched later are not counted.
+    """
+
+    def execute(self, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            if _enabled:
+                _observe_sql(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql, *args):
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            if _enabled:
+                _observe_sql(sql, time.perf_counter() - t0)
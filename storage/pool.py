@@ -0,0 +1,190 @@
+"""
+Shared SQLite access layer: a bounded connection pool with WAL journaling,
+per-connection statement caches and a busy-retry policy for writers.
+
+Connections run in autocommit mode; writes go through `run_write`, which
+takes the write lock up front (BEGIN IMMEDIATE) and retries with backoff
+while another writer holds it. Readers never wait on writers under WAL.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+from storage.metrics import TimedConnection
+from storage.schema import ensure_schema
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class PoolTimeout(RuntimeError):
+    """No connection became free within the acquire timeout."""
+
+
+def is_busy_error(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+
+class PoolStats:
+    __slots__ = ("acquired", "created", "pool_waits", "lock_waits", "write_retries_exhausted", "_lock")
+
+    def __init__(self):
+        self.acquired = 0
+        self.created = 0
+        self.pool_waits = 0
+        self.lock_waits = 0
+        self.write_retries_exhausted = 0
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {k: getattr(self, k) for k in self.__slots__ if not k.startswith("_")}
+
+
+class ConnectionPool:
+    """
+    At most `size` open connections to one database file.
+    - busy_timeout_ms is kept short so lock waits surface as counted retries
+    - cached_statements sizes each connection's prepared-statement cache
+    """
+
+    def __init__(self, db_path, size: int = 8, acquire_timeout: float = 10.0,
+                 busy_timeout_ms: int = 100, cached_statements: int = 256,
+                 write_retries: int = 50, max_backoff: float = 0.05):
+        self.db_path = str(db_path)
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.write_retries = write_retries
+        self.max_backoff = max_backoff
+        self.stats = PoolStats()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._open = 0
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            factory=TimedConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if not self._schema_ready:
+            # migrate databases created by older versions (indexes, norm columns)
+            self.run_write(conn, ensure_schema)
+            self._schema_ready = True
+        self.stats.incr("created")
+        return conn
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                self.stats.incr("pool_waits")
+                try:
+                    conn = self._idle.get(timeout=self.acquire_timeout if timeout is None else timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"no free connection to {self.db_path}") from None
+        self.stats.incr("acquired")
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def run_write(self, conn: sqlite3.Connection, fn: Callable, *args, **kwargs):
+        """
+        Run fn(conn, *args) inside BEGIN IMMEDIATE ... COMMIT, retrying with
+        jittered backoff while the write lock is held elsewhere.
+        """
+        delay = 0.001
+        for _ in range(self.write_retries):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as exc:
+                if not is_busy_error(exc):
+                    raise
+                self.stats.incr("lock_waits")
+                time.sleep(delay * (0.5 + random.random()))
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            try:
+                result = fn(conn, *args, **kwargs)
+                if conn.in_transaction:  # fn may have committed itself
+                    conn.execute("COMMIT")
+                return result
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        self.stats.incr("write_retries_exhausted")
+        raise sqlite3.OperationalError("database is locked (write retries exhausted)")
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+
+# (pid, db path) -> pool; a forked worker never reuses its parent's connections
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, **kwargs) -> ConnectionPool:
+    """Process-wide pool per database file (kwargs apply on first use only)."""
+    key = (os.getpid(), str(Path(db_path).resolve()))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key[1], **kwargs)
+    return pool
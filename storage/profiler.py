@@ -0,0 +1,98 @@
+"""
+Opt-in sampling profiler for single requests.
+
+A helper thread reads the profiled thread's Python stack every `interval`
+seconds (sys._current_frames) and counts identical stacks. Output is the
+collapsed-stack format read by flamegraph.pl and speedscope:
+
+    app.py:wsgi_app;routes/transport.py:chat;ai/agent_engine.py:respond_intelligently 42
+
+Nothing runs unless a request asks for it, so the cost elsewhere is zero.
+While the profiled thread is CPU-bound the sampler only gets the GIL once
+per switch interval (sys.getswitchinterval(), 5 ms by default), which
+bounds the effective sampling rate.
+"""
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+import sys
+import threading
+import uuid
+
+# profiles kept for /debug/profile/<id>
+MAX_PROFILES = 32
+
+_ROOT = str(Path(__file__).resolve().parent.parent) + "/"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = filename[len(_ROOT):]
+    elif "site-packages/" in filename:
+        filename = filename.split("site-packages/", 1)[1]
+    else:
+        filename = filename.rsplit("/", 1)[-1]
+    return f"{filename}:{code.co_name}"
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.001,
+                 max_depth: int = 96):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.samples[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common())
+
+
+_profiles: "OrderedDict[str, str]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def store_profile(profiler: SamplingProfiler) -> str:
+    """Keep a finished profile's collapsed stacks; returns its id."""
+    profile_id = uuid.uuid4().hex[:16]
+    with _profiles_lock:
+        _profiles[profile_id] = profiler.collapsed()
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def get_profile(profile_id: str) -> Optional[str]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def profiles() -> Dict[str, int]:
+    """Stored profile id -> total samples."""
+    with _profiles_lock:
+        return {pid: sum(int(line.rsplit(" ", 1)[1]) for line in text.splitlines())
+                for pid, text in _profiles.items()}
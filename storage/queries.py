@@ -0,0 +1,261 @@
+"""
+Indexed lookups on the transports table.
+
+search_transports returns every match at once; search_page / iter_search
+serve the same matches in keyset-paginated pages (ORDER BY id, resumed
+with an opaque cursor) with a column projection, so broad queries never
+materialize more than one page or one row at a time.
+
+Both accept a TimeWindow on the departure time (departure_min, minutes
+since midnight), answered by a range scan of idx_transports_route_departure.
+"""
+import base64
+import json
+import re
+import sqlite3
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from storage.schema import DAY_MINS, TIME_COLUMNS, TRANSPORT_COLUMNS
+
+SELECT_TRANSPORTS = "SELECT " + ", ".join(TRANSPORT_COLUMNS) + " FROM transports"
+# stored columns plus the generated departure_min / arrival_min
+SELECTABLE_COLUMNS = TRANSPORT_COLUMNS + tuple(TIME_COLUMNS)
+
+# extra_json duplicates the whole source row; only returned when asked for
+DEFAULT_FIELDS = tuple(c for c in TRANSPORT_COLUMNS if c != "extra_json")
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+# Tried in order until the city names match a row. "exact" and "prefix" are
+# served by idx_transports_route; "substring" is the old LIKE '%x%' scan, kept
+# as a fallback. Mode and departure window filter the chosen strategy only.
+MATCH_STRATEGIES = ("exact", "prefix", "substring")
+
+
+def normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+class TimeWindow(NamedTuple):
+    """
+    Departures from `start` to `end` inclusive, in minutes since midnight.
+    start > end wraps past midnight (22:00-02:00). On-demand rows (taxis,
+    bikes: no fixed departure) match unless `ondemand` is False.
+    """
+    start: int
+    end: int
+    ondemand: bool = True
+
+    def __contains__(self, minute) -> bool:
+        if minute is None:
+            return self.ondemand
+        if self.start <= self.end:
+            return self.start <= minute <= self.end
+        return minute >= self.start or minute <= self.end
+
+
+_CLOCK_RE = re.compile(r"([01]?\d|2[0-3]):([0-5]\d)")
+
+
+def parse_minutes(value, name: str = "time") -> int:
+    """'HH:MM' or minutes since midnight -> minutes; ValueError otherwise."""
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < DAY_MINS:
+        return value
+    m = _CLOCK_RE.fullmatch(value.strip()) if isinstance(value, str) else None
+    if m is None:
+        raise ValueError(f"invalid {name}: {value!r} (expected HH:MM)")
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def time_window(depart_from=None, depart_to=None, ondemand: bool = True) -> Optional[TimeWindow]:
+    """
+    TimeWindow from request values ("HH:MM" or minutes since midnight);
+    None when neither bound is given. ValueError for malformed times.
+    """
+    if depart_from in (None, "") and depart_to in (None, ""):
+        return None
+    start = 0 if depart_from in (None, "") else parse_minutes(depart_from, "depart_from")
+    end = DAY_MINS - 1 if depart_to in (None, "") else parse_minutes(depart_to, "depart_to")
+    return TimeWindow(start, end, bool(ondemand))
+
+
+def _window_clause(window: TimeWindow):
+    if window.start <= window.end:
+        clause, params = "departure_min BETWEEN ? AND ?", [window.start, window.end]
+    else:
+        clause, params = "(departure_min >= ? OR departure_min <= ?)", [window.start, window.end]
+    if window.ondemand:
+        clause = f"({clause} OR departure_min IS NULL)"
+    return clause, params
+
+
+def _city_clause(column: str, value: str, match: str):
+    if match == "exact":
+        return f"{column} = ?", [value]
+    if match == "prefix":
+        # range scan instead of LIKE 'x%' so the index is usable without NOCASE
+        return f"{column} >= ? AND {column} < ?", [value, value + "\uffff"]
+    return f"{column} LIKE ?", [f"%{value}%"]
+
+
+def build_search_query(origin: str, destination: str, mode: str, match: str,
+                       columns: Sequence[str] = TRANSPORT_COLUMNS,
+                       window: Optional[TimeWindow] = None):
+    clauses, params = [], []
+    for column, value in (("origin_norm", origin), ("destination_norm", destination)):
+        if value:
+            clause, args = _city_clause(column, value, match)
+            clauses.append(clause)
+            params.extend(args)
+    if mode:
+        clauses.append("mode_norm = ?")
+        params.append(mode)
+    if window is not None:
+        clause, args = _window_clause(window)
+        clauses.append(clause)
+        params.extend(args)
+
+    query = "SELECT " + ", ".join(columns) + " FROM transports"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, params
+
+
+def fetch_extra(db: sqlite3.Connection, ids: Sequence[str]) -> dict:
+    """id -> extra_json for the given ids, read by primary key in chunks."""
+    ids = list(ids)
+    extra = {}
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        marks = ",".join("?" * len(chunk))
+        extra.update(db.execute(
+            f"SELECT id, extra_json FROM transports WHERE id IN ({marks})", chunk).fetchall())
+    return extra
+
+
+def search_transports(db: sqlite3.Connection, origin: str = "", destination: str = "",
+                      mode: str = "") -> List[sqlite3.Row]:
+    """
+    Find transports by city/mode: exact city match first, then prefix, and
+    substring only when neither names a known city. A mode with no rows
+    between matched cities is an empty result, not a reason to widen.
+    """
+    origin, destination, mode = normalize(origin), normalize(destination), normalize(mode)
+    match = pick_match(db, origin, destination)
+    query, params = build_search_query(origin, destination, mode, match)
+    return db.execute(query, params).fetchall()
+
+
+# ------- Keyset pagination -------
+
+def encode_cursor(*parts) -> str:
+    raw = json.dumps(parts, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, n_parts: int) -> list:
+    """Inverse of encode_cursor; ValueError for anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        parts = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(parts, list) or len(parts) != n_parts:
+        raise ValueError("invalid cursor")
+    return parts
+
+
+def page_size(value, default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Requested page size clamped to [1, MAX_PAGE_SIZE]; ValueError if not a number."""
+    if value in (None, ""):
+        return default
+    return max(1, min(int(value), MAX_PAGE_SIZE))
+
+
+def project_fields(fields=None, include_extra: bool = False) -> Tuple[str, ...]:
+    """
+    Columns to select: `fields` (list or comma-separated string) or the
+    defaults, plus extra_json on request. "id" is always included since
+    the cursor is keyed on it.
+    """
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    columns = list(fields or DEFAULT_FIELDS)
+    unknown = [c for c in columns if c not in SELECTABLE_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    if include_extra and "extra_json" not in columns:
+        columns.append("extra_json")
+    if "id" not in columns:
+        columns.insert(0, "id")
+    return tuple(dict.fromkeys(columns))
+
+
+def pick_match(db: sqlite3.Connection, origin: str, destination: str) -> str:
+    """
+    First strategy of MATCH_STRATEGIES whose city clauses match any row
+    (probed with LIMIT 1, without mode or window). The last one is never
+    probed: it is the answer even when it finds nothing.
+    """
+    if not origin and not destination:
+        return "exact"
+    for match in MATCH_STRATEGIES[:-1]:
+        query, params = build_search_query(origin, destination, "", match, ("id",))
+        if db.execute(query + " LIMIT 1", params).fetchone():
+            return match
+    return MATCH_STRATEGIES[-1]
+
+
+def _keyset(db, origin, destination, cursor):
+    """(match strategy, last id seen) for a first page or a cursor."""
+    if not cursor:
+        return pick_match(db, origin, destination), None
+    match, after = decode_cursor(cursor, 2)
+    if match not in MATCH_STRATEGIES or not isinstance(after, str):
+        raise ValueError("invalid cursor")
+    return match, after
+
+
+def _execute_keyset(db, origin, destination, mode, columns, match, after, limit, window=None):
+    query, params = build_search_query(origin, destination, mode, match, columns, window)
+    if after is not None:
+        query += (" AND" if " WHERE " in query else " WHERE") + " id > ?"
+        params.append(after)
+    # a substring match scans the table anyway; "+id" keeps the planner from
+    # walking the primary key index and fetching every row out of order
+    query += " ORDER BY +id" if match == "substring" else " ORDER BY id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return db.execute(query, params)
+
+
+def iter_search(db: sqlite3.Connection, origin: str = "", destination: str = "",
+                mode: str = "", columns: Sequence[str] = DEFAULT_FIELDS,
+                cursor: Optional[str] = None, limit: Optional[int] = None,
+                window: Optional[TimeWindow] = None) -> Iterator[sqlite3.Row]:
+    """
+    Stream search matches ordered by id, straight from the SQLite cursor.
+    Resumes after `cursor` (from search_page) with the match strategy of
+    the first page, so pages never mix exact and prefix results.
+    """
+    origin, destination, mode = normalize(origin), normalize(destination), normalize(mode)
+    match, after = _keyset(db, origin, destination, cursor)
+    return iter(_execute_keyset(db, origin, destination, mode, columns, match, after, limit, window))
+
+
+def search_page(db: sqlite3.Connection, origin: str = "", destination: str = "",
+                mode: str = "", columns: Sequence[str] = DEFAULT_FIELDS,
+                cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE,
+                window: Optional[TimeWindow] = None) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """One page of matches plus the cursor of the next page (None on the last)."""
+    origin, destination, mode = normalize(origin), normalize(destination), normalize(mode)
+    match, after = _keyset(db, origin, destination, cursor)
+    rows = _execute_keyset(db, origin, destination, mode, columns, match, after, limit + 1,
+                           window).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(match, rows[-1]["id"])
+    return rows, next_cursor
@@ -0,0 +1,103 @@
+"""
+Bounded response cache for read endpoints (/search, /chat).
+
+Keys are normalized requests; every entry is tagged with the catalog
+version it was computed from. The first lookup under a newer version drops
+the whole cache, so a feed load or booking (both bump catalog_meta.version)
+can never serve stale rows. Versions only grow: a request that read an
+older one misses and does not store, rather than dropping newer entries.
+Eviction is LRU, bounded both by entry count and by a total size budget
+(e.g. result rows).
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import threading
+
+
+class ResponseCache:
+    """
+    - max_entries: most cached responses
+    - max_size: budget for the summed `size` of entries; a single response
+      larger than max_item_size is not cached at all
+    """
+
+    def __init__(self, max_entries: int = 4096, max_size: int = 500_000,
+                 max_item_size: int = 10_000):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_item_size = max_item_size
+        # key -> (value, size)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._size = 0
+        self._version: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: int) -> bool:
+        """False for a version older than the cache's; caller holds the lock."""
+        if self._version is not None and version < self._version:
+            return False
+        if version != self._version:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._size = 0
+            self._version = version
+        return True
+
+    def get(self, key: Hashable, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key) if self._check_version(version) else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, version: int, value: Any, size: int = 1) -> None:
+        if size > self.max_item_size:
+            return
+        with self._lock:
+            if not self._check_version(version):
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._data[key] = (value, size)
+            self._size += size
+            while self._data and (len(self._data) > self.max_entries or self._size > self.max_size):
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+            self._version = None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "size": self._size,
+                "max_entries": self.max_entries,
+                "max_size": self.max_size,
+                "version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# shared by the /search and /chat routes
+response_cache = ResponseCache()
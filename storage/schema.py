@@ -0,0 +1,213 @@
+"""
+SQLite schema for the transport catalog and booking history.
+"""
+import re
+import sqlite3
+from typing import Optional, Set
+
+TRANSPORTS_DDL = """
+    CREATE TABLE IF NOT EXISTS transports(
+        id TEXT PRIMARY KEY,
+        mode TEXT,
+        name TEXT,
+        origin TEXT,
+        destination TEXT,
+        departure TEXT,
+        arrival TEXT,
+        duration_mins INTEGER,
+        price REAL,
+        seats_available INTEGER,
+        rating REAL,
+        extra_json TEXT
+    )
+"""
+
+# Columns returned to API clients; excludes the derived *_norm columns.
+TRANSPORT_COLUMNS = (
+    "id", "mode", "name", "origin", "destination", "departure", "arrival",
+    "duration_mins", "price", "seats_available", "rating", "extra_json",
+)
+
+# Trimmed, lowercased copies of the lookup columns. Virtual generated columns
+# stay in sync with every writer for free; only the indexes store them.
+NORMALIZED_COLUMNS = {
+    "origin_norm": "lower(trim(origin))",
+    "destination_norm": "lower(trim(destination))",
+    "mode_norm": "lower(trim(mode))",
+}
+
+DAY_MINS = 24 * 60
+
+
+# "HH:MM" -> minutes since midnight; NULL for on-demand values ("ASAP",
+# "30 mins"). Must agree with minutes_of_day below.
+def _minutes_expr(column: str) -> str:
+    t = f"trim({column})"
+    return (
+        f"CASE WHEN {t} GLOB '[0-9]:[0-9][0-9]*' OR {t} GLOB '[0-9][0-9]:[0-9][0-9]*'"
+        f" THEN (CAST(substr({t}, 1, instr({t}, ':') - 1) AS INTEGER) * 60"
+        f" + CAST(substr({t}, instr({t}, ':') + 1, 2) AS INTEGER)) % {DAY_MINS} END"
+    )
+
+
+# departure / arrival as minutes since midnight, for time-window queries
+TIME_COLUMNS = {
+    "departure_min": _minutes_expr("departure"),
+    "arrival_min": _minutes_expr("arrival"),
+}
+
+# leading spaces only, like trim()
+_HHMM_RE = re.compile(r" *(\d{1,2}):(\d\d)")
+
+
+def minutes_of_day(value) -> Optional[int]:
+    """'06:30' -> 390; None for on-demand values such as 'ASAP'."""
+    m = _HHMM_RE.match(str(value)) if value is not None else None
+    if m is None:
+        return None
+    return (int(m.group(1)) * 60 + int(m.group(2))) % DAY_MINS
+
+
+TRANSPORT_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transports_route"
+    " ON transports(origin_norm, destination_norm, mode_norm)",
+    # time-window lookups between two cities are one range scan
+    "CREATE INDEX IF NOT EXISTS idx_transports_route_departure"
+    " ON transports(origin_norm, destination_norm, departure_min)",
+    "CREATE INDEX IF NOT EXISTS idx_transports_destination"
+    " ON transports(destination_norm, mode_norm)",
+    "CREATE INDEX IF NOT EXISTS idx_transports_mode ON transports(mode_norm)",
+]
+
+USER_HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS user_history(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        origin TEXT,
+        destination TEXT,
+        mode TEXT,
+        priority TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Single-row counter bumped by triggers on every change to `transports`,
+# so in-process caches can tell when the catalog is stale with one cheap read.
+CATALOG_META_DDL = """
+    CREATE TABLE IF NOT EXISTS catalog_meta(
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+"""
+
+# One row per catalog version: the transport id whose change produced it,
+# or NULL for a bulk load that bumped the version once for many rows.
+# Lets readers patch an in-memory catalog instead of reloading it.
+CATALOG_CHANGES_DDL = """
+    CREATE TABLE IF NOT EXISTS catalog_changes(
+        version INTEGER PRIMARY KEY,
+        transport_id TEXT
+    )
+"""
+# versions kept in catalog_changes; older readers fall back to a full reload
+CATALOG_CHANGES_KEEP = 50_000
+
+_BUMP = "UPDATE catalog_meta SET version = version + 1 WHERE id = 1{cond};"
+_LOG = ("INSERT INTO catalog_changes(version, transport_id)"
+        " SELECT version, {tid} FROM catalog_meta WHERE id = 1{cond};")
+_PRUNE = (f"DELETE FROM catalog_changes WHERE version <="
+          f" (SELECT version FROM catalog_meta WHERE id = 1) - {CATALOG_CHANGES_KEEP};")
+
+
+def _version_trigger(event: str, row: str) -> str:
+    steps = [_BUMP.format(cond=""), _LOG.format(tid=f"{row}.id", cond="")]
+    if event == "UPDATE":
+        # an id change also retires the old id
+        cond = " AND OLD.id IS NOT NEW.id"
+        steps += [_BUMP.format(cond=cond), _LOG.format(tid="OLD.id", cond=cond)]
+    steps.append(_PRUNE)
+    body = "\n        ".join(steps)
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS transports_version_{event.lower()}
+    AFTER {event} ON transports
+    BEGIN
+        {body}
+    END
+    """
+
+
+CATALOG_TRIGGERS = [
+    _version_trigger(event, row)
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+]
+
+# for writers that drop the triggers and bump the version once themselves
+LOG_CATALOG_RESET = _LOG.format(tid="NULL", cond="")
+
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    """Create missing tables/triggers. Safe to run on every startup."""
+    c = conn.cursor()
+    c.execute(TRANSPORTS_DDL)
+    existing = {row[1] for row in c.execute("PRAGMA table_xinfo(transports)")}
+    for column, expr in NORMALIZED_COLUMNS.items():
+        if column not in existing:
+            c.execute(
+                f"ALTER TABLE transports ADD COLUMN {column} TEXT"
+                f" GENERATED ALWAYS AS ({expr}) VIRTUAL"
+            )
+    for column, expr in TIME_COLUMNS.items():
+        if column not in existing:
+            c.execute(
+                f"ALTER TABLE transports ADD COLUMN {column} INTEGER"
+                f" GENERATED ALWAYS AS ({expr}) VIRTUAL"
+            )
+    indexes = {row[0] for row in c.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='transports'")}
+    for ddl in TRANSPORT_INDEXES:
+        c.execute(ddl)
+    if not {"idx_transports_route", "idx_transports_destination",
+            "idx_transports_route_departure"} <= indexes:
+        # give the planner stats so range scans on the route index win over mode_norm
+        c.execute("ANALYZE transports")
+    c.execute(USER_HISTORY_DDL)
+    c.execute(CATALOG_META_DDL)
+    c.execute("INSERT OR IGNORE INTO catalog_meta(id, version) VALUES (1, 0)")
+    c.execute(CATALOG_CHANGES_DDL)
+    # triggers from before catalog_changes only bump the version
+    for name, sql in c.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type='trigger'"
+            " AND name LIKE 'transports_version_%'").fetchall():
+        if "catalog_changes" not in sql:
+            c.execute(f"DROP TRIGGER {name}")
+    for ddl in CATALOG_TRIGGERS:
+        c.execute(ddl)
+    conn.commit()
+
+
+def catalog_version(db: sqlite3.Connection) -> int:
+    try:
+        row = db.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        # database created before catalog_meta existed
+        ensure_schema(db)
+        row = db.execute("SELECT version FROM catalog_meta WHERE id = 1").fetchone()
+    return row[0] if row else 0
+
+
+def catalog_changes(db: sqlite3.Connection, since: int, until: int) -> Optional[Set[str]]:
+    """
+    Ids of the transports changed in versions (since, until], or None when
+    the log cannot tell (pruned, or a bulk load) and a full reload is needed.
+    """
+    if until < since:
+        return None
+    ids: Set[str] = set()
+    n = 0
+    for (tid,) in db.execute(
+            "SELECT transport_id FROM catalog_changes WHERE version > ? AND version <= ?",
+            (since, until)):
+        if tid is None:
+            return None
+        ids.add(tid)
+        n += 1
+    return ids if n == until - since else None
@@ -0,0 +1,210 @@
+"""
+Per-session conversation state, replacing the process-wide USER_MEMORY /
+USER_CONTEXT dicts.
+
+SessionState is a __slots__ record with a bounded history deque. Backends:
+- MemorySessionBackend: in-process LRU with TTL eviction (single worker)
+- SQLiteSessionBackend: rows in the shared database (WAL), so every gunicorn
+  worker sees the same sessions; expired rows are purged periodically
+"""
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+import json
+import sys
+import threading
+import time
+
+from storage.pool import get_pool
+
+HISTORY_LIMIT = 20
+SESSION_TTL_SECS = 30 * 60
+
+SESSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS chat_sessions(
+        session_id TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        touched REAL NOT NULL
+    )
+"""
+SESSIONS_INDEX = "CREATE INDEX IF NOT EXISTS idx_chat_sessions_touched ON chat_sessions(touched)"
+
+
+def _interned(value):
+    # city / mode / priority strings repeat across sessions; share one copy
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class SessionState:
+    """
+    One user's conversation state.
+    history holds (origin, destination, mode, priority) tuples, newest last.
+    """
+    __slots__ = ("session_id", "name", "last_query", "last_best_option", "budget",
+                 "last_origin", "last_destination", "preferred_mode", "history", "touched")
+
+    def __init__(self, session_id: str = "", history_limit: int = HISTORY_LIMIT):
+        self.session_id = session_id
+        self.name: Optional[str] = None
+        self.last_query: Optional[str] = None
+        self.last_best_option: Optional[Dict] = None
+        self.budget: Optional[float] = None
+        self.last_origin: Optional[str] = None
+        self.last_destination: Optional[str] = None
+        self.preferred_mode: Optional[str] = None
+        self.history: deque = deque(maxlen=history_limit)
+        self.touched = time.time()
+
+    def add_history(self, origin, destination, mode, priority) -> None:
+        self.last_origin = _interned(origin)
+        self.last_destination = _interned(destination)
+        self.preferred_mode = _interned(mode)
+        self.history.append((self.last_origin, self.last_destination, self.preferred_mode,
+                             _interned(priority)))
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "last_query": self.last_query,
+            "last_best_option": self.last_best_option,
+            "budget": self.budget,
+            "last_origin": self.last_origin,
+            "last_destination": self.last_destination,
+            "preferred_mode": self.preferred_mode,
+            "history": [list(h) for h in self.history],
+        }
+
+    @classmethod
+    def from_dict(cls, session_id: str, data: Dict,
+                  history_limit: int = HISTORY_LIMIT) -> "SessionState":
+        state = cls(session_id, history_limit)
+        for key in ("name", "last_query", "last_best_option", "budget",
+                    "last_origin", "last_destination", "preferred_mode"):
+            setattr(state, key, data.get(key))
+        state.history.extend(tuple(_interned(v) for v in h) for h in data.get("history", ()))
+        return state
+
+
+class MemorySessionBackend:
+    """In-process sessions: LRU by last use, bounded count, TTL expiry."""
+
+    def __init__(self, ttl: float = SESSION_TTL_SECS, max_sessions: int = 200_000,
+                 history_limit: int = HISTORY_LIMIT):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.history_limit = history_limit
+        self._data: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def load(self, session_id: str) -> SessionState:
+        now = time.time()
+        with self._lock:
+            state = self._data.get(session_id)
+            if state is not None and now - state.touched > self.ttl:
+                del self._data[session_id]
+                self.evictions += 1
+                state = None
+            if state is None:
+                state = self._data[session_id] = SessionState(session_id, self.history_limit)
+            self._data.move_to_end(session_id)
+            state.touched = now
+            self._evict(now)
+            return state
+
+    def save(self, state: SessionState) -> None:
+        # states are live objects; only the recency needs updating
+        state.touched = time.time()
+
+    def _evict(self, now: float) -> None:
+        # least recently used first, so expired sessions sit at the front
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if len(self._data) <= self.max_sessions and now - oldest.touched <= self.ttl:
+                break
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteSessionBackend:
+    """Sessions as JSON rows in the shared database; safe across worker processes."""
+
+    def __init__(self, db_path, ttl: float = SESSION_TTL_SECS,
+                 history_limit: int = HISTORY_LIMIT, purge_every: float = 60.0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.history_limit = history_limit
+        self.purge_every = purge_every
+        self._last_purge = 0.0
+        self.evictions = 0
+        with self.pool.connection() as conn:
+            self.pool.run_write(conn, self._create)
+
+    @property
+    def pool(self):
+        # looked up per call so a forked worker opens its own connections
+        return get_pool(self.db_path)
+
+    @staticmethod
+    def _create(conn) -> None:
+        conn.execute(SESSIONS_DDL)
+        conn.execute(SESSIONS_INDEX)
+
+    def load(self, session_id: str) -> SessionState:
+        now = time.time()
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT state, touched FROM chat_sessions WHERE session_id=?", (session_id,)
+            ).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            return SessionState(session_id, self.history_limit)
+        return SessionState.from_dict(session_id, json.loads(row[0]), self.history_limit)
+
+    def save(self, state: SessionState) -> None:
+        state.touched = now = time.time()
+        payload = json.dumps(state.to_dict(), separators=(",", ":"))
+        with self.pool.connection() as conn:
+            self.pool.run_write(conn, self._upsert, state.session_id, payload, now)
+            if now - self._last_purge > self.purge_every:
+                self._last_purge = now
+                self.evictions += self.pool.run_write(conn, self._purge, now - self.ttl)
+
+    @staticmethod
+    def _upsert(conn, session_id: str, payload: str, touched: float) -> None:
+        conn.execute(
+            "INSERT INTO chat_sessions(session_id, state, touched) VALUES (?, ?, ?)"
+            " ON CONFLICT(session_id) DO UPDATE SET state=excluded.state, touched=excluded.touched",
+            (session_id, payload, touched),
+        )
+
+    @staticmethod
+    def _purge(conn, cutoff: float) -> int:
+        return conn.execute("DELETE FROM chat_sessions WHERE touched < ?", (cutoff,)).rowcount
+
+    def __len__(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+
+
+SESSION_BACKENDS = {"memory": MemorySessionBackend, "sqlite": SQLiteSessionBackend}
+
+_stores: Dict[Tuple, object] = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(db_path, backend: str = "memory", **kwargs):
+    """Process-wide session backend ("memory" or "sqlite") per database file."""
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"session backend must be one of {tuple(SESSION_BACKENDS)}")
+    key = (str(db_path), backend)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if backend == "sqlite":
+                    kwargs["db_path"] = db_path
+                store = _stores[key] = SESSION_BACKENDS[backend](**kwargs)
+    return store